@@ -0,0 +1,135 @@
+#fila de prioridade (min-heap por previsao) dos circuitos rodando
+#atualizar_progresso_realtime so olha o topo do heap pra achar quem terminou, sem varrer e sem strptime em todo circuito
+
+import os
+import time
+import heapq
+import threading
+import eventos_lab
+from modelos import Circuito
+
+# escritas de outros workers nao passam pelo barramento deste, entao de tempos em tempos o heap e refeito do banco
+INTERVALO_RESSINCRONIZACAO_SEG = int(os.getenv("AGENDADOR_RESSINC_SEG", 60))
+# sem ninguem chamando /data a passagem running -> finished (que so depende do relogio) nunca seria gravada nem
+# publicada no stream; a varredura olha o topo do heap a cada N segundos (0 desliga)
+INTERVALO_VARREDURA_SEG = int(os.getenv("AGENDADOR_VARREDURA_SEG", 30))
+
+class AgendadorConclusao:
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._heap = []
+        # (bath_id, id do circuito) -> (inicio_ms, fim_ms); os ids de circuito se repetem entre banhos, entao a chave
+        # leva o banho. Entrada no heap que nao bate com isso e lixo (remocao preguicosa)
+        self._ativos = {}
+        self.sincronizado_em = None
+
+    @property
+    def sincronizado(self):
+        return self.sincronizado_em is not None
+
+    def precisa_sincronizar(self):
+        return self.sincronizado_em is None or time.time() - self.sincronizado_em > INTERVALO_RESSINCRONIZACAO_SEG
+
+    def _agendar_sem_trava(self, bath_id, circuito):
+        c = Circuito.de_dict(circuito)
+        chave = (str(bath_id), c.id)
+        self._ativos.pop(chave, None)
+        if not c.rodando or c.inicio_ms is None or c.fim_ms is None:
+            return
+        self._ativos[chave] = (c.inicio_ms, c.fim_ms)
+        heapq.heappush(self._heap, (c.fim_ms, chave, c.inicio_ms))
+
+    def sincronizar(self, db):
+        with self._trava:
+            self._heap = []
+            self._ativos = {}
+            for bath in db.get('baths', []):
+                for c in bath.get('circuits', []):
+                    self._agendar_sem_trava(bath['id'], c)
+            self.sincronizado_em = time.time()
+
+    def atualizar_banho(self, bath_id, bath, old_id=None):
+        with self._trava:
+            # tira tudo que era desse banho e agenda de novo o que estiver rodando nele
+            ids_removidos = {str(bath_id), str(old_id)} if old_id else {str(bath_id)}
+            for chave in [k for k in self._ativos if k[0] in ids_removidos]:
+                del self._ativos[chave]
+            if bath:
+                for c in bath.get('circuits', []):
+                    self._agendar_sem_trava(bath['id'], c)
+            self._compactar_se_preciso()
+
+    def _compactar_se_preciso(self):
+        if len(self._heap) > 2 * len(self._ativos) + 64:
+            self._heap = [(fim, chave, inicio) for chave, (inicio, fim) in self._ativos.items()]
+            heapq.heapify(self._heap)
+
+    def retirar_vencidos(self, agora_ms):
+        #O(k log n): so sai do heap quem ja passou da previsao; devolve pares (bath_id, id do circuito)
+        vencidos = []
+        with self._trava:
+            while self._heap and self._heap[0][0] <= agora_ms:
+                fim, chave, inicio = heapq.heappop(self._heap)
+                if self._ativos.get(chave) == (inicio, fim):
+                    del self._ativos[chave]
+                    vencidos.append(chave)
+        return vencidos
+
+    def vencidos(self, agora_ms):
+        #igual retirar_vencidos, mas sem mexer no heap (leitura que nao vai gravar o resultado)
+        with self._trava:
+            return [chave for chave, (_, fim) in self._ativos.items() if fim <= agora_ms]
+
+    def tem_vencidos(self, agora_ms):
+        with self._trava:
+            return bool(self._heap) and self._heap[0][0] <= agora_ms
+
+    def tempos(self, bath_id, cid):
+        with self._trava:
+            return self._ativos.get((str(bath_id), cid))
+
+    def proximos_a_terminar(self, quantidade=5):
+        with self._trava:
+            # reagendar o mesmo circuito deixa copias iguais no heap, por isso o conjunto de vistos
+            resultado = []
+            vistos = set()
+            for fim, chave, inicio in heapq.nsmallest(quantidade * 2 + len(self._heap) - len(self._ativos), self._heap):
+                if chave in vistos or self._ativos.get(chave) != (inicio, fim):
+                    continue
+                vistos.add(chave)
+                resultado.append({'circuitId': chave[1], 'bathId': chave[0], 'fimMs': fim})
+                if len(resultado) == quantidade:
+                    break
+            return resultado
+
+agendador = AgendadorConclusao()
+_thread_varredura = None
+
+def iniciar_varredura(funcao):
+    #funcao() carrega o banco, aplica as conclusoes, grava e publica; so e chamada quando tem circuito vencido
+    #(ou o heap ainda nao foi montado), entao com o laboratorio parado a thread nao le nada
+    global _thread_varredura
+    if _thread_varredura is not None or INTERVALO_VARREDURA_SEG <= 0:
+        return
+
+    def laco():
+        from utilitarios import obter_agora, data_para_epoch_ms
+        while True:
+            time.sleep(INTERVALO_VARREDURA_SEG)
+            try:
+                if not agendador.sincronizado or agendador.tem_vencidos(data_para_epoch_ms(obter_agora())):
+                    funcao()
+            except Exception as erro:
+                print(f"Erro na varredura de conclusões: {erro}")
+
+    _thread_varredura = threading.Thread(target=laco, name='varredura-conclusao', daemon=True)
+    _thread_varredura.start()
+
+def _ao_evento(tipo, dados):
+    if tipo == 'banho':
+        if agendador.sincronizado:
+            agendador.atualizar_banho(dados.get('bathId'), dados.get('bath'), dados.get('oldId'))
+    elif tipo in ('banhos', 'snapshot'):
+        agendador.sincronizar(dados)
+
+eventos_lab.assinar(_ao_evento)
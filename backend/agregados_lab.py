@@ -0,0 +1,112 @@
+#contadores do dashboard mantidos por banho: quando um banho muda so a parte dele e recalculada
+#alimentado pelos eventos de eventos_lab; sem replica, recalcula tudo de tempos em tempos pra pegar escritas de outros workers
+
+import os
+import time
+import threading
+import eventos_lab
+from utilitarios import obter_agora, data_para_epoch_ms
+from modelos import Banho
+
+STATUS_CONTADOS = ('free', 'running', 'finished', 'maintenance')
+INTERVALO_RECALCULO_SEG = int(os.getenv("DASHBOARD_RECALCULO_SEG", 60))
+JANELA_TERMINO_MS = 24 * 3600 * 1000
+
+_trava = threading.Lock()
+_por_banho = {}
+_calculado_em = None
+_versao = 0
+
+def resumir_banho(bath):
+    banho = Banho.de_dict(bath)
+    contagem = {s: 0 for s in STATUS_CONTADOS}
+    previsoes = []
+    sem_espaco = 0
+    for c in banho.circuitos:
+        if c.status in contagem:
+            contagem[c.status] += 1
+        if c.no_space:
+            sem_espaco += 1
+        if c.rodando and c.fim_ms is not None:
+            previsoes.append(c.fim_ms)
+    return {
+        'temp': banho.temp,
+        'isFull': banho.is_full,
+        'total': len(banho.circuitos),
+        'status': contagem,
+        'semEspaco': sem_espaco,
+        'previsoes': previsoes
+    }
+
+def recalcular_tudo(db):
+    global _calculado_em, _versao
+    novos = {str(b['id']): resumir_banho(b) for b in db.get('baths', [])}
+    with _trava:
+        _por_banho.clear()
+        _por_banho.update(novos)
+        _calculado_em = time.time()
+        _versao += 1
+
+def _ao_evento(tipo, dados):
+    global _versao
+    if tipo == 'banho':
+        with _trava:
+            if _calculado_em is None:
+                return
+            if dados.get('oldId'):
+                _por_banho.pop(str(dados['oldId']), None)
+            if dados.get('bath') is None:
+                _por_banho.pop(str(dados.get('bathId')), None)
+            else:
+                _por_banho[str(dados['bathId'])] = resumir_banho(dados['bath'])
+            _versao += 1
+    elif tipo in ('banhos', 'snapshot'):
+        recalcular_tudo(dados)
+
+eventos_lab.assinar(_ao_evento)
+
+def obter_resumo(carregar_bd, replica_ativa=False):
+    precisa_recalcular = _calculado_em is None or (not replica_ativa and time.time() - _calculado_em > INTERVALO_RECALCULO_SEG)
+    if precisa_recalcular:
+        recalcular_tudo(carregar_bd())
+
+    agora_ms = data_para_epoch_ms(obter_agora())
+    with _trava:
+        circuitos = {s: 0 for s in STATUS_CONTADOS}
+        circuitos['total'] = 0
+        banhos_lotados = 0
+        terminando_24h = 0
+        por_temperatura = {}
+
+        for resumo in _por_banho.values():
+            circuitos['total'] += resumo['total']
+            vencidos = 0
+            for fim in resumo['previsoes']:
+                if fim <= agora_ms:
+                    vencidos += 1
+                elif fim - agora_ms <= JANELA_TERMINO_MS:
+                    terminando_24h += 1
+            # teste que passou da previsao conta como finalizado mesmo antes do progresso ser salvo
+            circuitos['running'] += resumo['status']['running'] - vencidos
+            circuitos['finished'] += resumo['status']['finished'] + vencidos
+            circuitos['free'] += resumo['status']['free']
+            circuitos['maintenance'] += resumo['status']['maintenance']
+            if resumo['isFull']:
+                banhos_lotados += 1
+
+            temp = str(resumo['temp'])
+            faixa = por_temperatura.setdefault(temp, {'ocupados': 0, 'total': 0})
+            faixa['ocupados'] += resumo['status']['running'] - vencidos
+            faixa['total'] += resumo['total']
+
+        utilizacao = {t: round(f['ocupados'] / f['total'] * 100, 1) if f['total'] else 0 for t, f in por_temperatura.items()}
+
+        return {
+            'versao': _versao,
+            'circuitos': circuitos,
+            'banhos': len(_por_banho),
+            'banhosLotados': banhos_lotados,
+            'emManutencao': circuitos['maintenance'],
+            'terminando24h': terminando_24h,
+            'utilizacaoPorTemperatura': utilizacao
+        }
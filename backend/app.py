@@ -1,23 +1,56 @@
+import time
+_inicio_boot = time.perf_counter()
+
 import os
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 import traceback
 
-from rotas.laboratorio import bp_lab
+from rotas.laboratorio import bp_lab, varrer_conclusoes
 from rotas.solicitacoes import bp_solicitacoes
-from rotas.oee_rotas import bp_oee
+from rotas.oee_rotas import bp_oee, aquecer_servico_oee
+from metricas import registrar_middleware, gerar_texto_prometheus, registrar_inicializacao, obter_inicializacao
+from compressao import registrar_compressao
+from estaticos import registrar_estaticos
+import replica
+import eventos_lab
+from banco_dados import _converter_dados_lab
+from agendador_conclusao import iniciar_varredura
+
+tempo_imports = time.perf_counter() - _inicio_boot
+registrar_inicializacao('imports', tempo_imports)
 
 diretorio_base = os.path.dirname(os.path.abspath(__file__))
 DIRETORIO_DIST = os.path.join(diretorio_base, 'dist') 
 
-app = Flask(__name__, static_folder=DIRETORIO_DIST, static_url_path='')
+# o dist e servido por estaticos.py (pre-comprimidos + cache longo nos assets com hash), nao pela rota static do Flask
+app = Flask(__name__, static_folder=None)
 
 
 CORS(app)
+registrar_middleware(app)
+# registrado depois do middleware de metricas pra rodar antes dele: o tamanho medido ja e o comprimido
+registrar_compressao(app)
 
 app.register_blueprint(bp_lab, url_prefix='/api')
 app.register_blueprint(bp_solicitacoes, url_prefix='/api/solicitacoes')
 app.register_blueprint(bp_oee, url_prefix='/api/oee')
+registrar_estaticos(app, DIRETORIO_DIST)
+
+if os.environ.get("REPLICA_ATIVA") == "1":
+    # mudancas feitas por outros workers chegam pela replica e viram snapshot no stream SSE
+    replica.registrar_ouvinte_lab(lambda dados: eventos_lab.publicar('snapshot', _converter_dados_lab(dados)))
+    replica.iniciar()
+
+iniciar_varredura(varrer_conclusoes)
+
+tempo_boot = time.perf_counter() - _inicio_boot
+registrar_inicializacao('app', tempo_boot)
+print(f"LabManager pronto em {tempo_boot * 1000:.0f} ms (imports {tempo_imports * 1000:.0f} ms)")
+
+if os.environ.get("OEE_AQUECER") == "1":
+    # worker sobe sem pandas/numpy e carrega o OEE logo depois, fora do caminho da primeira requisicao
+    aquecer_servico_oee(float(os.environ.get("OEE_AQUECER_ATRASO_SEG", 2)))
 
 @app.errorhandler(Exception)
 def lidar_com_excecoes(e):
@@ -30,6 +63,24 @@ def api_ping():
    
     return jsonify({"status": "online", "mensagem": "LabManager API v3.0 "})
 
+@app.route('/api/metrics', methods=['GET'])
+def api_metricas():
+    # se METRICS_TOKEN estiver definido, o scraper precisa mandar o Bearer
+    token_metricas = os.environ.get("METRICS_TOKEN")
+    if token_metricas and request.headers.get('Authorization') != f"Bearer {token_metricas}":
+        return jsonify({"sucesso": False, "erro": "Acesso negado."}), 401
+    return Response(gerar_texto_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/startup', methods=['GET'])
+def api_inicializacao():
+    return jsonify({etapa: round(segundos * 1000, 1) for etapa, segundos in obter_inicializacao().items()})
+
+@app.route('/api/replica/status', methods=['GET'])
+def api_status_replica():
+    status = replica.status_replica()
+    codigo = 200 if status['saudavel'] or not status['ativa'] else 503
+    return jsonify(status), codigo
+
 
 if __name__ == '__main__':
     porta = int(os.environ.get("PORT", 5000))
@@ -0,0 +1,171 @@
+#arquivo mensal do lab_logs e do circuit_logs: eventos mais velhos que LOGS_ARQUIVAR_APOS_DIAS saem da colecao
+#(um documento por evento) e viram um documento por mes e circuito em logs_arquivo, com JSON lines em gzip
+#quem le historico (rastreabilidade, confiabilidade, OEE) junta o arquivo com os eventos quentes via ler_arquivados
+#uso manual: python arquivo_logs.py [--dias 90]
+
+import os
+import sys
+import gzip
+import json
+import threading
+from datetime import datetime, timedelta
+from google.cloud.firestore import FieldFilter
+from configuracao import bd_firestore
+from metricas import medir_operacao, desembrulhar
+from utilitarios import obter_agora, data_para_epoch_ms, data_de_epoch_ms
+
+COLECAO_ARQUIVO = 'logs_arquivo'
+COLECOES_ARQUIVAVEIS = ('lab_logs', 'circuit_logs')
+ARQUIVAR_APOS_DIAS = int(os.getenv("LOGS_ARQUIVAR_APOS_DIAS", 90))
+LOTE_LEITURA = 2000
+# documento do firestore vai ate 1 MiB; um mes de um circuito fica muito abaixo disso mesmo sem compressao
+TAMANHO_MAXIMO_ARQUIVO = 900 * 1024
+
+_trava_compactacao = threading.Lock()
+_ultima_compactacao = {}
+
+def mes_do_log(log_id):
+    #id do log = horario local em ms gravado com data_para_epoch_ms; o mes sai do mesmo horario local
+    return data_de_epoch_ms(log_id).strftime("%Y-%m")
+
+def id_arquivo(colecao, mes, circuit_id):
+    return f"{colecao}_{mes}_{str(circuit_id).replace('/', '_')}"
+
+def codificar_eventos(eventos):
+    linhas = '\n'.join(json.dumps(e, ensure_ascii=False, separators=(',', ':'), default=str) for e in eventos)
+    return gzip.compress(linhas.encode('utf-8'), compresslevel=9, mtime=0)
+
+def decodificar_eventos(dados):
+    if not dados:
+        return []
+    return [json.loads(linha) for linha in gzip.decompress(bytes(dados)).decode('utf-8').splitlines() if linha]
+
+def _montar_documento(colecao, mes, circuit_id, eventos):
+    eventos = sorted({int(e['id']): e for e in eventos}.values(), key=lambda e: int(e['id']))
+    dados = codificar_eventos(eventos)
+    if len(dados) > TAMANHO_MAXIMO_ARQUIVO:
+        raise ValueError(f"Arquivo {id_arquivo(colecao, mes, circuit_id)} passaria do limite do documento ({len(dados)} bytes)")
+    return {
+        'colecao': colecao, 'mes': mes, 'circuitId': str(circuit_id),
+        'inicioMs': int(eventos[0]['id']), 'fimMs': int(eventos[-1]['id']),
+        'quantidade': len(eventos), 'codificacao': 'gzip', 'dados': dados
+    }
+
+def limite_arquivamento_ms(dias=None, agora=None):
+    #so meses inteiros: o corte volta pro dia 1 do mes em que cai (agora - dias), assim cada arquivo fecha uma vez
+    #mesma conversao dos ids dos logs, entao o corte bate com a virada do mes de mes_do_log
+    corte = (agora or obter_agora()) - timedelta(days=ARQUIVAR_APOS_DIAS if dias is None else dias)
+    return data_para_epoch_ms(datetime(corte.year, corte.month, 1))
+
+def compactar_colecao(colecao, limite_ms):
+    #le em lotes pela ordem do id; grava o arquivo (mesclando com o que ja existir) e so depois apaga os originais,
+    #entao se cair no meio o pior caso e evento repetido entre arquivo e colecao, que a leitura ja deduplica
+    arquivados = 0
+    while True:
+        with medir_operacao('arquivo_logs_leitura'):
+            docs = list(bd_firestore.collection(colecao).where(filter=FieldFilter('id', '<', limite_ms)).order_by('id').limit(LOTE_LEITURA).stream())
+        if not docs:
+            return arquivados
+
+        grupos = {}
+        for doc in docs:
+            evento = doc.to_dict()
+            if evento.get('id') is None:
+                continue
+            chave = (mes_do_log(evento['id']), str(evento.get('circuitId')))
+            grupos.setdefault(chave, []).append(evento)
+
+        for (mes, circuit_id), eventos in grupos.items():
+            arquivo_ref = bd_firestore.collection(COLECAO_ARQUIVO).document(id_arquivo(colecao, mes, circuit_id))
+            existente = arquivo_ref.get()
+            if existente.exists:
+                eventos = decodificar_eventos(existente.get('dados')) + eventos
+            arquivo_ref.set(_montar_documento(colecao, mes, circuit_id, eventos))
+
+        for inicio in range(0, len(docs), 500):
+            lote = bd_firestore.batch()
+            for doc in docs[inicio:inicio + 500]:
+                lote.delete(desembrulhar(doc.reference))
+            lote.commit()
+        arquivados += len(docs)
+
+def compactar(dias=None):
+    #roda uma compactacao por vez por processo; devolve quantos eventos foram arquivados por colecao
+    if not _trava_compactacao.acquire(blocking=False):
+        return None
+    try:
+        limite_ms = limite_arquivamento_ms(dias)
+        resultado = {colecao: compactar_colecao(colecao, limite_ms) for colecao in COLECOES_ARQUIVAVEIS}
+        _ultima_compactacao.clear()
+        _ultima_compactacao.update({'em': obter_agora().strftime("%d/%m/%Y %H:%M"), 'limiteMs': limite_ms, 'arquivados': resultado})
+        return resultado
+    finally:
+        _trava_compactacao.release()
+
+def compactar_em_segundo_plano(dias=None):
+    if _trava_compactacao.locked():
+        return False
+    threading.Thread(target=compactar, args=(dias,), name='compactacao-logs', daemon=True).start()
+    return True
+
+def status_compactacao():
+    return {'emAndamento': _trava_compactacao.locked(), 'ultima': dict(_ultima_compactacao) or None}
+
+def ler_arquivados(colecao, circuit_id=None, inicio_ms=None, fim_ms=None):
+    #eventos arquivados que caem em [inicio_ms, fim_ms]; com circuit_id le so os arquivos daquele circuito
+    consulta = bd_firestore.collection(COLECAO_ARQUIVO).where(filter=FieldFilter('colecao', '==', colecao))
+    if circuit_id is not None:
+        consulta = consulta.where(filter=FieldFilter('circuitId', '==', str(circuit_id)))
+    if inicio_ms is not None:
+        consulta = consulta.where(filter=FieldFilter('fimMs', '>=', int(inicio_ms)))
+    eventos = []
+    with medir_operacao('arquivo_logs_leitura'):
+        docs = list(consulta.stream())
+    for doc in docs:
+        arquivo = doc.to_dict()
+        if fim_ms is not None and arquivo.get('inicioMs', 0) > fim_ms:
+            continue
+        for evento in decodificar_eventos(arquivo.get('dados')):
+            momento = int(evento.get('id', 0))
+            if (inicio_ms is None or momento >= inicio_ms) and (fim_ms is None or momento <= fim_ms):
+                eventos.append(evento)
+    return eventos
+
+def juntar_com_quentes(quentes, arquivados):
+    #evento que esta nos dois (compactacao interrompida) vale a versao quente
+    por_id = {int(e['id']): e for e in arquivados if e.get('id') is not None}
+    por_id.update({int(e['id']): e for e in quentes if e.get('id') is not None})
+    return list(por_id.values())
+
+def remover_arquivado(colecao, log_id):
+    #apagar um evento que ja foi arquivado: acha o arquivo do mes pelo intervalo de ids e regrava sem ele
+    log_id = int(log_id)
+    consulta = (bd_firestore.collection(COLECAO_ARQUIVO)
+                .where(filter=FieldFilter('colecao', '==', colecao))
+                .where(filter=FieldFilter('mes', '==', mes_do_log(log_id))))
+    for doc in consulta.stream():
+        arquivo = doc.to_dict()
+        if not (arquivo.get('inicioMs', 0) <= log_id <= arquivo.get('fimMs', 0)):
+            continue
+        eventos = decodificar_eventos(arquivo.get('dados'))
+        restantes = [e for e in eventos if int(e.get('id', 0)) != log_id]
+        if len(restantes) == len(eventos):
+            continue
+        arquivo_ref = bd_firestore.collection(COLECAO_ARQUIVO).document(doc.id)
+        if restantes:
+            arquivo_ref.set(_montar_documento(colecao, arquivo['mes'], arquivo['circuitId'], restantes))
+        else:
+            arquivo_ref.delete()
+        return next(e for e in eventos if int(e.get('id', 0)) == log_id)
+    return None
+
+if __name__ == '__main__':
+    dias = ARQUIVAR_APOS_DIAS
+    if '--dias' in sys.argv:
+        dias = int(sys.argv[sys.argv.index('--dias') + 1])
+    if not bd_firestore:
+        print("Firestore não conectado.")
+        sys.exit(1)
+    print(f"Arquivando eventos anteriores a {data_de_epoch_ms(limite_arquivamento_ms(dias)):%d/%m/%Y}...")
+    for colecao, total in compactar(dias).items():
+        print(f"{colecao}: {total} eventos arquivados")
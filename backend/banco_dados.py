@@ -1,11 +1,37 @@
+import os
+import copy
+import atexit
+import threading
 from firebase_admin import firestore
 from configuracao import bd_firestore 
+from metricas import medir_operacao, desembrulhar, incrementar
+import replica
+import confiabilidade
+import outbox
 
 CACHE_DADOS = None 
 
+# escrita atrasada opcional do lab_data/main: com SALVAR_BD_JANELA_MS > 0 os salvar_bd que chegam dentro da janela
+# viram um set so (cada um e o documento inteiro, entao so o ultimo importa). A requisicao responde na hora e as
+# leituras deste worker enxergam o estado pendente. Pensado pro Procfile atual (1 worker com threads)
+JANELA_COALESCER_MS = int(os.getenv("SALVAR_BD_JANELA_MS", 0))
+
+_trava_pendente = threading.Lock()
+_trava_gravacao = threading.Lock()
+_pendente = None
+_em_voo = None
+_timer = None
+
+# OUTBOX_ATIVO=1: logs e lab_data/main vao pra fila duravel em disco (outbox.py) e o firestore recebe em segundo plano;
+# com o outbox ligado a janela de coalescer acima nao e usada (o dreno ja junta os sets pendentes do mesmo documento)
+USAR_OUTBOX = os.getenv("OUTBOX_ATIVO") == "1" and bd_firestore is not None
+
 def salvar_log_no_bd(entrada_log):
     if not bd_firestore: 
         return
+    if USAR_OUTBOX:
+        outbox.fila.enfileirar([('lab_logs', str(entrada_log['id']), entrada_log)])
+        return
     try:
         bd_firestore.collection('lab_logs').document(str(entrada_log['id'])).set(entrada_log)
     except Exception as erro:
@@ -14,25 +40,120 @@ def salvar_log_no_bd(entrada_log):
 def salvar_log_circuito(entrada_log):
     if not bd_firestore: 
         return
+    if USAR_OUTBOX:
+        outbox.fila.enfileirar([('circuit_logs', str(entrada_log['id']), entrada_log)])
+        return
     try:
         bd_firestore.collection('circuit_logs').document(str(entrada_log['id'])).set(entrada_log)
     except Exception as erro:
         print(f"Erro ao salvar log de circuito: {erro}")
+        return
+    confiabilidade.registrar_logs_em_segundo_plano([entrada_log])
+
+def salvar_logs_em_lote(logs, colecoes=('lab_logs', 'circuit_logs')):
+    #mesmos logs de salvar_log_no_bd + salvar_log_circuito, mas em batches (limite de 500 escritas por commit)
+    if not bd_firestore or not logs:
+        return
+    if USAR_OUTBOX:
+        outbox.fila.enfileirar([(colecao, str(entrada_log['id']), entrada_log) for entrada_log in logs for colecao in colecoes])
+        return
+    por_lote = 500 // len(colecoes)
+    try:
+        for inicio in range(0, len(logs), por_lote):
+            lote = bd_firestore.batch()
+            for entrada_log in logs[inicio:inicio + por_lote]:
+                for colecao in colecoes:
+                    lote.set(desembrulhar(bd_firestore.collection(colecao).document(str(entrada_log['id']))), entrada_log)
+            lote.commit()
+    except Exception as erro:
+        print(f"Erro ao salvar logs em lote: {erro}")
+        return
+    if 'circuit_logs' in colecoes:
+        confiabilidade.registrar_logs_em_segundo_plano(logs)
+
+def _converter_dados_lab(dados):
+    if 'experienceOwners' in dados:
+        dados['experienceOwners'] = {str(k).replace('_', '/'): v for k, v in dados['experienceOwners'].items()}
+    return dados
+
+def _estado_local():
+    #o que este worker ja gravou mas o firestore ainda nao tem
+    with _trava_pendente:
+        if _pendente is not None or _em_voo is not None:
+            return _pendente if _pendente is not None else _em_voo
+    return outbox.fila.pendente('lab_data', 'main') if USAR_OUTBOX else None
 
 def carregar_bd():
+    dados_locais = _estado_local()
+    if dados_locais is not None:
+        return _converter_dados_lab(copy.deepcopy(dados_locais))
+
+    dados_replica = replica.obter_lab_main()
+    if dados_replica is not None:
+        return _converter_dados_lab(dados_replica)
+
     try:
-        doc = bd_firestore.collection('lab_data').document('main').get()
+        with medir_operacao('carregar_bd'):
+            doc = bd_firestore.collection('lab_data').document('main').get()
         if doc.exists:
-            dados = doc.to_dict()
-            if 'experienceOwners' in dados:
-                dados['experienceOwners'] = {str(k).replace('_', '/'): v for k, v in dados['experienceOwners'].items()}
-            return dados
+            return _converter_dados_lab(doc.to_dict())
     except Exception as e:
         print("Erro ao carregar BD:", e)
     
     return {"baths": [], "protocols": [], "logs": [], "experienceOwners": {}}
 
+def _gravar_lab(dados_salvar):
+    with medir_operacao('salvar_bd'):
+        resultado = bd_firestore.collection('lab_data').document('main').set(dados_salvar)
+    replica.registrar_escrita_lab(dados_salvar, getattr(resultado, 'update_time', None))
+
+def _armar_timer():
+    global _timer
+    if _timer is None:
+        _timer = threading.Timer(JANELA_COALESCER_MS / 1000, descarregar_escritas)
+        _timer.daemon = True
+        _timer.start()
+
+def descarregar_escritas():
+    #grava ja o estado pendente; roda no fim da janela, no desligamento e antes de ler o documento direto do firestore
+    global _pendente, _em_voo, _timer
+    if USAR_OUTBOX and not outbox.fila.drenar():
+        # o que nao deu pra gravar continua no disco e sai no proximo dreno (ou no proximo boot)
+        print(f"Aviso: outbox com {outbox.fila.profundidade()} escritas pendentes")
+    with _trava_gravacao:
+        with _trava_pendente:
+            if _timer is not None:
+                _timer.cancel()
+                _timer = None
+            dados = _pendente
+            _pendente = None
+            _em_voo = dados
+        if dados is None:
+            return
+        try:
+            _gravar_lab(dados)
+        except Exception as e:
+            print(f"Erro ao gravar lab_data/main pendente, tentando de novo: {e}")
+            incrementar('labmanager_salvar_bd_falhas_total', {})
+            with _trava_pendente:
+                # se chegou estado mais novo no meio tempo ele ja substitui este
+                if _pendente is None:
+                    _pendente = dados
+                _armar_timer()
+        finally:
+            with _trava_pendente:
+                _em_voo = None
+
+atexit.register(descarregar_escritas)
+
+if USAR_OUTBOX:
+    outbox.iniciar()
+    outbox.fila.registrar_gravador('lab_data', lambda documento, dados: _gravar_lab(dados))
+    # rollups de confiabilidade so depois que o log existe no circuit_logs
+    outbox.fila.registrar_apos_gravar('circuit_logs', confiabilidade.registrar_logs)
+
 def salvar_bd(db):
+    global _pendente
     try:
         dados_salvar = db.copy()
         if 'experienceOwners' in dados_salvar:
@@ -41,7 +162,19 @@ def salvar_bd(db):
                 chave_segura = str(k).replace('/', '_')
                 donos_seguros[chave_segura] = v
             dados_salvar['experienceOwners'] = donos_seguros
+
+        if USAR_OUTBOX:
+            outbox.fila.enfileirar([('lab_data', 'main', dados_salvar)])
+            return
+
+        if JANELA_COALESCER_MS > 0:
+            with _trava_pendente:
+                if _pendente is not None:
+                    incrementar('labmanager_salvar_bd_coalescidas_total', {})
+                _pendente = copy.deepcopy(dados_salvar)
+                _armar_timer()
+            return
             
-        bd_firestore.collection('lab_data').document('main').set(dados_salvar)
+        _gravar_lab(dados_salvar)
     except Exception as e:
-        raise Exception(f"Erro ao salvar no banco de dados: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Erro ao salvar no banco de dados: {str(e)}")
@@ -0,0 +1,124 @@
+#benchmark da serializacao JSON (stdlib x orjson) e da compressao (gzip x brotli) nos payloads grandes da API
+#uso: python benchmarks/bench_json.py --banhos 30 --circuitos 40 --mbps 2
+
+import os
+import sys
+import json
+import gzip
+import time
+import random
+import argparse
+import statistics
+
+diretorio_base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, diretorio_base)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATUS = ['free', 'running', 'finished', 'maintenance']
+
+def gerar_bd_sintetico(n_banhos, n_circuitos, semente=42):
+    #mesmo formato do lab_data/main que o /api/data devolve
+    rnd = random.Random(semente)
+    banhos = []
+    for b in range(n_banhos):
+        circuitos = []
+        for c in range(n_circuitos):
+            status = rnd.choice(STATUS)
+            circuitos.append({
+                'id': f"C-{b * n_circuitos + c + 1:03d}", 'status': status,
+                'batteryId': f"BAT{rnd.randint(10000, 99999)}" if status == 'running' else None,
+                'protocol': rnd.choice(['J28', 'CICLAGEM 50%', 'SAE J2801', 'Thermal']) if status == 'running' else None,
+                'startTime': '10/01/2026 08:30' if status == 'running' else None,
+                'previsao': f"{rnd.randint(11, 28):02d}/01/2026 14:00" if status == 'running' else '-',
+                'progress': round(rnd.random() * 100, 1), 'noSpace': rnd.random() < 0.1, 'isParallel': rnd.random() < 0.05
+            })
+        banhos.append({'id': f"Banho {b + 1:02d}", 'temp': rnd.choice([25, 40, 75]), 'isFull': False, 'circuits': circuitos})
+    logs = [{
+        'id': 1767225600000 + i, 'action': 'Início de Teste', 'bath': f"Banho {i % n_banhos + 1:02d}", 'circuitId': f"C-{i:03d}",
+        'batteryId': f"BAT{i}", 'date': '10/01/2026 08:30', 'details': 'Importação automática do log da Digatron com acentuação.'
+    } for i in range(100)]
+    return {
+        'baths': banhos, 'logs': logs,
+        'protocols': [{'id': p, 'name': p, 'duration': d} for p, d in [('J28', 28), ('CICLAGEM 50%', 300), ('SAE J2801', 500)]],
+        'experienceOwners': {f"E{i}/2026": f"usuario{i}@moura.com" for i in range(200)}
+    }
+
+def gerar_detalhes_oee(n_circuitos, dias=31, semente=7):
+    #formato de 'details' devolvido por /api/oee/calcular
+    rnd = random.Random(semente)
+    return {'details': [{
+        'id': f"Circuit{c:03d}", 'raw_id': str(c), 'UP': 20, 'SD': 5, 'PQ': 3, 'PP': 3,
+        'day_data': [rnd.choice(['UP', 'SD', 'PQ', 'PP', '']) for _ in range(dias)],
+        'is_ignored': False, 'is_bonus': False, 'stats': {'pct_up': 64.5, 'disponibilidade': 71.4}
+    } for c in range(n_circuitos)]}
+
+def codificar_stdlib(obj):
+    # mesmas opcoes do provedor padrao do Flask numa resposta compacta
+    return json.dumps(obj, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+def codificar_orjson(obj):
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+
+def medir(funcao, *args, repeticoes=20):
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        resultado = funcao(*args)
+        tempos.append(time.perf_counter() - t0)
+    return resultado, statistics.median(tempos) * 1000
+
+def executar_benchmark(nome, obj, mbps, repeticoes):
+    linhas = []
+    bruto, ms = medir(codificar_stdlib, obj, repeticoes=repeticoes)
+    linhas.append(('json stdlib', ms, len(bruto)))
+    if orjson:
+        rapido, ms = medir(codificar_orjson, obj, repeticoes=repeticoes)
+        if json.loads(rapido) != json.loads(bruto):
+            print(f"ATENCAO: saida do orjson difere da stdlib em {nome}!")
+        linhas.append(('json orjson', ms, len(rapido)))
+
+    for nivel in (1, 6):
+        comprimido, ms = medir(gzip.compress, bruto, nivel, repeticoes=repeticoes)
+        linhas.append((f"gzip {nivel}", ms, len(comprimido)))
+    if brotli:
+        for qualidade in (4, 11):
+            comprimido, ms = medir(lambda d, q: brotli.compress(d, quality=q), bruto, qualidade, repeticoes=max(1, repeticoes // 5) if qualidade > 9 else repeticoes)
+            linhas.append((f"brotli {qualidade}", ms, len(comprimido)))
+
+    bytes_por_ms = mbps * 1_000_000 / 8 / 1000
+    print(f"\n{nome}: {len(bruto) / 1024:.1f} KB sem compressao")
+    print(f"{'etapa':<14}{'tempo (ms)':>11}{'bytes':>11}{'rede (ms)':>11}")
+    for etapa, ms, tamanho in linhas:
+        print(f"{etapa:<14}{ms:>11.2f}{tamanho:>11}{tamanho / bytes_por_ms:>11.0f}")
+    return linhas
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de JSON e compressao das respostas")
+    parser.add_argument('--banhos', type=int, default=30)
+    parser.add_argument('--circuitos', type=int, default=40, help="circuitos por banho")
+    parser.add_argument('--circuitos-oee', type=int, default=400)
+    parser.add_argument('--mbps', type=float, default=2.0, help="banda estimada do wi-fi da fabrica")
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    if not orjson:
+        print("orjson nao instalado: medindo so a stdlib.")
+    if not brotli:
+        print("brotli nao instalado: medindo so gzip.")
+
+    executar_benchmark('/api/data', gerar_bd_sintetico(args.banhos, args.circuitos), args.mbps, args.repeticoes)
+    executar_benchmark('/api/oee/calcular details', gerar_detalhes_oee(args.circuitos_oee), args.mbps, args.repeticoes)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
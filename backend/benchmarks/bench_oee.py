@@ -0,0 +1,185 @@
+#benchmark do pipeline OEE com planilhas sinteticas no formato do export da Digatron
+#uso: python benchmarks/bench_oee.py --circuitos 300 --eventos 20 --baseline benchmarks/baseline_oee.json
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from calendar import monthrange
+
+diretorio_base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, diretorio_base)
+
+import pandas as pd
+import oee_service
+
+CAMINHO_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_oee.json')
+
+def gerar_planilha_sintetica(caminho, n_circuitos, n_eventos, mes, ano, n_abas=3, n_loggers=5, taxa_nat=0.05, semente=42):
+    #cria um xlsx com varias abas, linhas de logger e stops vazios (teste ainda rodando)
+    rnd = random.Random(semente)
+    inicio_janela = datetime(ano, mes, 1) - timedelta(days=10)
+    _, dias_no_mes = monthrange(ano, mes)
+    horas_janela = (dias_no_mes + 15) * 24
+
+    abas = {f"Export{i + 1}": [] for i in range(n_abas)}
+    nomes_abas = list(abas.keys())
+    colunas = [('Circuit', 'Start Time', 'Stop Time'), ('circuito', 'start_time', 'stop_time'), ('Circuit', 'StartTime', 'StopTime')]
+
+    for cid in range(1, n_circuitos + 1):
+        aba = nomes_abas[cid % n_abas]
+        cursor = inicio_janela + timedelta(hours=rnd.randint(0, 48))
+        for _ in range(n_eventos):
+            duracao = timedelta(hours=rnd.randint(2, max(3, horas_janela // max(1, n_eventos))))
+            stop = cursor + duracao
+            stop_txt = '' if rnd.random() < taxa_nat else stop.strftime("%d/%m/%Y %H:%M:%S")
+            abas[aba].append((f"Circuit{cid:03d}", cursor.strftime("%d/%m/%Y %H:%M:%S"), stop_txt))
+            cursor = stop + timedelta(hours=rnd.randint(0, 12))
+
+    for i in range(n_loggers):
+        aba = nomes_abas[i % n_abas]
+        abas[aba].append((f"Logger{i + 1:02d}", inicio_janela.strftime("%d/%m/%Y %H:%M:%S"), ''))
+
+    with pd.ExcelWriter(caminho) as writer:
+        for idx, (nome_aba, linhas) in enumerate(abas.items()):
+            nomes_colunas = list(colunas[idx % len(colunas)])
+            pd.DataFrame(linhas, columns=nomes_colunas).to_excel(writer, sheet_name=nome_aba, index=False)
+        #aba sem colunas reconhecidas tem que ser ignorada pelo pipeline
+        pd.DataFrame({'Obs': ['resumo']}).to_excel(writer, sheet_name='Resumo', index=False)
+
+    total_linhas = sum(len(l) for l in abas.values())
+    return total_linhas
+
+def medir_etapa(nome, funcao, *args, medir_memoria=True):
+    #tempo e pico de memoria em execucoes separadas: com o tracemalloc ligado cada alocacao do pandas passa pelo
+    #rastreador e a etapa chega a rodar varias vezes mais devagar, entao o tempo sai de uma execucao sem ele
+    t0 = time.perf_counter()
+    resultado = funcao(*args)
+    duracao = time.perf_counter() - t0
+    medida = {"etapa": nome, "segundos": round(duracao, 4), "pico_mb": None}
+    if medir_memoria:
+        tracemalloc.start()
+        try:
+            funcao(*args)
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        medida["pico_mb"] = round(pico / (1024 * 1024), 2)
+    return resultado, medida
+
+def hash_grid(mapa_final):
+    #o set de circuitos nao tem ordem fixa, entao ordena antes de gerar o hash
+    normalizado = json.dumps({k: mapa_final[k] for k in sorted(mapa_final)}, separators=(',', ':'))
+    return hashlib.sha256(normalizado.encode('utf-8')).hexdigest()
+
+def executar_benchmark(n_circuitos, n_eventos, mes, ano, n_abas, repeticoes):
+    pasta_tmp = tempfile.mkdtemp(prefix='bench_oee_')
+    caminho = os.path.join(pasta_tmp, 'sintetico.xlsx')
+    total_linhas = gerar_planilha_sintetica(caminho, n_circuitos, n_eventos, mes, ano, n_abas=n_abas)
+
+    melhores = {}
+    grid_hash = None
+    kpi = None
+
+    picos = {}
+
+    try:
+        for repeticao in range(repeticoes):
+            # o pico de memoria nao muda entre repeticoes: so a primeira paga a execucao extra com tracemalloc
+            memoria = repeticao == 0
+            dict_dfs, m_leitura = medir_etapa('leitura', oee_service.ler_planilhas_oee, caminho, medir_memoria=memoria)
+            df_final, m_norm = medir_etapa('normalizacao', oee_service.normalizar_eventos_oee, dict_dfs, medir_memoria=memoria)
+            (mapa_final, _), m_grid = medir_etapa('grid', oee_service.montar_grid_oee, df_final, mes, ano, medir_memoria=memoria)
+
+            oee_service.GLOBAL_DB["processed_data"] = mapa_final
+            oee_service.GLOBAL_DB["overrides"] = {}
+            oee_service.GLOBAL_DB["meta"] = {"detected_month": mes, "detected_year": ano}
+            params = {'mes': mes, 'ano': ano, 'ensaios_executados': 90, 'ensaios_solicitados': 100, 'relatorios_emitidos': 50, 'relatorios_no_prazo': 45}
+            resultado_kpi, m_kpi = medir_etapa('kpi', oee_service.calcular_indicadores_oee, params, medir_memoria=memoria)
+
+            for m in (m_leitura, m_norm, m_grid, m_kpi):
+                if m['pico_mb'] is not None:
+                    picos[m['etapa']] = m['pico_mb']
+                atual = melhores.get(m['etapa'])
+                if not atual or m['segundos'] < atual['segundos']:
+                    melhores[m['etapa']] = m
+
+            grid_hash = hash_grid(mapa_final)
+            kpi = resultado_kpi.get('kpi')
+    finally:
+        if os.path.exists(caminho): os.remove(caminho)
+        os.rmdir(pasta_tmp)
+
+    etapas = []
+    for nome in ('leitura', 'normalizacao', 'grid', 'kpi'):
+        m = melhores[nome]
+        m['pico_mb'] = picos.get(nome)
+        m['linhas_por_seg'] = round(total_linhas / m['segundos'], 1) if m['segundos'] > 0 else None
+        etapas.append(m)
+
+    return {
+        "parametros": {"circuitos": n_circuitos, "eventos": n_eventos, "mes": mes, "ano": ano, "abas": n_abas, "linhas": total_linhas},
+        "etapas": etapas,
+        "total_segundos": round(sum(m['segundos'] for m in etapas), 4),
+        "grid_sha256": grid_hash,
+        "kpi": kpi
+    }
+
+def comparar_com_baseline(resultado, baseline):
+    if baseline.get('parametros') != resultado['parametros']:
+        print("Aviso: baseline gerado com parametros diferentes, comparacao de tempo nao e confiavel.")
+
+    base_etapas = {m['etapa']: m for m in baseline.get('etapas', [])}
+    print(f"{'etapa':<14}{'base (s)':>10}{'atual (s)':>11}{'variacao':>10}")
+    for m in resultado['etapas']:
+        base = base_etapas.get(m['etapa'])
+        if not base: continue
+        variacao = ((m['segundos'] - base['segundos']) / base['segundos'] * 100) if base['segundos'] > 0 else 0
+        print(f"{m['etapa']:<14}{base['segundos']:>10.4f}{m['segundos']:>11.4f}{variacao:>9.1f}%")
+
+    grids_iguais = baseline.get('grid_sha256') == resultado['grid_sha256'] and baseline.get('kpi') == resultado['kpi']
+    print("Grid e KPI identicos ao baseline." if grids_iguais else "ATENCAO: grid ou KPI diferentes do baseline!")
+    return grids_iguais
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline OEE")
+    parser.add_argument('--circuitos', type=int, default=200)
+    parser.add_argument('--eventos', type=int, default=15)
+    parser.add_argument('--abas', type=int, default=3)
+    parser.add_argument('--mes', type=int, default=1)
+    parser.add_argument('--ano', type=int, default=2026)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--baseline', default=CAMINHO_BASELINE, help="arquivo de baseline para comparar")
+    parser.add_argument('--salvar-baseline', action='store_true', help="grava o resultado atual como baseline")
+    args = parser.parse_args()
+
+    resultado = executar_benchmark(args.circuitos, args.eventos, args.mes, args.ano, args.abas, args.repeticoes)
+
+    print(f"Linhas: {resultado['parametros']['linhas']} | Circuitos: {args.circuitos} | Eventos/circuito: {args.eventos}")
+    print(f"{'etapa':<14}{'tempo (s)':>10}{'linhas/s':>14}{'pico (MB)':>11}")
+    for m in resultado['etapas']:
+        print(f"{m['etapa']:<14}{m['segundos']:>10.4f}{m['linhas_por_seg'] or 0:>14.1f}{m['pico_mb']:>11.2f}")
+    print(f"Total: {resultado['total_segundos']}s | grid sha256: {resultado['grid_sha256'][:16]}")
+
+    if args.salvar_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"Baseline salvo em {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        return 0 if comparar_com_baseline(resultado, baseline) else 1
+
+    print("Nenhum baseline encontrado. Rode com --salvar-baseline para criar um.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#compressao das respostas dinamicas (JSON/texto) conforme o Accept-Encoding do navegador
+#brotli quando o pacote estiver instalado, senao gzip; respostas pequenas, streams (SSE) e arquivos estaticos passam direto
+
+import os
+import gzip
+import time
+from flask import request
+from metricas import observar
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TAMANHO_MINIMO = int(os.getenv("COMPRESSAO_MIN_BYTES", 1024))
+NIVEL_GZIP = int(os.getenv("COMPRESSAO_NIVEL_GZIP", 6))
+# qualidade baixa do brotli ja comprime mais que gzip 6 e gasta menos CPU que ele em JSON
+QUALIDADE_BROTLI = int(os.getenv("COMPRESSAO_QUALIDADE_BROTLI", 4))
+TIPOS_COMPRIMIVEIS = {'application/json', 'text/plain', 'text/html', 'text/csv', 'text/css', 'application/javascript', 'text/javascript', 'image/svg+xml'}
+
+def codificacoes_aceitas(cabecalho):
+    #'gzip, deflate, br;q=0.9' -> {'gzip': 1.0, 'deflate': 1.0, 'br': 0.9}
+    aceitas = {}
+    for parte in (cabecalho or '').split(','):
+        nome, _, parametros = parte.strip().partition(';')
+        if not nome:
+            continue
+        peso = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                peso = float(parametros[2:])
+            except ValueError:
+                peso = 0.0
+        aceitas[nome.strip().lower()] = peso
+    return aceitas
+
+def escolher_codificacao(cabecalho, disponiveis=None):
+    #disponiveis: codificacoes que ja existem prontas (arquivos .br/.gz do build); None = as que da pra gerar aqui
+    aceitas = codificacoes_aceitas(cabecalho)
+    candidatas = ((['br'] if brotli else []) + ['gzip']) if disponiveis is None else [c for c in ('br', 'gzip') if c in disponiveis]
+    candidatas = [c for c in candidatas if aceitas.get(c, aceitas.get('*', 0)) > 0]
+    if not candidatas:
+        return None
+    return max(candidatas, key=lambda c: aceitas.get(c, aceitas.get('*', 0)))
+
+def comprimir(dados, codificacao):
+    if codificacao == 'br':
+        return brotli.compress(dados, quality=QUALIDADE_BROTLI)
+    return gzip.compress(dados, compresslevel=NIVEL_GZIP)
+
+def registrar_compressao(app):
+    @app.after_request
+    def _comprimir_resposta(resposta):
+        if (resposta.is_streamed or resposta.direct_passthrough or resposta.status_code < 200 or resposta.status_code >= 300
+                or 'Content-Encoding' in resposta.headers or resposta.mimetype not in TIPOS_COMPRIMIVEIS):
+            return resposta
+
+        resposta.vary.add('Accept-Encoding')
+        codificacao = escolher_codificacao(request.headers.get('Accept-Encoding'))
+        if not codificacao:
+            return resposta
+
+        dados = resposta.get_data()
+        if len(dados) < TAMANHO_MINIMO:
+            return resposta
+
+        inicio = time.perf_counter()
+        comprimido = comprimir(dados, codificacao)
+        observar('labmanager_compressao_segundos', {'codificacao': codificacao}, time.perf_counter() - inicio)
+
+        resposta.set_data(comprimido)
+        resposta.headers['Content-Encoding'] = codificacao
+        if resposta.headers.get('ETag'):
+            # mesma entidade com codificacao diferente nao pode ter a mesma ETag forte
+            resposta.headers['ETag'] = resposta.headers['ETag'].rstrip('"') + f'-{codificacao}"'
+        return resposta
@@ -0,0 +1,42 @@
+#gera dist/**/*.gz e *.br depois do `npm run build` (roda sozinho no postbuild do lab-manager), pro estaticos.py entregar sem comprimir a cada requisicao
+#uso: python comprimir_dist.py [pasta_dist]
+
+import os
+import sys
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+EXTENSOES = ('.js', '.css', '.html', '.svg', '.json', '.txt', '.map', '.ico', '.woff', '.ttf')
+TAMANHO_MINIMO = 1024
+
+def comprimir_pasta(pasta):
+    total = 0
+    for raiz, _, arquivos in os.walk(pasta):
+        for nome in arquivos:
+            if not nome.endswith(EXTENSOES):
+                continue
+            caminho = os.path.join(raiz, nome)
+            with open(caminho, 'rb') as f:
+                dados = f.read()
+            if len(dados) < TAMANHO_MINIMO:
+                continue
+            # no build da pra usar o nivel maximo: e feito uma vez so
+            with open(caminho + '.gz', 'wb') as f:
+                f.write(gzip.compress(dados, compresslevel=9, mtime=0))
+            if brotli:
+                with open(caminho + '.br', 'wb') as f:
+                    f.write(brotli.compress(dados, quality=11))
+            total += 1
+    return total
+
+if __name__ == '__main__':
+    diretorio_base = os.path.dirname(os.path.abspath(__file__))
+    pasta = sys.argv[1] if len(sys.argv) > 1 else os.path.join(diretorio_base, 'dist')
+    if not os.path.isdir(pasta):
+        print(f"Pasta {pasta} não existe.")
+        sys.exit(1)
+    print(f"{comprimir_pasta(pasta)} arquivos comprimidos em {pasta}" + ("" if brotli else " (so gzip: brotli nao instalado)"))
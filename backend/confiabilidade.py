@@ -0,0 +1,243 @@
+#confiabilidade por circuito (falhas, MTBF, MTTR, horas ocupado/ocioso) mantida a cada log gravado em circuit_logs
+#um documento por circuito em confiabilidade/{chave}: cada log so disputa o documento do proprio circuito e o ranking
+#do laboratorio e uma leitura da colecao
+#cada circuito guarda o estado atual e desde quando; o trecho em aberto entra nas horas so na hora de calcular
+
+import os
+import atexit
+import threading
+from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
+from configuracao import bd_firestore
+from metricas import medir_operacao, desembrulhar
+from modelos import numero_circuito
+from utilitarios import obter_agora, data_para_epoch_ms
+import arquivo_logs
+
+HORA_MS = 3600 * 1000
+
+# acao do log -> estado em que o circuito fica depois dela
+TRANSICOES = {
+    'Início de Teste': 'ocupado',
+    'Teste Concluído': 'livre',
+    'Entrada em Manutenção': 'manutencao',
+    'Falha no Equipamento': 'manutencao',
+    'Reparo Realizado': 'livre',
+    'Saída de Manutenção': 'livre',
+}
+# so essas acoes contam como falha (MTBF); entrada em manutencao planejada nao e falha
+# CONFIABILIDADE_ACOES_FALHA aceita varias separadas por virgula
+ACOES_FALHA = {a.strip() for a in os.getenv("CONFIABILIDADE_ACOES_FALHA", "Falha no Equipamento").split(',') if a.strip()}
+CAMPO_HORAS = {'ocupado': 'horasOcupado', 'livre': 'horasOcioso', 'manutencao': 'horasManutencao'}
+ORDENACOES = ('falhas', 'mtbf', 'mttr', 'utilizacao')
+COLECAO = 'confiabilidade'
+# limite do operador 'in' do firestore
+MAX_GRAFIAS = 30
+
+def _colecao():
+    return bd_firestore.collection(COLECAO)
+
+def chave_circuito(circuit_id):
+    #'C-012', 'c12' e '12' sao o mesmo circuito (mesma regra de numero_circuito usada nas rotas)
+    numero = numero_circuito(circuit_id)
+    return str(numero) if numero is not None else str(circuit_id)
+
+def rollup_vazio(circuit_id):
+    return {
+        'circuitId': str(circuit_id), 'estado': None, 'desdeMs': None, 'ultimoLogMs': 0,
+        'falhas': 0, 'reparos': 0, 'horasOcupado': 0.0, 'horasOcioso': 0.0, 'horasManutencao': 0.0, 'grafias': []
+    }
+
+def grafias_do_circuito(circuit_id, conhecidas=()):
+    #valores de circuitId que podem estar gravados no circuit_logs pro mesmo circuito: as ja vistas nos logs
+    #(guardadas no rollup) mais os formatos que o sistema usa ('12', 'C12', 'C-12', 'C-012'...)
+    grafias = [circuit_id, str(circuit_id)] + list(conhecidas)
+    numero = numero_circuito(circuit_id)
+    if numero is not None:
+        for texto in (f"{numero}", f"{numero:02d}", f"{numero:03d}"):
+            grafias += [texto, f"C{texto}", f"C-{texto}", f"c{texto}", f"c-{texto}"]
+        grafias.append(numero)
+    unicas = []
+    for g in grafias:
+        if g not in unicas:
+            unicas.append(g)
+    return unicas[:MAX_GRAFIAS]
+
+def aplicar_log(rollup, log):
+    #log fora de ordem ou repetido (mesmo id) e ignorado; o recalculo a partir do circuit_logs corrige esses casos
+    novo_estado = TRANSICOES.get(log.get('action'))
+    try:
+        momento = int(log.get('id'))
+    except (TypeError, ValueError):
+        return False
+    if novo_estado is None or momento <= rollup['ultimoLogMs']:
+        return False
+
+    estado = rollup['estado']
+    if estado is not None and rollup['desdeMs'] is not None:
+        rollup[CAMPO_HORAS[estado]] += max(0, momento - rollup['desdeMs']) / HORA_MS
+    if log.get('action') in ACOES_FALHA:
+        rollup['falhas'] += 1
+    if estado == 'manutencao' and novo_estado != 'manutencao':
+        rollup['reparos'] += 1
+
+    rollup['estado'] = novo_estado
+    rollup['desdeMs'] = momento
+    rollup['ultimoLogMs'] = momento
+    rollup['circuitId'] = str(log.get('circuitId', rollup['circuitId']))
+    grafias = rollup.setdefault('grafias', [])
+    if log.get('circuitId') is not None and log['circuitId'] not in grafias:
+        grafias.append(log['circuitId'])
+    return True
+
+def indicadores(rollup, agora_ms):
+    horas = {campo: rollup.get(campo, 0.0) for campo in CAMPO_HORAS.values()}
+    estado = rollup.get('estado')
+    if estado is not None and rollup.get('desdeMs') is not None:
+        horas[CAMPO_HORAS[estado]] += max(0, agora_ms - rollup['desdeMs']) / HORA_MS
+
+    em_operacao = horas['horasOcupado'] + horas['horasOcioso']
+    falhas = rollup.get('falhas', 0)
+    reparos = rollup.get('reparos', 0)
+    return {
+        'circuitId': rollup.get('circuitId'),
+        'estado': estado,
+        'falhas': falhas,
+        'mtbfHoras': round(em_operacao / falhas, 1) if falhas else None,
+        'mttrHoras': round(horas['horasManutencao'] / reparos, 1) if reparos else None,
+        'horasOcupado': round(horas['horasOcupado'], 1),
+        'horasOcioso': round(horas['horasOcioso'], 1),
+        'horasManutencao': round(horas['horasManutencao'], 1),
+        'utilizacao': round(horas['horasOcupado'] / em_operacao * 100, 1) if em_operacao else None
+    }
+
+@firestore.transactional
+def _aplicar_nos_documentos(transacao, logs_por_chave):
+    #todas as leituras antes de qualquer escrita, como a transacao exige
+    refs = {chave: _colecao().document(chave) for chave in logs_por_chave}
+    snaps = {chave: ref.get(transaction=transacao) for chave, ref in refs.items()}
+    alterados = 0
+    for chave, logs in logs_por_chave.items():
+        rollup = (snaps[chave].to_dict() if snaps[chave].exists else None) or rollup_vazio(logs[0].get('circuitId'))
+        mudou = False
+        for log in logs:
+            mudou = aplicar_log(rollup, log) or mudou
+        if mudou:
+            transacao.set(desembrulhar(refs[chave]), rollup)
+            alterados += 1
+    return alterados
+
+def registrar_logs(logs):
+    #chamado depois de gravar em circuit_logs; uma transacao por chamada, que so toca os circuitos do lote
+    if not bd_firestore:
+        return 0
+    logs_por_chave = {}
+    for log in sorted(logs, key=lambda l: int(l.get('id') or 0)):
+        if log.get('action') in TRANSICOES and log.get('circuitId') is not None:
+            logs_por_chave.setdefault(chave_circuito(log['circuitId']), []).append(log)
+    if not logs_por_chave:
+        return 0
+    try:
+        with medir_operacao('confiabilidade_registrar'):
+            return _aplicar_nos_documentos(bd_firestore.transaction(), logs_por_chave)
+    except Exception as erro:
+        print(f"Erro ao atualizar confiabilidade: {erro}")
+        return 0
+
+_pendentes = []
+_trava_pendentes = threading.Lock()
+_trava_processamento = threading.Lock()
+_acordar = threading.Event()
+_thread = None
+
+def registrar_logs_em_segundo_plano(logs):
+    #caminho da requisicao (outbox desligado): a transacao sai numa thread e os logs que chegarem enquanto ela roda
+    #vao juntos na proxima, entao rajada de logs vira poucas transacoes e a resposta nao espera nenhuma
+    global _thread
+    with _trava_pendentes:
+        _pendentes.extend(logs)
+        if _thread is None:
+            _thread = threading.Thread(target=_laco_segundo_plano, name='confiabilidade', daemon=True)
+            _thread.start()
+    _acordar.set()
+
+def _laco_segundo_plano():
+    while True:
+        _acordar.wait()
+        _acordar.clear()
+        descarregar_pendentes()
+
+def descarregar_pendentes():
+    #uma rodada por vez: duas transacoes em paralelo fariam o lote mais novo chegar antes e o outro ser ignorado
+    with _trava_processamento:
+        with _trava_pendentes:
+            logs = _pendentes[:]
+            del _pendentes[:]
+        return registrar_logs(logs) if logs else 0
+
+atexit.register(descarregar_pendentes)
+
+def _ler_logs(circuit_id):
+    consulta = bd_firestore.collection('circuit_logs')
+    if circuit_id is None:
+        logs = [doc.to_dict() for doc in consulta.select(['id', 'action', 'circuitId']).stream()]
+        return arquivo_logs.juntar_com_quentes(logs, arquivo_logs.ler_arquivados('circuit_logs'))
+
+    # o mesmo circuito pode estar gravado com grafias diferentes: busca todas e confere pela chave normalizada
+    chave = chave_circuito(circuit_id)
+    existente = _colecao().document(chave).get()
+    grafias = grafias_do_circuito(circuit_id, (existente.to_dict() or {}).get('grafias', []) if existente.exists else [])
+    logs = [doc.to_dict() for doc in consulta.where(filter=FieldFilter('circuitId', 'in', grafias)).select(['id', 'action', 'circuitId']).stream()]
+    arquivados = []
+    for grafia in {str(g) for g in grafias}:
+        arquivados += arquivo_logs.ler_arquivados('circuit_logs', grafia)
+    logs = arquivo_logs.juntar_com_quentes(logs, arquivados)
+    return [log for log in logs if log.get('circuitId') is not None and chave_circuito(log['circuitId']) == chave]
+
+def recalcular(circuit_id=None):
+    #refaz do zero lendo o circuit_logs e os meses arquivados (backfill, log apagado); circuit_id None = laboratorio inteiro
+    rollups = {}
+    with medir_operacao('confiabilidade_recalcular'):
+        logs = _ler_logs(circuit_id)
+    for log in sorted(logs, key=lambda l: int(l.get('id') or 0)):
+        if log.get('action') not in TRANSICOES or log.get('circuitId') is None:
+            continue
+        chave = chave_circuito(log['circuitId'])
+        aplicar_log(rollups.setdefault(chave, rollup_vazio(log['circuitId'])), log)
+
+    if circuit_id is not None:
+        chave = chave_circuito(circuit_id)
+        _colecao().document(chave).set(rollups.get(chave) or rollup_vazio(circuit_id))
+        return len(rollups)
+
+    # laboratorio inteiro: regrava todos e apaga rollup de circuito que nao tem mais log nenhum
+    escritas = [(chave, rollup) for chave, rollup in rollups.items()]
+    escritas += [(doc.id, None) for doc in _colecao().select([]).stream() if doc.id not in rollups]
+    for inicio in range(0, len(escritas), 400):
+        lote = bd_firestore.batch()
+        for chave, rollup in escritas[inicio:inicio + 400]:
+            ref = desembrulhar(_colecao().document(chave))
+            if rollup is None:
+                lote.delete(ref)
+            else:
+                lote.set(ref, rollup)
+        lote.commit()
+    return len(rollups)
+
+def ranking(ordenar_por='falhas', limite=20):
+    #piores primeiro: mais falhas, menor MTBF, maior MTTR ou menor utilizacao (circuito sem dado vai pro fim)
+    with medir_operacao('confiabilidade_ranking'):
+        circuitos = [doc.to_dict() for doc in _colecao().stream()]
+    agora_ms = data_para_epoch_ms(obter_agora())
+    linhas = [indicadores(r, agora_ms) for r in circuitos]
+
+    if ordenar_por == 'mtbf':
+        chave = lambda l: (l['mtbfHoras'] is None, l['mtbfHoras'] or 0, -l['falhas'])
+    elif ordenar_por == 'mttr':
+        chave = lambda l: (l['mttrHoras'] is None, -(l['mttrHoras'] or 0), -l['falhas'])
+    elif ordenar_por == 'utilizacao':
+        chave = lambda l: (l['utilizacao'] is None, l['utilizacao'] or 0)
+    else:
+        chave = lambda l: (-l['falhas'], -(l['mttrHoras'] or 0))
+    linhas.sort(key=chave)
+    return {'total': len(linhas), 'circuitos': linhas[:limite]}
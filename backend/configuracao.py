@@ -3,6 +3,7 @@ import os
 import json
 import firebase_admin
 from firebase_admin import credentials, firestore
+from metricas import FirestoreInstrumentado
 
 # descobre a pasta raiz do projeto automaticamente
 diretorio_base = os.path.dirname(os.path.abspath(__file__))
@@ -30,7 +31,7 @@ def inicializar_firebase():
          
             if not firebase_admin._apps:
                 firebase_admin.initialize_app(credencial)
-            return firestore.client()
+            return FirestoreInstrumentado(firestore.client())
             
     except Exception as erro:
         print(f"Aviso: Erro ao conectar com Firebase - {erro}")
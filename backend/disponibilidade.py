@@ -0,0 +1,160 @@
+#indice de disponibilidade dos circuitos pra planejar teste novo: cada circuito (ou par paralelo) vira um
+#intervalo [livre_a_partir_ms, infinito) guardado numa lista ordenada por temperatura do banho
+#a consulta pega os primeiros da lista certa, sem varrer o laboratorio; atualiza por banho via eventos_lab
+
+import os
+import time
+import bisect
+import threading
+import eventos_lab
+from modelos import Banho
+
+INTERVALO_RESSINCRONIZACAO_SEG = int(os.getenv("DISPONIBILIDADE_RESSINC_SEG", 60))
+
+def chave_temperatura(temp):
+    #25, '25' e '25.0' sao o mesmo banho pra quem planeja
+    try:
+        return f"{float(temp):g}"
+    except (TypeError, ValueError):
+        return str(temp).strip()
+
+def pares_do_banho(circuitos):
+    #pares paralelos que o proprio banho registra: linkedTo nos dois sentidos (gravado pelo vinculo em paralelo).
+    #circuito antigo, vinculado antes do linkedTo existir, so da pra reconhecer enquanto roda: o vinculo clona
+    #bateria e inicio, entao dois isParallel rodando com a mesma bateria e o mesmo inicio sao o par
+    por_id = {c.id: c for c in circuitos}
+    pares = []
+    for c in circuitos:
+        parceiro = por_id.get(c.ligado_a)
+        if parceiro is not None and parceiro.ligado_a == c.id and str(c.id) < str(parceiro.id):
+            pares.append((c, parceiro))
+    legado = {}
+    for c in circuitos:
+        if c.ligado_a is None and c.is_parallel and c.rodando and c.battery_id:
+            legado.setdefault((c.battery_id, c.inicio_ms), []).append(c)
+    pares.extend(tuple(grupo) for grupo in legado.values() if len(grupo) == 2)
+    return pares
+
+def unidades_do_banho(bath):
+    #devolve (temp, simples, pares); cada unidade e (livre_ms, bath_id, numero, ids_dos_circuitos)
+    banho = Banho.de_dict(bath)
+    temp = chave_temperatura(banho.temp)
+    simples = []
+    if banho.is_full:
+        return temp, simples, []
+    bath_id = str(banho.id)
+    for c in banho.circuitos:
+        if c.status == 'maintenance' or c.no_space or c.numero is None:
+            continue
+        if c.rodando:
+            # 'A calcular' / '-' nao diz quando libera, entao nao entra no planejamento
+            if c.fim_ms is None:
+                continue
+            livre = c.fim_ms
+        else:
+            livre = 0
+        simples.append((livre, bath_id, c.numero, (c.id,)))
+
+    # par paralelo libera quando o ultimo dos dois liberar; se um dos dois nao pode ser planejado o par tambem nao
+    pares = []
+    por_id = {u[3][0]: u for u in simples}
+    for a, b in pares_do_banho(banho.circuitos):
+        ua, ub = por_id.get(a.id), por_id.get(b.id)
+        if ua and ub:
+            pares.append((max(ua[0], ub[0]), bath_id, min(ua[2], ub[2]), ua[3] + ub[3]))
+    return temp, simples, pares
+
+class IndiceDisponibilidade:
+    def __init__(self):
+        self._trava = threading.Lock()
+        # (temp, paralelo) -> lista ordenada de unidades
+        self._listas = {}
+        # bath_id -> (temp, simples, pares) que esse banho colocou nas listas
+        self._por_banho = {}
+        # nome do protocolo em maiusculas -> (nome, duracao em horas); vem junto com o banco e com o evento 'protocolos'
+        self._protocolos = {}
+        self.sincronizado_em = None
+
+    @property
+    def sincronizado(self):
+        return self.sincronizado_em is not None
+
+    def precisa_sincronizar(self):
+        return self.sincronizado_em is None or time.time() - self.sincronizado_em > INTERVALO_RESSINCRONIZACAO_SEG
+
+    def _inserir_sem_trava(self, bath_id, bath):
+        temp, simples, pares = unidades_do_banho(bath)
+        for paralelo, unidades in ((False, simples), (True, pares)):
+            lista = self._listas.setdefault((temp, paralelo), [])
+            for u in unidades:
+                bisect.insort(lista, u)
+        self._por_banho[bath_id] = (temp, simples, pares)
+
+    def _remover_sem_trava(self, bath_id):
+        anterior = self._por_banho.pop(bath_id, None)
+        if not anterior:
+            return
+        temp, simples, pares = anterior
+        for paralelo, unidades in ((False, simples), (True, pares)):
+            lista = self._listas.get((temp, paralelo), [])
+            for u in unidades:
+                i = bisect.bisect_left(lista, u)
+                if i < len(lista) and lista[i] == u:
+                    del lista[i]
+
+    def atualizar_protocolos(self, protocolos):
+        with self._trava:
+            self._protocolos = {str(p.get('name', '')).upper(): (p.get('name'), p.get('duration')) for p in protocolos or []}
+
+    def protocolo(self, nome):
+        #(nome, duracao) ou None se o protocolo nao existe
+        with self._trava:
+            return self._protocolos.get(str(nome).upper())
+
+    def sincronizar(self, db):
+        # o evento 'banhos' traz so os banhos: os protocolos ficam como estavam
+        if 'protocols' in db:
+            self.atualizar_protocolos(db['protocols'])
+        with self._trava:
+            self._listas = {}
+            self._por_banho = {}
+            for bath in db.get('baths', []):
+                self._inserir_sem_trava(str(bath['id']), bath)
+            self.sincronizado_em = time.time()
+
+    def atualizar_banho(self, bath_id, bath, old_id=None):
+        with self._trava:
+            if old_id:
+                self._remover_sem_trava(str(old_id))
+            self._remover_sem_trava(str(bath_id))
+            if bath:
+                self._inserir_sem_trava(str(bath['id']), bath)
+
+    def mais_cedo(self, temp, quantidade, paralelo=False, a_partir_ms=0):
+        #primeiras `quantidade` unidades por ordem de liberacao, sem repetir circuito entre pares sobrepostos
+        with self._trava:
+            lista = self._listas.get((chave_temperatura(temp), bool(paralelo)), [])
+            livres_ja = bisect.bisect_right(lista, (a_partir_ms, chr(0x10FFFF)))
+            escolhidas = []
+            usados = set()
+            for livre, bath_id, numero, ids in lista:
+                if usados.intersection(ids):
+                    continue
+                usados.update(ids)
+                escolhidas.append({'bathId': bath_id, 'circuitIds': list(ids), 'inicioMs': max(livre, a_partir_ms)})
+                if len(escolhidas) == quantidade:
+                    break
+            return escolhidas, livres_ja
+
+indice = IndiceDisponibilidade()
+
+def _ao_evento(tipo, dados):
+    if tipo == 'banho':
+        if indice.sincronizado:
+            indice.atualizar_banho(dados.get('bathId'), dados.get('bath'), dados.get('oldId'))
+    elif tipo in ('banhos', 'snapshot'):
+        indice.sincronizar(dados)
+    elif tipo == 'protocolos':
+        indice.atualizar_protocolos(dados.get('protocols'))
+
+eventos_lab.assinar(_ao_evento)
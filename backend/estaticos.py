@@ -0,0 +1,103 @@
+#entrega do build do Vite (dist): os arquivos sao listados uma vez no boot
+#assets com hash no nome ficam em cache por um ano (immutable); index.html sempre revalida via ETag
+#se existir arquivo.br / arquivo.gz ao lado do original e o navegador aceitar, vai o pre-comprimido
+
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+from flask import request, send_file, jsonify
+from compressao import escolher_codificacao
+
+# vite gera assets/index-B2x9kQ1a.js; o hash muda a cada build, entao o arquivo nunca muda de conteudo
+PADRAO_HASH = re.compile(r'-[A-Za-z0-9_-]{8,}\.[a-z0-9]+$')
+EXTENSOES_VARIANTES = {'br': '.br', 'gzip': '.gz'}
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+CACHE_INDEX = 'no-cache'
+CACHE_OUTROS = 'public, max-age=3600'
+
+def montar_manifesto(pasta):
+    #caminho relativo -> dados do arquivo; variantes comprimidas nao entram como arquivo proprio
+    manifesto = {}
+    if not os.path.isdir(pasta):
+        return manifesto
+    for raiz, _, arquivos in os.walk(pasta):
+        nomes = set(arquivos)
+        for nome in arquivos:
+            if nome.endswith(tuple(EXTENSOES_VARIANTES.values())) and nome.rsplit('.', 1)[0] in nomes:
+                continue
+            caminho = os.path.join(raiz, nome)
+            relativo = os.path.relpath(caminho, pasta).replace(os.sep, '/')
+            variantes = {cod: caminho + ext for cod, ext in EXTENSOES_VARIANTES.items() if nome + ext in nomes}
+            if PADRAO_HASH.search(nome) and relativo.startswith('assets/'):
+                cache = CACHE_IMUTAVEL
+            elif relativo == 'index.html':
+                cache = CACHE_INDEX
+            else:
+                cache = CACHE_OUTROS
+            manifesto[relativo] = {
+                'caminho': caminho,
+                'mimetype': mimetypes.guess_type(nome)[0] or 'application/octet-stream',
+                'variantes': variantes,
+                'cache': cache
+            }
+    return manifesto
+
+def registrar_estaticos(app, pasta):
+    manifesto = montar_manifesto(pasta)
+    index = manifesto.get('index.html')
+    # index.html (e as versoes comprimidas dele) vai pra memoria: o fallback do SPA responde sem tocar no disco
+    versoes_index = {}
+    index_etag = None
+    if index:
+        with open(index['caminho'], 'rb') as f:
+            versoes_index[None] = f.read()
+        for codificacao, caminho in index['variantes'].items():
+            with open(caminho, 'rb') as f:
+                versoes_index[codificacao] = f.read()
+        if 'gzip' not in versoes_index:
+            versoes_index['gzip'] = gzip.compress(versoes_index[None], compresslevel=9)
+        index_etag = hashlib.sha1(versoes_index[None]).hexdigest()[:16]
+
+    def _enviar_index():
+        if not versoes_index:
+            return jsonify({"sucesso": False, "erro": "Frontend não encontrado (rode o build do Vite)."}), 404
+        codificacao = escolher_codificacao(request.headers.get('Accept-Encoding'), versoes_index)
+        resposta = app.response_class(versoes_index[codificacao], mimetype='text/html')
+        resposta.vary.add('Accept-Encoding')
+        resposta.headers['Cache-Control'] = CACHE_INDEX
+        if codificacao:
+            # ja vai com Content-Encoding, entao a compressao dinamica nao mexe (nem na ETag)
+            resposta.headers['Content-Encoding'] = codificacao
+            resposta.set_etag(f"{index_etag}-{codificacao}")
+        else:
+            resposta.set_etag(index_etag)
+        return resposta.make_conditional(request)
+
+    def _enviar_arquivo(item):
+        codificacao = escolher_codificacao(request.headers.get('Accept-Encoding'), item['variantes']) if item['variantes'] else None
+        caminho = item['variantes'][codificacao] if codificacao else item['caminho']
+        resposta = send_file(caminho, mimetype=item['mimetype'], conditional=True, etag=True, max_age=None)
+        resposta.headers['Cache-Control'] = item['cache']
+        if item['variantes']:
+            resposta.vary.add('Accept-Encoding')
+        if codificacao:
+            resposta.headers['Content-Encoding'] = codificacao
+        return resposta
+
+    @app.route('/', defaults={'caminho': ''})
+    @app.route('/<path:caminho>')
+    def servir_frontend(caminho):
+        if caminho.startswith('api/'):
+            return jsonify({"sucesso": False, "erro": "Rota não encontrada."}), 404
+        item = manifesto.get(caminho)
+        if item is None and caminho.startswith('assets/'):
+            # asset de um build antigo: 404 de verdade, senao o navegador recebe html no lugar do js
+            return jsonify({"sucesso": False, "erro": "Arquivo não encontrado."}), 404
+        if item is None or caminho == 'index.html':
+            # rota do react (/solicitacoes, /oee...) -> index.html
+            return _enviar_index()
+        return _enviar_arquivo(item)
+
+    return manifesto
@@ -0,0 +1,130 @@
+#barramento de eventos do quadro do laboratorio, alimenta o stream SSE em /api/stream
+#cada evento tem id '<boot>-<seq>': se o cliente reconectar com um Last-Event-ID ainda no buffer so recebe o que perdeu
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from metricas import registrar_medidor
+
+TAMANHO_BUFFER = 500
+INTERVALO_PING_SEG = 15
+# cada stream aberto prende uma thread do gthread (16 por worker) ate o token vencer; passando disso o cliente
+# recebe 503 e continua no polling de /data, sem tirar thread das requisicoes normais
+MAX_CONEXOES_STREAM = int(os.getenv("SSE_MAX_CONEXOES", 6))
+
+_ID_BOOT = str(int(time.time()))
+_condicao = threading.Condition()
+_buffer = deque(maxlen=TAMANHO_BUFFER)
+_sequencia = 0
+_assinantes = []
+_trava_conexoes = threading.Lock()
+_conexoes_abertas = 0
+
+def assinar(funcao):
+    #funcao(tipo, dados) chamada a cada evento publicado neste worker (ex: agregados do dashboard)
+    _assinantes.append(funcao)
+
+def publicar(tipo, dados):
+    global _sequencia
+    with _condicao:
+        _sequencia += 1
+        seq = _sequencia
+        _buffer.append((seq, tipo, dados))
+        _condicao.notify_all()
+    for funcao in _assinantes:
+        try:
+            funcao(tipo, dados)
+        except Exception as erro:
+            print(f"Aviso: assinante de eventos falhou - {erro}")
+    return f"{_ID_BOOT}-{seq}"
+
+def reservar_conexao():
+    global _conexoes_abertas
+    with _trava_conexoes:
+        if _conexoes_abertas >= MAX_CONEXOES_STREAM:
+            return False
+        _conexoes_abertas += 1
+        return True
+
+def liberar_conexao():
+    global _conexoes_abertas
+    with _trava_conexoes:
+        _conexoes_abertas = max(0, _conexoes_abertas - 1)
+
+def conexoes_abertas():
+    with _trava_conexoes:
+        return _conexoes_abertas
+
+def versao_atual():
+    with _condicao:
+        return f"{_ID_BOOT}-{_sequencia}"
+
+def _sequencia_do_id(id_evento):
+    #None quando o id e de outro boot/worker ou invalido -> cliente precisa de snapshot completo
+    if not id_evento or '-' not in id_evento:
+        return None
+    boot, _, seq = id_evento.rpartition('-')
+    if boot != _ID_BOOT or not seq.isdigit():
+        return None
+    return int(seq)
+
+def eventos_desde(id_evento):
+    #devolve (eventos, ok); ok=False se o buffer ja descartou algum evento que o cliente nao viu
+    seq = _sequencia_do_id(id_evento)
+    if seq is None:
+        return [], False
+    with _condicao:
+        if seq > _sequencia:
+            return [], False
+        if seq < _sequencia and (not _buffer or _buffer[0][0] > seq + 1):
+            return [], False
+        return [e for e in _buffer if e[0] > seq], True
+
+def formatar_sse(tipo, dados, id_evento=None):
+    linhas = []
+    if id_evento:
+        linhas.append(f"id: {id_evento}")
+    linhas.append(f"event: {tipo}")
+    linhas.append(f"data: {json.dumps(dados, ensure_ascii=False, separators=(',', ':'))}")
+    return '\n'.join(linhas) + '\n\n'
+
+def gerar_stream(obter_snapshot, ultimo_id=None, encerrar_em=None):
+    #obter_snapshot e chamado so quando nao da pra retomar pelo buffer
+    #encerrar_em (epoch) fecha o stream quando o token expira; o navegador reconecta com token novo e Last-Event-ID
+    pendentes, ok = eventos_desde(ultimo_id)
+    if ok:
+        seq = pendentes[-1][0] if pendentes else _sequencia_do_id(ultimo_id)
+        for s, tipo, dados in pendentes:
+            yield formatar_sse(tipo, dados, f"{_ID_BOOT}-{s}")
+    else:
+        with _condicao:
+            seq = _sequencia
+        yield formatar_sse('snapshot', obter_snapshot(), f"{_ID_BOOT}-{seq}")
+
+    yield "retry: 3000\n\n"
+
+    while not encerrar_em or time.time() < encerrar_em:
+        with _condicao:
+            if _sequencia == seq:
+                _condicao.wait(timeout=INTERVALO_PING_SEG)
+            novos = [e for e in _buffer if e[0] > seq]
+            perdeu_eventos = bool(novos) and novos[0][0] > seq + 1
+            seq_atual = _sequencia
+
+        if perdeu_eventos:
+            # cliente lento demais pro buffer: manda o estado inteiro de novo
+            seq = seq_atual
+            yield formatar_sse('snapshot', obter_snapshot(), f"{_ID_BOOT}-{seq}")
+            continue
+
+        if not novos:
+            yield ": ping\n\n"
+            continue
+
+        for s, tipo, dados in novos:
+            seq = s
+            yield formatar_sse(tipo, dados, f"{_ID_BOOT}-{s}")
+
+registrar_medidor('labmanager_sse_conexoes', conexoes_abertas)
@@ -0,0 +1,147 @@
+#indice invertido em memoria (token + prefixo) pra busca de solicitacoes e experiencias sem baixar a lista toda
+
+import re
+import time
+import threading
+import unicodedata
+
+TAMANHO_MIN_PREFIXO = 2
+TAMANHO_MAX_PREFIXO = 12
+
+def normalizar_texto(texto):
+    #tira acento e deixa minusculo pra 'Laboratório' bater com 'laboratorio'
+    texto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+def tokenizar(texto):
+    if texto is None:
+        return []
+    return [t for t in re.split(r'[^0-9a-z]+', normalizar_texto(texto)) if t]
+
+class IndiceBusca:
+    def __init__(self, campos_por_tipo, pesos=None):
+        # campos_por_tipo: {'solicitacao': [...], 'experiencia': [...]}, campo pode ser 'a.b' pra dict aninhado
+        self.campos_por_tipo = campos_por_tipo
+        self.pesos = pesos or {}
+        self._trava = threading.RLock()
+        self._postings = {}
+        self._prefixos = {}
+        self._documentos = {}
+        self.carregado_em = None
+
+    def _valor_campo(self, dados, campo):
+        valor = dados
+        for parte in campo.split('.'):
+            if not isinstance(valor, dict):
+                return None
+            valor = valor.get(parte)
+        return valor
+
+    def _remover_postings(self, chave):
+        doc = self._documentos.get(chave)
+        if not doc:
+            return
+        for token in doc['tokens']:
+            lista = self._postings.get(token)
+            if lista is None:
+                continue
+            lista.pop(chave, None)
+            if not lista:
+                del self._postings[token]
+                for n in range(TAMANHO_MIN_PREFIXO, min(len(token), TAMANHO_MAX_PREFIXO) + 1):
+                    conjunto = self._prefixos.get(token[:n])
+                    if conjunto is not None:
+                        conjunto.discard(token)
+                        if not conjunto:
+                            del self._prefixos[token[:n]]
+
+    def indexar(self, tipo, id_doc, dados, parcial=False):
+        if tipo not in self.campos_por_tipo or not id_doc:
+            return
+        chave = (tipo, str(id_doc))
+        with self._trava:
+            campos = {}
+            if parcial and chave in self._documentos:
+                campos.update(self._documentos[chave]['campos'])
+            for campo in self.campos_por_tipo[tipo]:
+                valor = self._valor_campo(dados, campo)
+                if valor is not None:
+                    campos[campo] = valor
+            ordem = dados.get('dataCriacaoTs') or (self._documentos.get(chave, {}).get('ordem') if parcial else None) or 0
+
+            self._remover_postings(chave)
+
+            tokens = {}
+            for campo, valor in campos.items():
+                peso = self.pesos.get(campo, 1.0)
+                for token in tokenizar(valor):
+                    tokens[token] = max(tokens.get(token, 0), peso)
+
+            for token, peso in tokens.items():
+                lista = self._postings.setdefault(token, {})
+                if not lista:
+                    for n in range(TAMANHO_MIN_PREFIXO, min(len(token), TAMANHO_MAX_PREFIXO) + 1):
+                        self._prefixos.setdefault(token[:n], set()).add(token)
+                lista[chave] = peso
+
+            self._documentos[chave] = {'campos': campos, 'tokens': tokens, 'ordem': ordem}
+
+    def remover(self, tipo, id_doc):
+        chave = (tipo, str(id_doc))
+        with self._trava:
+            self._remover_postings(chave)
+            self._documentos.pop(chave, None)
+
+    def recarregar(self, documentos_por_tipo):
+        # documentos_por_tipo: {'solicitacao': [(id, dados), ...], ...}
+        with self._trava:
+            self._postings = {}
+            self._prefixos = {}
+            self._documentos = {}
+            for tipo, documentos in documentos_por_tipo.items():
+                for id_doc, dados in documentos:
+                    self.indexar(tipo, id_doc, dados)
+            self.carregado_em = time.time()
+
+    def buscar(self, consulta, limite=20, tipo=None):
+        termos = tokenizar(consulta)
+        if not termos:
+            return []
+
+        with self._trava:
+            pontuacao = None
+            for termo in termos:
+                # exato vale o dobro do prefixo; o documento precisa bater todos os termos
+                pontos_termo = {}
+                for chave, peso in self._postings.get(termo, {}).items():
+                    pontos_termo[chave] = peso * 2
+                if len(termo) >= TAMANHO_MIN_PREFIXO:
+                    candidatos = self._prefixos.get(termo[:TAMANHO_MAX_PREFIXO], ())
+                    for token in candidatos:
+                        if token == termo or not token.startswith(termo):
+                            continue
+                        for chave, peso in self._postings.get(token, {}).items():
+                            if peso > pontos_termo.get(chave, 0):
+                                pontos_termo[chave] = peso
+
+                if pontuacao is None:
+                    pontuacao = pontos_termo
+                else:
+                    pontuacao = {k: v + pontos_termo[k] for k, v in pontuacao.items() if k in pontos_termo}
+                if not pontuacao:
+                    return []
+
+            if tipo:
+                pontuacao = {k: v for k, v in pontuacao.items() if k[0] == tipo}
+
+            ordenados = sorted(pontuacao.items(), key=lambda item: (-item[1], -self._documentos[item[0]]['ordem']))[:limite]
+            return [{
+                'tipo': chave[0],
+                'id': chave[1],
+                'score': round(pontos, 2),
+                'campos': dict(self._documentos[chave]['campos'])
+            } for chave, pontos in ordenados]
+
+    def total_documentos(self):
+        with self._trava:
+            return len(self._documentos)
@@ -0,0 +1,236 @@
+#metricas de latencia das rotas e das chamadas ao firestore, expostas no formato texto do prometheus
+
+import time
+import threading
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+from provedor_json import ProvedorJSONRapido, USAR_ORJSON
+
+BUCKETS_LATENCIA = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+BUCKETS_TAMANHO = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+BUCKETS_OPERACOES = [0, 1, 2, 5, 10, 20, 50, 100]
+
+OPERACOES_LEITURA = {'get', 'stream'}
+OPERACOES_ESCRITA = {'set', 'update', 'delete', 'add', 'create', 'commit'}
+# dentro de um batch set/update/delete so empilham a operacao (sem rede); quem vai pro firestore e o commit
+OPERACOES_EMPILHADAS = {'set', 'update', 'delete', 'create'}
+METODOS_ENCADEADOS = {'collection', 'document', 'where', 'order_by', 'limit', 'limit_to_last', 'offset',
+                      'start_at', 'start_after', 'end_at', 'end_before', 'select', 'collection_group', 'batch'}
+
+_trava = threading.Lock()
+_histogramas = {}
+_contadores = {}
+_inicializacao = {}
+_medidores = {}
+
+class _Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.soma += valor
+        self.total += 1
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[i] += 1
+
+def observar(nome, rotulos, valor, buckets=BUCKETS_LATENCIA):
+    chave = (nome, tuple(sorted(rotulos.items())))
+    with _trava:
+        hist = _histogramas.get(chave)
+        if hist is None:
+            hist = _histogramas[chave] = _Histograma(buckets)
+        hist.observar(valor)
+
+def incrementar(nome, rotulos, valor=1):
+    chave = (nome, tuple(sorted(rotulos.items())))
+    with _trava:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+def registrar_inicializacao(etapa, segundos):
+    #tempo de boot por etapa (imports, app pronto, carga preguicosa do OEE); sai como gauge no /api/metrics
+    with _trava:
+        _inicializacao[etapa] = segundos
+
+def obter_inicializacao():
+    with _trava:
+        return dict(_inicializacao)
+
+def registrar_medidor(nome, funcao):
+    #gauge lido na hora do scrape (ex: tamanho da fila do outbox)
+    with _trava:
+        _medidores[nome] = funcao
+
+@contextmanager
+def medir_operacao(operacao):
+    #cronometra um trecho qualquer (carregar_bd, verificacao de token, etc)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar('labmanager_operacao_segundos', {'operacao': operacao}, time.perf_counter() - inicio)
+
+def _contar_firestore_na_requisicao(tipo):
+    if has_request_context():
+        chave = f"_firestore_{tipo}"
+        setattr(g, chave, getattr(g, chave, 0) + 1)
+
+def registrar_chamada_firestore(colecao, operacao, duracao, erro=False):
+    rotulos = {'colecao': colecao, 'operacao': operacao}
+    observar('labmanager_firestore_segundos', rotulos, duracao)
+    if erro:
+        incrementar('labmanager_firestore_erros_total', rotulos)
+    if operacao in OPERACOES_LEITURA:
+        _contar_firestore_na_requisicao('leituras')
+    elif operacao in OPERACOES_ESCRITA:
+        _contar_firestore_na_requisicao('escritas')
+
+class FirestoreInstrumentado:
+    #envolve o client/collection/document/query do firestore e mede cada chamada que vai pra rede
+    def __init__(self, alvo, colecao='', em_lote=False):
+        object.__setattr__(self, '_alvo', alvo)
+        object.__setattr__(self, '_colecao', colecao)
+        object.__setattr__(self, '_em_lote', em_lote)
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._alvo, nome)
+        if not callable(atributo):
+            return atributo
+
+        if nome in METODOS_ENCADEADOS:
+            def encadear(*args, **kwargs):
+                colecao = self._colecao
+                if nome in ('collection', 'collection_group') and args:
+                    colecao = f"{colecao}/{args[0]}" if colecao else str(args[0])
+                elif nome == 'batch':
+                    colecao = '_batch'
+                return FirestoreInstrumentado(atributo(*args, **kwargs), colecao, em_lote=(nome == 'batch'))
+            return encadear
+
+        if self._em_lote and nome in OPERACOES_EMPILHADAS:
+            def empilhar(*args, **kwargs):
+                incrementar('labmanager_firestore_operacoes_em_lote_total', {'operacao': nome})
+                return atributo(*args, **kwargs)
+            return empilhar
+
+        if nome in OPERACOES_LEITURA or nome in OPERACOES_ESCRITA:
+            def medir(*args, **kwargs):
+                inicio = time.perf_counter()
+                erro = False
+                try:
+                    resultado = atributo(*args, **kwargs)
+                    if nome == 'stream':
+                        #stream e lazy, materializa pra medir o tempo real da leitura
+                        resultado = list(resultado)
+                    return resultado
+                except Exception:
+                    erro = True
+                    raise
+                finally:
+                    registrar_chamada_firestore(self._colecao or '_raiz', nome, time.perf_counter() - inicio, erro)
+            return medir
+
+        return atributo
+
+    def __setattr__(self, nome, valor):
+        setattr(self._alvo, nome, valor)
+
+    def __iter__(self):
+        return iter(self._alvo)
+
+def desembrulhar(objeto):
+    #devolve o objeto original do firestore (batch/transaction nao aceitam o proxy em alguns pontos)
+    return objeto._alvo if isinstance(objeto, FirestoreInstrumentado) else objeto
+
+class ProvedorJSONInstrumentado(ProvedorJSONRapido):
+    def dumps_bytes(self, obj):
+        if not USAR_ORJSON:
+            return None
+        with medir_operacao('json_encode'):
+            return super().dumps_bytes(obj)
+
+    def dumps_stdlib(self, obj, **kwargs):
+        with medir_operacao('json_encode'):
+            return super().dumps_stdlib(obj, **kwargs)
+
+def registrar_middleware(app):
+    app.json = ProvedorJSONInstrumentado(app)
+
+    @app.before_request
+    def _iniciar_cronometro():
+        g._inicio_requisicao = time.perf_counter()
+
+    @app.after_request
+    def _registrar_requisicao(resposta):
+        inicio = getattr(g, '_inicio_requisicao', None)
+        if inicio is None:
+            return resposta
+
+        rota = request.url_rule.rule if request.url_rule else 'sem_rota'
+        rotulos = {'rota': rota, 'metodo': request.method}
+
+        observar('labmanager_requisicao_segundos', rotulos, time.perf_counter() - inicio)
+        incrementar('labmanager_requisicoes_total', {**rotulos, 'status': str(resposta.status_code)})
+
+        if not resposta.is_streamed:
+            tamanho = resposta.calculate_content_length()
+            if tamanho is not None:
+                observar('labmanager_resposta_bytes', rotulos, tamanho, BUCKETS_TAMANHO)
+
+        observar('labmanager_firestore_leituras_por_requisicao', rotulos, getattr(g, '_firestore_leituras', 0), BUCKETS_OPERACOES)
+        observar('labmanager_firestore_escritas_por_requisicao', rotulos, getattr(g, '_firestore_escritas', 0), BUCKETS_OPERACOES)
+        return resposta
+
+def _formatar_rotulos(rotulos, extra=None):
+    itens = list(rotulos) + (list(extra.items()) if extra else [])
+    if not itens:
+        return ''
+    partes = []
+    for k, v in itens:
+        valor = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{k}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+def gerar_texto_prometheus():
+    linhas = []
+    with _trava:
+        histogramas = sorted((chave, h.buckets, list(h.contagens), h.soma, h.total) for chave, h in _histogramas.items())
+        contadores = sorted(_contadores.items())
+
+    nomes_vistos = set()
+    for (nome, rotulos), buckets, contagens, soma, total in histogramas:
+        if nome not in nomes_vistos:
+            linhas.append(f"# TYPE {nome} histogram")
+            nomes_vistos.add(nome)
+        for limite, contagem in zip(buckets, contagens):
+            linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos, {'le': limite})} {contagem}")
+        linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos, {'le': '+Inf'})} {total}")
+        linhas.append(f"{nome}_sum{_formatar_rotulos(rotulos)} {soma}")
+        linhas.append(f"{nome}_count{_formatar_rotulos(rotulos)} {total}")
+
+    for (nome, rotulos), valor in contadores:
+        if nome not in nomes_vistos:
+            linhas.append(f"# TYPE {nome} counter")
+            nomes_vistos.add(nome)
+        linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {valor}")
+
+    inicializacao = obter_inicializacao()
+    if inicializacao:
+        linhas.append("# TYPE labmanager_inicializacao_segundos gauge")
+        for etapa, segundos in sorted(inicializacao.items()):
+            linhas.append(f"labmanager_inicializacao_segundos{_formatar_rotulos([('etapa', etapa)])} {segundos}")
+
+    with _trava:
+        medidores = sorted(_medidores.items())
+    for nome, funcao in medidores:
+        try:
+            valor = funcao()
+        except Exception:
+            continue
+        linhas.append(f"# TYPE {nome} gauge")
+        linhas.append(f"{nome} {valor}")
+
+    return '\n'.join(linhas) + '\n'
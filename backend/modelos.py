@@ -0,0 +1,121 @@
+#modelo tipado de banho/circuito pros loops quentes (progresso, agendador, agregados, busca de vagas)
+#no banco e na API continua o formato antigo em dict; a conversao acontece so na borda com de_dict/para_dict
+
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+from functools import lru_cache
+from utilitarios import data_br_para_epoch_ms, data_de_epoch_ms
+
+FORMATO_DATA = "%d/%m/%Y %H:%M"
+CAMPOS_CIRCUITO = {'id', 'status', 'batteryId', 'protocol', 'startTime', 'previsao', 'progress', 'noSpace', 'isParallel', 'linkedTo'}
+CAMPOS_BANHO = {'id', 'temp', 'isFull', 'circuits'}
+
+@lru_cache(maxsize=8192)
+def numero_circuito(cid):
+    #'C-012' -> 12; os ids se repetem a cada requisicao, entao o regex roda uma vez por id
+    numeros = re.sub(r'\D', '', str(cid))
+    return int(numeros) if numeros else None
+
+@lru_cache(maxsize=8192)
+def epoch_de_texto(texto):
+    #mesma ideia: cada 'dd/mm/YYYY HH:MM' passa pelo strptime uma vez so por processo
+    return data_br_para_epoch_ms(texto)
+
+def texto_de_epoch(epoch_ms, formato=FORMATO_DATA):
+    return data_de_epoch_ms(epoch_ms).strftime(formato)
+
+@dataclass(slots=True)
+class Circuito:
+    id: str
+    numero: Optional[int] = None
+    status: str = 'free'
+    battery_id: Optional[str] = None
+    protocol: Optional[str] = None
+    inicio_ms: Optional[int] = None
+    fim_ms: Optional[int] = None
+    # texto original quando nao e data ('-', 'A calcular') ou quando nao deu pra converter
+    start_texto: Optional[str] = None
+    previsao_texto: Optional[str] = None
+    progress: float = 0
+    no_space: bool = False
+    is_parallel: bool = False
+    # id do circuito com quem forma par paralelo (gravado no vinculo em paralelo)
+    ligado_a: Optional[str] = None
+    extras: dict = field(default_factory=dict)
+
+    @classmethod
+    def de_dict(cls, d):
+        start = d.get('startTime')
+        previsao = d.get('previsao')
+        inicio_ms = epoch_de_texto(start) if isinstance(start, str) else None
+        fim_ms = epoch_de_texto(previsao) if isinstance(previsao, str) else None
+        return cls(
+            id=d.get('id'),
+            numero=numero_circuito(d.get('id')),
+            status=d.get('status', 'free'),
+            battery_id=d.get('batteryId'),
+            protocol=d.get('protocol'),
+            inicio_ms=inicio_ms,
+            fim_ms=fim_ms,
+            start_texto=start if inicio_ms is None else None,
+            previsao_texto=previsao if fim_ms is None else None,
+            progress=d.get('progress', 0),
+            no_space=bool(d.get('noSpace', False)),
+            is_parallel=bool(d.get('isParallel', False)),
+            ligado_a=d.get('linkedTo'),
+            extras={k: v for k, v in d.items() if k not in CAMPOS_CIRCUITO}
+        )
+
+    def para_dict(self):
+        d = dict(self.extras)
+        d.update({
+            'id': self.id,
+            'status': self.status,
+            'batteryId': self.battery_id,
+            'protocol': self.protocol,
+            'startTime': texto_de_epoch(self.inicio_ms) if self.inicio_ms is not None else self.start_texto,
+            'previsao': texto_de_epoch(self.fim_ms) if self.fim_ms is not None else self.previsao_texto,
+            'progress': self.progress,
+            'noSpace': self.no_space,
+            'isParallel': self.is_parallel
+        })
+        # so circuito vinculado em paralelo tem linkedTo gravado
+        if self.ligado_a is not None:
+            d['linkedTo'] = self.ligado_a
+        return d
+
+    @property
+    def rodando(self):
+        return self.status == 'running'
+
+    def progresso_em(self, agora_ms):
+        if self.inicio_ms is None or self.fim_ms is None or self.fim_ms <= self.inicio_ms:
+            return None
+        return round(max(0, min(99.9, (agora_ms - self.inicio_ms) / (self.fim_ms - self.inicio_ms) * 100)), 1)
+
+@dataclass(slots=True)
+class Banho:
+    id: str
+    temp: Optional[object] = None
+    is_full: bool = False
+    circuitos: list = field(default_factory=list)
+    extras: dict = field(default_factory=dict)
+
+    @classmethod
+    def de_dict(cls, d):
+        return cls(
+            id=d.get('id'),
+            temp=d.get('temp'),
+            is_full=bool(d.get('isFull', False)),
+            circuitos=[Circuito.de_dict(c) for c in d.get('circuits', [])],
+            extras={k: v for k, v in d.items() if k not in CAMPOS_BANHO}
+        )
+
+    def para_dict(self):
+        d = dict(self.extras)
+        d.update({'id': self.id, 'temp': self.temp, 'isFull': self.is_full, 'circuits': [c.para_dict() for c in self.circuitos]})
+        return d
+
+def banhos_de_db(db):
+    return [Banho.de_dict(b) for b in db.get('baths', [])]
@@ -1,12 +1,22 @@
+import os
 import pandas as pd
 import numpy as np
 from calendar import monthrange
-from datetime import datetime
+from datetime import datetime, timedelta
 import re
 import traceback
 import math
 
+from google.cloud.firestore import FieldFilter
 from configuracao import bd_firestore
+from utilitarios import data_para_epoch_ms
+import arquivo_logs
+
+# origem circuit_logs: o teste comeca no 'Início de Teste' e acaba no proximo evento do mesmo circuito
+# (conclusao, manutencao/falha ou outro inicio). A janela pega testes longos que comecaram antes do mes
+ACOES_INICIO_TESTE = ['Início de Teste']
+ACOES_FIM_TESTE = ['Teste Concluído', 'Conclusão Manual', 'Entrada em Manutenção', 'Falha no Equipamento']
+JANELA_LOGS_DIAS = int(os.getenv("OEE_LOGS_JANELA_DIAS", 60))
 
 GLOBAL_DB = {
     "processed_data": {},   
@@ -19,6 +29,120 @@ def apenas_numeros(texto):
     numeros = re.sub(r'\D', '', str(texto))
     return str(int(numeros)) if numeros else str(texto).strip()
 
+def ler_planilhas_oee(file_path):
+    return pd.read_excel(file_path, sheet_name=None)
+
+def normalizar_eventos_oee(dict_dfs):
+    #junta as abas validas numa tabela so com circuito, start e stop ja tratados
+    dfs_validos = []
+
+    alias_map = {
+        'circuito': ['circuit', 'circuito'],
+        'start': ['start time', 'starttime', 'start'],
+        'stop': ['stop time', 'stoptime', 'stop']
+    }
+
+    for nome_aba, df in dict_dfs.items():
+        if df.empty: continue
+
+        cols_originais = {col: str(col).lower().strip().replace('_', '') for col in df.columns}
+        rename_dict = {}
+
+        for original, limpo in cols_originais.items():
+            for padrao, aliases in alias_map.items():
+                if limpo in aliases:
+                    rename_dict[original] = padrao
+                    break
+        df.rename(columns=rename_dict, inplace=True)
+
+        if 'circuito' in df.columns and 'start' in df.columns:
+            if 'stop' not in df.columns: df['stop'] = pd.NaT 
+            dfs_validos.append(df[['circuito', 'start', 'stop']])
+
+    if not dfs_validos:
+        return None
+
+    df_final = pd.concat(dfs_validos, ignore_index=True)
+    
+    # O ESCUDO ANTI-LOGGER: Destrói qualquer linha que contenha a palavra "logger"
+    df_final = df_final[~df_final['circuito'].astype(str).str.lower().str.contains('logger', na=False)]
+
+    df_final['start'] = pd.to_datetime(df_final['start'], dayfirst=True, errors='coerce')
+    df_final['stop'] = pd.to_datetime(df_final['stop'], dayfirst=True, errors='coerce')
+    df_final.dropna(subset=['start'], inplace=True)
+
+    df_final['clean_id'] = df_final['circuito'].apply(apenas_numeros)
+    return df_final
+
+def ler_circuit_logs_oee(target_mes, target_ano):
+    #uma consulta por faixa de id (epoch ms do log) cobrindo o mes + a janela anterior; so os campos usados
+    inicio = datetime(target_ano, target_mes, 1) - timedelta(days=JANELA_LOGS_DIAS)
+    fim = datetime(target_ano + (target_mes == 12), target_mes % 12 + 1, 1)
+    inicio_ms, fim_ms = data_para_epoch_ms(inicio), data_para_epoch_ms(fim)
+    consulta = (bd_firestore.collection('circuit_logs')
+                .where(filter=FieldFilter('id', '>=', inicio_ms))
+                .where(filter=FieldFilter('id', '<', fim_ms))
+                .select(['id', 'action', 'circuitId']))
+    quentes = [doc.to_dict() for doc in consulta.stream()]
+    # mes antigo ja compactado: os eventos vem dos arquivos mensais
+    return arquivo_logs.juntar_com_quentes(quentes, arquivo_logs.ler_arquivados('circuit_logs', None, inicio_ms, fim_ms - 1))
+
+def eventos_de_circuit_logs(logs):
+    #mesmo formato que normalizar_eventos_oee devolve (clean_id, start, stop), montado sem loop por log
+    df = pd.DataFrame(logs, columns=['id', 'action', 'circuitId'])
+    df = df[df['action'].isin(ACOES_INICIO_TESTE + ACOES_FIM_TESTE)].dropna(subset=['id', 'circuitId'])
+    if df.empty:
+        return None
+
+    # id do log = horario local lido como utc (data_para_epoch_ms); unit='ms' volta pro horario local sem fuso,
+    # igual ao que a planilha da Digatron traz, e sem depender do fuso do servidor
+    df['momento'] = pd.to_datetime(pd.to_numeric(df['id'], errors='coerce'), unit='ms')
+    df = df.dropna(subset=['momento'])
+    df['clean_id'] = df['circuitId'].map(apenas_numeros)
+    df = df.sort_values(['clean_id', 'momento'], kind='stable')
+    df['stop'] = df.groupby('clean_id', sort=False)['momento'].shift(-1)
+
+    inicios = df[df['action'].isin(ACOES_INICIO_TESTE)]
+    if inicios.empty:
+        return None
+    return pd.DataFrame({'clean_id': inicios['clean_id'], 'start': inicios['momento'], 'stop': inicios['stop']}).reset_index(drop=True)
+
+def montar_grid_oee(df_final, target_mes, target_ano):
+    #transforma os eventos em UP/SD/PP por dia do mes
+    #cada intervalo vira [primeiro dia, ultimo dia] dentro do mes e um vetor de diferencas por circuito marca os dias UP
+    _, dias_no_mes = monthrange(target_ano, target_mes)
+    inicio_mes = pd.Timestamp(target_ano, target_mes, 1)
+    um_dia = pd.Timedelta(days=1)
+
+    circuitos_encontrados = set(df_final['clean_id'])
+
+    # Só adiciona o iDevice e os circuitos que de fato apareceram no arquivo
+    lista_ids = ['iDevice'] + [cid for cid in circuitos_encontrados if cid != 'iDevice']
+    linhas = pd.Categorical(df_final['clean_id'], categories=lista_ids).codes
+
+    stop = df_final['stop'].fillna(pd.Timestamp(target_ano + 1, 1, 1))
+    primeiro = ((df_final['start'] - inicio_mes) // um_dia).clip(lower=0).to_numpy(dtype=np.int64)
+    ultimo = ((stop - inicio_mes) // um_dia).clip(upper=dias_no_mes - 1).to_numpy(dtype=np.int64)
+    validos = primeiro <= ultimo
+
+    diferencas = np.zeros((len(lista_ids), dias_no_mes + 1), dtype=np.int32)
+    np.add.at(diferencas, (linhas[validos], primeiro[validos]), 1)
+    np.add.at(diferencas, (linhas[validos], ultimo[validos] + 1), -1)
+    ocupado = np.cumsum(diferencas, axis=1)[:, :dias_no_mes] > 0
+
+    fim_de_semana = np.array([datetime(target_ano, target_mes, dia).weekday() >= 5 for dia in range(1, dias_no_mes + 1)])
+    grid = np.where(ocupado, 'UP', np.where(fim_de_semana, 'PP', 'SD'))
+
+    mapa_final = {cid: grid[i].tolist() for i, cid in enumerate(lista_ids)}
+    return mapa_final, circuitos_encontrados
+
+def _publicar_grid(mapa_final, target_mes, target_ano):
+    GLOBAL_DB["processed_data"] = mapa_final
+    GLOBAL_DB["meta"] = {
+        "detected_month": int(target_mes),
+        "detected_year": int(target_ano)
+    }
+
 def processar_upload_oee(file_path, target_mes, target_ano):
     try:
         GLOBAL_DB["processed_data"] = {}
@@ -27,96 +151,49 @@ def processar_upload_oee(file_path, target_mes, target_ano):
         target_mes = int(target_mes)
         target_ano = int(target_ano)
         
-        dict_dfs = pd.read_excel(file_path, sheet_name=None)
-        dfs_validos = []
+        dict_dfs = ler_planilhas_oee(file_path)
+        df_final = normalizar_eventos_oee(dict_dfs)
 
-        alias_map = {
-            'circuito': ['circuit', 'circuito'],
-            'start': ['start time', 'starttime', 'start'],
-            'stop': ['stop time', 'stoptime', 'stop']
-        }
-
-        for nome_aba, df in dict_dfs.items():
-            if df.empty: continue
-
-            cols_originais = {col: str(col).lower().strip().replace('_', '') for col in df.columns}
-            rename_dict = {}
-
-            for original, limpo in cols_originais.items():
-                for padrao, aliases in alias_map.items():
-                    if limpo in aliases:
-                        rename_dict[original] = padrao
-                        break
-            df.rename(columns=rename_dict, inplace=True)
-
-            if 'circuito' in df.columns and 'start' in df.columns:
-                if 'stop' not in df.columns: df['stop'] = pd.NaT 
-                dfs_validos.append(df[['circuito', 'start', 'stop']])
-
-        if not dfs_validos:
+        if df_final is None:
             return {"sucesso": False, "erro": "Nenhuma aba válida."}
 
-        df_final = pd.concat(dfs_validos, ignore_index=True)
-        
-        # O ESCUDO ANTI-LOGGER: Destrói qualquer linha que contenha a palavra "logger"
-        df_final = df_final[~df_final['circuito'].astype(str).str.lower().str.contains('logger', na=False)]
+        mapa_final, circuitos_encontrados = montar_grid_oee(df_final, target_mes, target_ano)
+        _publicar_grid(mapa_final, target_mes, target_ano)
 
-        df_final['start'] = pd.to_datetime(df_final['start'], dayfirst=True, errors='coerce')
-        df_final['stop'] = pd.to_datetime(df_final['stop'], dayfirst=True, errors='coerce')
-        df_final.dropna(subset=['start'], inplace=True)
+        return {
+            "sucesso": True, 
+            "circuitos": list(circuitos_encontrados),
+            "mes_processado": f"{target_mes}/{target_ano}",
+            "mensagem": "Processado com sucesso (RAM)."
+        }
 
-        _, dias_no_mes = monthrange(target_ano, target_mes)
-        
-        df_final['clean_id'] = df_final['circuito'].apply(apenas_numeros)
-        
-        circuitos_eventos = {}
-        circuitos_encontrados = set()
+    except Exception as e:
+        traceback.print_exc()
+        return {"sucesso": False, "erro": str(e)}
 
-        for _, row in df_final.iterrows():
-            cid = row['clean_id']
-            circuitos_encontrados.add(cid)
-            if cid not in circuitos_eventos: circuitos_eventos[cid] = []
-            
-            start = row['start']
-            stop = row['stop'] if not pd.isna(row['stop']) else datetime(target_ano + 1, 1, 1)
-            circuitos_eventos[cid].append((start, stop))
+def processar_logs_oee(target_mes, target_ano):
+    #mesmo resultado do upload, mas com os testes registrados pelo proprio sistema no circuit_logs
+    try:
+        # como no upload: mes sem teste nao pode continuar mostrando o grid (nem os ajustes) do processamento anterior
+        GLOBAL_DB["processed_data"] = {}
+        GLOBAL_DB["overrides"] = {}
 
-        mapa_final = {}
-        
-        # Só adiciona o iDevice e os circuitos que de fato apareceram no arquivo
-        lista_ids = ['iDevice'] + list(circuitos_encontrados)
+        target_mes = int(target_mes)
+        target_ano = int(target_ano)
 
-        for cid in lista_ids:
-            status_array = []
-            eventos = circuitos_eventos.get(cid, [])
-            
-            for dia in range(1, dias_no_mes + 1):
-                dia_inicio = datetime(target_ano, target_mes, dia, 0, 0, 0)
-                dia_fim = datetime(target_ano, target_mes, dia, 23, 59, 59)
-                is_weekend = dia_inicio.weekday() >= 5
-                
-                status_dia = 'PP' if is_weekend else 'SD'
-                
-                for start, stop in eventos:
-                    if start <= dia_fim and stop >= dia_inicio:
-                        status_dia = 'UP'
-                        break
-                
-                status_array.append(status_dia)
-            
-            mapa_final[cid] = status_array
+        df_final = eventos_de_circuit_logs(ler_circuit_logs_oee(target_mes, target_ano))
+        if df_final is None:
+            return {"sucesso": False, "erro": "Nenhum teste registrado no histórico dos circuitos para o período."}
 
-        GLOBAL_DB["processed_data"] = mapa_final
-        GLOBAL_DB["meta"] = {
-            "detected_month": int(target_mes),
-            "detected_year": int(target_ano)
-        }
+        mapa_final, circuitos_encontrados = montar_grid_oee(df_final, target_mes, target_ano)
+        _publicar_grid(mapa_final, target_mes, target_ano)
 
         return {
-            "sucesso": True, 
+            "sucesso": True,
             "circuitos": list(circuitos_encontrados),
             "mes_processado": f"{target_mes}/{target_ano}",
-            "mensagem": "Processado com sucesso (RAM)."
+            "origem": "circuit_logs",
+            "mensagem": "Processado a partir do histórico dos circuitos (RAM)."
         }
 
     except Exception as e:
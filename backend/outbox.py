@@ -0,0 +1,317 @@
+#fila local duravel (SQLite) das escritas no firestore: a requisicao grava aqui e responde, uma thread drena pro firestore
+#toda escrita e um set de documento inteiro, entao um set novo substitui o que ainda estiver pendente pro mesmo documento:
+#cada documento tem no maximo uma escrita na fila e a ordem por documento fica garantida sem travar os outros
+#firestore fora do ar: a fila cresce no disco, o dreno tenta de novo com backoff e nada se perde se o processo cair
+#escrita que o firestore recusa de vez (documento invalido) vai pra tabela descartadas depois de OUTBOX_MAX_TENTATIVAS
+#mais de um processo no mesmo arquivo (gunicorn -w N, script manual): o dreno pega um flock em <caminho>.lock, entao
+#a mesma linha nunca e gravada (nem passa pelo pos-gravacao) duas vezes
+
+import os
+import time
+import pickle
+import random
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from google.api_core import exceptions as erros_google
+from configuracao import bd_firestore
+from metricas import incrementar, observar, desembrulhar, registrar_medidor
+
+try:
+    import fcntl
+except ImportError:
+    # windows (so desenvolvimento, um processo): fica so a trava entre threads
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+diretorio_base = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_PADRAO = os.path.join(diretorio_base, 'outbox.sqlite3')
+LOTE_DRENO = 400
+BACKOFF_INICIAL_SEG = 0.5
+BACKOFF_MAX_SEG = int(os.getenv("OUTBOX_BACKOFF_MAX_SEG", 60))
+MAX_TENTATIVAS = int(os.getenv("OUTBOX_MAX_TENTATIVAS", 10))
+# falha de rede/disponibilidade nao diz nada sobre o documento: com elas a escrita espera o firestore voltar
+ERROS_TRANSITORIOS = (erros_google.ServiceUnavailable, erros_google.DeadlineExceeded, erros_google.InternalServerError,
+                      erros_google.TooManyRequests, erros_google.Aborted, erros_google.Unknown, erros_google.RetryError,
+                      ConnectionError, TimeoutError)
+# colecoes cujo estado pendente fica tambem em memoria pra leitura (carregar_bd le o lab_data/main daqui)
+COLECOES_ESPELHADAS = {'lab_data'}
+
+class Outbox:
+    def __init__(self, caminho):
+        self._trava = threading.Lock()
+        self._trava_dreno = threading.Lock()
+        self._acordar = threading.Event()
+        self._arquivo_trava = open(caminho + '.lock', 'a+b') if fcntl else None
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._conexao.execute('PRAGMA journal_mode=WAL')
+        self._conexao.execute('PRAGMA synchronous=FULL')
+        self._conexao.execute("""CREATE TABLE IF NOT EXISTS escritas (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, colecao TEXT NOT NULL, documento TEXT NOT NULL,
+            dados BLOB NOT NULL, tentativas INTEGER NOT NULL DEFAULT 0, criado_em REAL NOT NULL)""")
+        self._conexao.execute('CREATE UNIQUE INDEX IF NOT EXISTS escritas_documento ON escritas (colecao, documento)')
+        self._conexao.execute("""CREATE TABLE IF NOT EXISTS descartadas (
+            seq INTEGER PRIMARY KEY, colecao TEXT NOT NULL, documento TEXT NOT NULL, dados BLOB NOT NULL,
+            tentativas INTEGER NOT NULL, criado_em REAL NOT NULL, descartado_em REAL NOT NULL, erro TEXT)""")
+        # gravacao especial por colecao (lab_data/main avisa a replica) e ganchos depois de gravar (rollups de confiabilidade)
+        self._gravadores = {}
+        self._apos_gravar = {}
+        self._espelho = {}
+        self._colecoes_vistas = set()
+        self._falhas_seguidas = 0
+        self._proxima_tentativa = 0
+        self._thread = None
+        for seq, colecao, documento, dados in self._conexao.execute(
+                'SELECT seq, colecao, documento, dados FROM escritas WHERE colecao IN (%s)' % ','.join('?' * len(COLECOES_ESPELHADAS)),
+                tuple(COLECOES_ESPELHADAS)):
+            self._espelho[(colecao, documento)] = (seq, pickle.loads(dados))
+
+    def registrar_gravador(self, colecao, funcao):
+        #funcao(documento, dados) no lugar do set direto
+        self._gravadores[colecao] = funcao
+
+    def registrar_apos_gravar(self, colecao, funcao):
+        #funcao(lista de dados) chamada depois que os documentos da colecao chegaram no firestore
+        self._apos_gravar[colecao] = funcao
+
+    def enfileirar(self, escritas):
+        #escritas: lista de (colecao, documento, dados); volta quando estiver no disco
+        inicio = time.perf_counter()
+        linhas = [(colecao, str(documento), pickle.dumps(dados, pickle.HIGHEST_PROTOCOL)) for colecao, documento, dados in escritas]
+        with self._trava:
+            self._conexao.execute('BEGIN IMMEDIATE')
+            try:
+                for colecao, documento, blob in linhas:
+                    # set novo do mesmo documento: o pendente vira lixo (se ja estiver em voo, o novo vai logo depois)
+                    self._conexao.execute('DELETE FROM escritas WHERE colecao = ? AND documento = ?', (colecao, documento))
+                    cursor = self._conexao.execute(
+                        'INSERT INTO escritas (colecao, documento, dados, criado_em) VALUES (?, ?, ?, ?)',
+                        (colecao, documento, blob, time.time()))
+                    if colecao in COLECOES_ESPELHADAS:
+                        # copia do que foi pro disco: o dict do chamador pode continuar sendo mexido
+                        self._espelho[(colecao, documento)] = (cursor.lastrowid, pickle.loads(blob))
+                self._conexao.execute('COMMIT')
+            except Exception:
+                self._conexao.execute('ROLLBACK')
+                raise
+            novas = {colecao for colecao, _, _ in linhas} - self._colecoes_vistas
+            self._colecoes_vistas |= novas
+        for colecao in novas:
+            # contador de descartes aparece zerado no /api/metrics desde a primeira escrita, da pra alertar em cima dele
+            incrementar('labmanager_outbox_descartadas_total', {'colecao': colecao}, 0)
+        observar('labmanager_outbox_enfileirar_segundos', {}, time.perf_counter() - inicio)
+        self._acordar.set()
+
+    def pendente(self, colecao, documento):
+        #ultimo estado ainda nao gravado no firestore (None se nao tem)
+        chave = (colecao, str(documento))
+        with self._trava:
+            item = self._espelho.get(chave)
+            if item is None:
+                return None
+            # outro processo pode ter drenado ou substituido essa escrita: o disco manda
+            linha = self._conexao.execute('SELECT seq FROM escritas WHERE colecao = ? AND documento = ?', chave).fetchone()
+            if linha is None:
+                del self._espelho[chave]
+                return None
+            if linha[0] != item[0]:
+                dados = self._conexao.execute('SELECT dados FROM escritas WHERE seq = ?', (linha[0],)).fetchone()
+                if dados is None:
+                    del self._espelho[chave]
+                    return None
+                item = self._espelho[chave] = (linha[0], pickle.loads(dados[0]))
+        return item[1]
+
+    def profundidade(self):
+        with self._trava:
+            return self._conexao.execute('SELECT COUNT(*) FROM escritas').fetchone()[0]
+
+    def idade_mais_antiga(self):
+        with self._trava:
+            criado_em = self._conexao.execute('SELECT MIN(criado_em) FROM escritas').fetchone()[0]
+        return time.time() - criado_em if criado_em else 0
+
+    def _remover(self, linhas):
+        with self._trava:
+            self._conexao.executemany('DELETE FROM escritas WHERE seq = ?', [(seq,) for seq, *_ in linhas])
+            for seq, colecao, documento, _ in linhas:
+                item = self._espelho.get((colecao, documento))
+                if item and item[0] == seq:
+                    del self._espelho[(colecao, documento)]
+
+    def descartadas(self):
+        with self._trava:
+            return self._conexao.execute('SELECT COUNT(*) FROM descartadas').fetchone()[0]
+
+    def _marcar_falha(self, linhas):
+        #devolve as tentativas de cada seq depois de contar esta
+        with self._trava:
+            self._conexao.executemany('UPDATE escritas SET tentativas = tentativas + 1 WHERE seq = ?', [(seq,) for seq, *_ in linhas])
+            marcadores = ','.join('?' * len(linhas))
+            return dict(self._conexao.execute(f'SELECT seq, tentativas FROM escritas WHERE seq IN ({marcadores})',
+                                              [seq for seq, *_ in linhas]).fetchall())
+
+    def _descartar(self, linha, erro):
+        #tira da fila pra nao travar o dreno pra sempre; fica no disco pra alguem olhar e reenfileirar na mao
+        seq, colecao, documento, _ = linha
+        with self._trava:
+            self._conexao.execute('BEGIN IMMEDIATE')
+            try:
+                self._conexao.execute(
+                    'INSERT OR REPLACE INTO descartadas (seq, colecao, documento, dados, tentativas, criado_em, descartado_em, erro) '
+                    'SELECT seq, colecao, documento, dados, tentativas, criado_em, ?, ? FROM escritas WHERE seq = ?',
+                    (time.time(), str(erro)[:500], seq))
+                self._conexao.execute('DELETE FROM escritas WHERE seq = ?', (seq,))
+                self._conexao.execute('COMMIT')
+            except Exception:
+                self._conexao.execute('ROLLBACK')
+                raise
+            item = self._espelho.get((colecao, documento))
+            if item and item[0] == seq:
+                del self._espelho[(colecao, documento)]
+        incrementar('labmanager_outbox_descartadas_total', {'colecao': colecao})
+        log.error("escrita %s/%s descartada do outbox depois de %s tentativas: %s", colecao, documento, MAX_TENTATIVAS, erro)
+
+    def _gravar(self, linhas):
+        #sets comuns vao num batch; colecao com gravador proprio vai sozinha
+        comuns = [l for l in linhas if l[1] not in self._gravadores]
+        if comuns:
+            lote = bd_firestore.batch()
+            for _, colecao, documento, dados in comuns:
+                lote.set(desembrulhar(bd_firestore.collection(colecao).document(documento)), dados)
+            lote.commit()
+        for _, colecao, documento, dados in linhas:
+            if colecao in self._gravadores:
+                self._gravadores[colecao](documento, dados)
+
+    def _gravados(self, linhas):
+        self._remover(linhas)
+        por_colecao = {}
+        for _, colecao, _, dados in linhas:
+            por_colecao.setdefault(colecao, []).append(dados)
+        for colecao, dados in por_colecao.items():
+            if colecao in self._apos_gravar:
+                try:
+                    self._apos_gravar[colecao](dados)
+                except Exception as erro:
+                    incrementar('labmanager_outbox_pos_gravacao_falhas_total', {'colecao': colecao})
+                    log.warning("pos-gravacao do outbox (%s) falhou: %s", colecao, erro)
+
+    @contextmanager
+    def _trava_processos(self):
+        #espera o dreno de outro processo terminar o lote dele; as linhas que ele gravou ja saem da tabela antes de soltar
+        if self._arquivo_trava is None:
+            yield
+            return
+        fcntl.flock(self._arquivo_trava, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._arquivo_trava, fcntl.LOCK_UN)
+
+    def drenar_uma_vez(self):
+        #um lote; devolve (gravadas, falhou). Quem ja falhou vai pro fim da fila e nao trava os outros documentos
+        with self._trava_dreno, self._trava_processos():
+            with self._trava:
+                linhas = [(seq, colecao, documento, pickle.loads(dados)) for seq, colecao, documento, dados in self._conexao.execute(
+                    'SELECT seq, colecao, documento, dados FROM escritas ORDER BY tentativas, seq LIMIT ?', (LOTE_DRENO,))]
+            if not linhas:
+                return 0, False
+
+            inicio = time.perf_counter()
+            try:
+                self._gravar(linhas)
+                self._gravados(linhas)
+                observar('labmanager_outbox_dreno_segundos', {}, time.perf_counter() - inicio)
+                return len(linhas), False
+            except Exception as erro:
+                incrementar('labmanager_outbox_falhas_total', {})
+                log.warning("erro ao drenar outbox (%s escritas): %s", len(linhas), erro)
+
+            # o lote falhou: grava uma por uma pra separar documento ruim de firestore fora do ar.
+            # duas falhas seguidas sem nenhum sucesso = firestore fora, para e deixa o backoff agir
+            gravadas = 0
+            falhas = []
+            for linha in linhas:
+                try:
+                    self._gravar([linha])
+                except Exception as erro_linha:
+                    falhas.append((linha, erro_linha))
+                    if gravadas == 0 and len(falhas) >= 2:
+                        break
+                    continue
+                self._gravados([linha])
+                gravadas += 1
+            if not falhas:
+                return gravadas, False
+
+            # so quem falhou ganha tentativa: na proxima rodada ela vai pro fim da fila e nao trava os outros.
+            # descarta quando ja passou do limite e a culpa e dela: outra escrita passou nesta rodada ou o erro nao e de rede
+            tentativas = self._marcar_falha([linha for linha, _ in falhas])
+            restantes = 0
+            for linha, erro_linha in falhas:
+                definitiva = gravadas > 0 or not isinstance(erro_linha, ERROS_TRANSITORIOS)
+                if definitiva and tentativas.get(linha[0], 0) >= MAX_TENTATIVAS:
+                    self._descartar(linha, erro_linha)
+                else:
+                    restantes += 1
+            return gravadas, gravadas == 0 and restantes > 0
+
+    def drenar(self, timeout_seg=10):
+        #esvazia a fila agora, ignorando o backoff (desligamento, leitura direta do firestore); False se sobrou algo
+        limite = time.time() + timeout_seg
+        while time.time() < limite:
+            gravadas, falhou = self.drenar_uma_vez()
+            if falhou:
+                return self.profundidade() == 0
+            if gravadas == 0 and self.profundidade() == 0:
+                return True
+        return self.profundidade() == 0
+
+    def _laco(self):
+        while True:
+            espera = self._proxima_tentativa - time.time()
+            if espera > 0:
+                time.sleep(espera)
+            self._acordar.wait()
+            self._acordar.clear()
+            try:
+                gravadas, falhou = self.drenar_uma_vez()
+            except Exception as erro:
+                log.exception("erro no dreno do outbox: %s", erro)
+                gravadas, falhou = 0, True
+            if falhou:
+                self._falhas_seguidas += 1
+                atraso = min(BACKOFF_MAX_SEG, BACKOFF_INICIAL_SEG * 2 ** (self._falhas_seguidas - 1))
+                self._proxima_tentativa = time.time() + atraso * (0.5 + random.random() / 2)
+                self._acordar.set()
+            else:
+                self._falhas_seguidas = 0
+                self._proxima_tentativa = 0
+                if gravadas:
+                    # pode ter mais coisa na fila alem do lote
+                    self._acordar.set()
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._laco, name='outbox-firestore', daemon=True)
+            self._thread.start()
+            # o que sobrou de antes de reiniciar comeca a drenar ja
+            self._acordar.set()
+
+fila = None
+
+def iniciar(caminho=None):
+    global fila
+    if fila is None:
+        fila = Outbox(caminho or os.getenv("OUTBOX_CAMINHO", CAMINHO_PADRAO))
+        registrar_medidor('labmanager_outbox_pendentes', fila.profundidade)
+        registrar_medidor('labmanager_outbox_idade_segundos', fila.idade_mais_antiga)
+        registrar_medidor('labmanager_outbox_descartadas', fila.descartadas)
+        fila.iniciar()
+    return fila
+
+def ativo():
+    return fila is not None
@@ -0,0 +1,94 @@
+#projecao de carga futura por banho e por dia pro calendario
+#cada teste vira um intervalo [inicio, fim); a contagem por dia sai de um vetor de diferencas (+1 no primeiro dia,
+#-1 depois do ultimo) acumulado com numpy, entao o custo nao depende de quantos dias cada teste dura
+
+from datetime import datetime, timedelta
+import numpy as np
+from modelos import banhos_de_db
+from utilitarios import data_para_epoch_ms, data_br_para_epoch_ms
+
+DIA_MS = 24 * 3600 * 1000
+STATUS_PROGRAMADOS = ['Programado', 'Em Andamento']
+
+def epoch_de_data_qualquer(texto):
+    #o painel de aprovacao manda datetime-local ('2026-03-26T09:00'); o resto do sistema usa 'dd/mm/YYYY HH:MM'
+    epoch = data_br_para_epoch_ms(texto)
+    if epoch is not None:
+        return epoch
+    try:
+        return data_para_epoch_ms(datetime.fromisoformat(str(texto).strip().replace('Z', '')))
+    except ValueError:
+        return None
+
+def contar_por_dia(inicios, fins, linhas, n_linhas, inicio_ms, n_dias, pesos=None):
+    #quantos intervalos tocam cada dia, por linha (banho); fim None/NaN = ocupado ate o fim do horizonte
+    inicios = np.asarray(inicios, dtype=np.float64)
+    fins = np.asarray(fins, dtype=np.float64)
+    linhas = np.asarray(linhas, dtype=np.int64)
+    pesos = np.ones(len(inicios), dtype=np.int64) if pesos is None else np.asarray(pesos, dtype=np.int64)
+    diferencas = np.zeros((n_linhas, n_dias + 1), dtype=np.int64)
+    if len(inicios) == 0:
+        return diferencas[:, :n_dias]
+
+    fim_horizonte = inicio_ms + n_dias * DIA_MS
+    fins = np.where(np.isnan(fins), fim_horizonte, fins)
+    visiveis = (fins > inicio_ms) & (inicios < fim_horizonte) & (fins > inicios)
+    primeiro = np.floor((np.maximum(inicios[visiveis], inicio_ms) - inicio_ms) / DIA_MS).astype(np.int64)
+    depois_do_ultimo = np.ceil((np.minimum(fins[visiveis], fim_horizonte) - inicio_ms) / DIA_MS).astype(np.int64)
+
+    np.add.at(diferencas, (linhas[visiveis], primeiro), pesos[visiveis])
+    np.add.at(diferencas, (linhas[visiveis], depois_do_ultimo), -pesos[visiveis])
+    return np.cumsum(diferencas, axis=1)[:, :n_dias]
+
+def projetar(db, solicitacoes, agora, semanas):
+    #db = lab_data/main; solicitacoes = lista de dicts com status/dataInicio/dataFim/qtdAmostras
+    hoje = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+    inicio_ms = data_para_epoch_ms(hoje)
+    agora_ms = data_para_epoch_ms(agora)
+    n_dias = semanas * 7
+
+    banhos = banhos_de_db(db)
+    inicios, fins, linhas = [], [], []
+    manutencao = []
+    for i, banho in enumerate(banhos):
+        em_manutencao = 0
+        for c in banho.circuitos:
+            if c.status == 'maintenance':
+                em_manutencao += 1
+            elif c.rodando:
+                inicios.append(c.inicio_ms if c.inicio_ms is not None else agora_ms)
+                # previsao 'A calcular' fica ocupando o horizonte inteiro
+                fins.append(c.fim_ms if c.fim_ms is not None else np.nan)
+                linhas.append(i)
+        manutencao.append(em_manutencao)
+    ocupacao = contar_por_dia(inicios, fins, linhas, len(banhos), inicio_ms, n_dias)
+
+    # solicitacao programada ainda nao tem banho: entra numa linha so, pesada pela quantidade de amostras
+    inicios, fins, pesos = [], [], []
+    for s in solicitacoes:
+        if s.get('status') not in STATUS_PROGRAMADOS:
+            continue
+        inicio = epoch_de_data_qualquer(s.get('dataInicio'))
+        fim = epoch_de_data_qualquer(s.get('dataFim'))
+        if inicio is None or fim is None:
+            continue
+        try:
+            qtd = max(1, int(s.get('qtdAmostras') or 1))
+        except (TypeError, ValueError):
+            qtd = 1
+        inicios.append(inicio)
+        fins.append(fim)
+        pesos.append(qtd)
+    programadas = contar_por_dia(inicios, fins, [0] * len(inicios), 1, inicio_ms, n_dias, pesos)[0]
+
+    return {
+        'dias': [(hoje + timedelta(days=d)).strftime("%d/%m/%Y") for d in range(n_dias)],
+        'banhos': [{
+            'bathId': banho.id,
+            'temp': banho.temp,
+            'capacidade': len(banho.circuitos) - manutencao[i],
+            'manutencao': manutencao[i],
+            'ocupados': ocupacao[i].tolist()
+        } for i, banho in enumerate(banhos)],
+        'programadas': programadas.tolist()
+    }
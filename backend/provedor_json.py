@@ -0,0 +1,50 @@
+#provedor JSON do Flask usando orjson quando estiver instalado; JSON_PROVIDER=padrao volta pro encoder da stdlib
+#a saida segue a do provedor padrao (chaves ordenadas, datas no formato HTTP via default), so que bem mais rapida nos
+#payloads grandes (/api/data inteiro, details do OEE). Diferenca: NaN/Infinity viram null em vez de JSON invalido
+
+import os
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+USAR_ORJSON = orjson is not None and os.getenv("JSON_PROVIDER", "orjson") != "padrao"
+
+class ProvedorJSONRapido(DefaultJSONProvider):
+    def _opcoes_orjson(self):
+        # datas e dataclasses passam pelo default do Flask pra manter o mesmo formato de antes
+        opcoes = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            opcoes |= orjson.OPT_SORT_KEYS
+        return opcoes
+
+    def dumps_bytes(self, obj):
+        #None quando nao tem orjson ou ele nao deu conta do objeto (inteiro maior que 64 bits, tipo desconhecido)
+        if not USAR_ORJSON:
+            return None
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._opcoes_orjson())
+        except TypeError:
+            return None
+
+    def dumps_stdlib(self, obj, **kwargs):
+        return super().dumps(obj, **kwargs)
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            dados = self.dumps_bytes(obj)
+            if dados is not None:
+                return dados.decode('utf-8')
+        return self.dumps_stdlib(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        # em debug o Flask indenta a resposta; ai deixa com a stdlib
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        dados = self.dumps_bytes(obj)
+        if dados is None:
+            return self._app.response_class(f"{self.dumps_stdlib(obj)}\n", mimetype=self.mimetype)
+        return self._app.response_class(dados + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,192 @@
+#replica em memoria (por worker) das colecoes mais lidas, mantida viva por listeners on_snapshot
+#liga com REPLICA_ATIVA=1; enquanto uma colecao nao estiver pronta as leituras continuam indo no firestore
+
+import copy
+import time
+import threading
+from configuracao import bd_firestore
+
+_trava = threading.Lock()
+# nome da colecao -> Watch do on_snapshot
+_listeners = {}
+# o Watch fecha sozinho quando o stream da erro (sem chamar o callback); a colecao deixa de estar pronta e o
+# listener e recriado na proxima leitura, no maximo uma vez a cada INTERVALO_REINICIO_SEG por colecao
+INTERVALO_REINICIO_SEG = 30
+_ultimo_inicio = {}
+_desejada = False
+_trava_listeners = threading.Lock()
+_estado = {
+    'lab_main': {'dados': None, 'versao': None, 'atualizado_em': None, 'pronto': False, 'eventos': 0, 'falhas': 0},
+    'solicitacoes': {'dados': {}, 'versao': None, 'atualizado_em': None, 'pronto': False, 'eventos': 0, 'falhas': 0},
+    'users': {'dados': {}, 'versao': None, 'atualizado_em': None, 'pronto': False, 'eventos': 0, 'falhas': 0},
+}
+_iniciada_em = None
+_ouvintes_lab = []
+
+def ativa():
+    #so conta como ativa com todos os listeners de pe
+    _verificar_listeners()
+    return _desejada and len(_listeners) == len(_estado)
+
+def desejada():
+    #ligada por iniciar(), mesmo que algum listener esteja caido no momento
+    return _desejada
+
+def registrar_ouvinte_lab(funcao):
+    #chamado com o novo lab_data/main quando a mudanca veio de fora deste worker
+    _ouvintes_lab.append(funcao)
+
+def _ao_mudar_lab(snapshots, mudancas, momento_leitura):
+    mudanca_externa = None
+    with _trava:
+        item = _estado['lab_main']
+        for doc in snapshots:
+            # ignora snapshot mais velho que uma escrita local ja aplicada
+            if item['versao'] and doc.update_time and doc.update_time < item['versao']:
+                continue
+            if doc.update_time != item['versao'] and doc.exists:
+                mudanca_externa = doc.to_dict()
+            item['dados'] = doc.to_dict() if doc.exists else None
+            item['versao'] = doc.update_time
+        item['atualizado_em'] = time.time()
+        item['pronto'] = True
+        item['eventos'] += 1
+
+    if mudanca_externa is not None:
+        for funcao in _ouvintes_lab:
+            try:
+                funcao(mudanca_externa)
+            except Exception as erro:
+                print(f"Aviso: ouvinte da réplica falhou - {erro}")
+
+def _ao_mudar_colecao(nome):
+    def ao_mudar(snapshots, mudancas, momento_leitura):
+        with _trava:
+            item = _estado[nome]
+            for mudanca in mudancas:
+                if mudanca.type.name == 'REMOVED':
+                    item['dados'].pop(mudanca.document.id, None)
+                else:
+                    item['dados'][mudanca.document.id] = mudanca.document.to_dict()
+            item['versao'] = momento_leitura
+            item['atualizado_em'] = time.time()
+            item['pronto'] = True
+            item['eventos'] += 1
+    return ao_mudar
+
+def _criar_listener(nome):
+    if nome == 'lab_main':
+        return bd_firestore.collection('lab_data').document('main').on_snapshot(_ao_mudar_lab)
+    return bd_firestore.collection(nome).on_snapshot(_ao_mudar_colecao(nome))
+
+def _iniciar_listener(nome):
+    _ultimo_inicio[nome] = time.time()
+    try:
+        _listeners[nome] = _criar_listener(nome)
+    except Exception as erro:
+        print(f"Aviso: listener da réplica ({nome}) não iniciado - {erro}")
+
+def _verificar_listeners():
+    #chamado antes de cada leitura: listener morto tira a colecao do ar e volta a subir quando der o intervalo
+    if not _desejada or not _trava_listeners.acquire(blocking=False):
+        return
+    try:
+        _verificar_listeners_travado()
+    finally:
+        _trava_listeners.release()
+
+def _verificar_listeners_travado():
+    for nome in _estado:
+        listener = _listeners.get(nome)
+        if listener is not None:
+            if not getattr(listener, '_closed', False):
+                continue
+            print(f"Aviso: listener da réplica ({nome}) caiu, leituras voltam pro Firestore")
+            _listeners.pop(nome, None)
+            with _trava:
+                item = _estado[nome]
+                item['pronto'] = False
+                item['falhas'] += 1
+                # o snapshot inicial do novo listener traz tudo de novo; o que foi apagado no intervalo nao pode ficar
+                if nome != 'lab_main':
+                    item['dados'] = {}
+        if time.time() - _ultimo_inicio.get(nome, 0) >= INTERVALO_REINICIO_SEG:
+            _iniciar_listener(nome)
+
+def iniciar():
+    global _iniciada_em, _desejada
+    if _desejada or not bd_firestore:
+        return
+    _desejada = True
+    for nome in _estado:
+        _iniciar_listener(nome)
+    _iniciada_em = time.time()
+
+def parar():
+    global _desejada
+    _desejada = False
+    while _listeners:
+        try:
+            _listeners.popitem()[1].unsubscribe()
+        except Exception:
+            pass
+    with _trava:
+        for item in _estado.values():
+            item['pronto'] = False
+
+def obter_lab_main():
+    #devolve copia (as rotas alteram o dict antes de salvar) ou None se a replica nao puder responder
+    _verificar_listeners()
+    with _trava:
+        item = _estado['lab_main']
+        if 'lab_main' not in _listeners or not item['pronto'] or item['dados'] is None:
+            return None
+        return copy.deepcopy(item['dados'])
+
+def registrar_escrita_lab(dados, versao):
+    #aplica na hora o que este worker acabou de gravar, pra proxima leitura nao ver o estado antigo
+    if not _listeners:
+        return
+    with _trava:
+        item = _estado['lab_main']
+        item['dados'] = copy.deepcopy(dados)
+        item['versao'] = versao
+        item['atualizado_em'] = time.time()
+
+def obter_solicitacoes():
+    _verificar_listeners()
+    with _trava:
+        item = _estado['solicitacoes']
+        if 'solicitacoes' not in _listeners or not item['pronto']:
+            return None
+        return [(id_doc, copy.deepcopy(dados)) for id_doc, dados in item['dados'].items()]
+
+def obter_usuario(uid):
+    #None = replica nao sabe responder; {} = usuario nao existe
+    _verificar_listeners()
+    with _trava:
+        item = _estado['users']
+        if 'users' not in _listeners or not item['pronto']:
+            return None
+        return copy.deepcopy(item['dados'].get(uid, {}))
+
+def status_replica():
+    _verificar_listeners()
+    agora = time.time()
+    with _trava:
+        colecoes = {}
+        for nome, item in _estado.items():
+            colecoes[nome] = {
+                'pronto': item['pronto'],
+                'listener': nome in _listeners,
+                'eventos': item['eventos'],
+                'falhas': item['falhas'],
+                'segundos_desde_ultimo_evento': round(agora - item['atualizado_em'], 1) if item['atualizado_em'] else None,
+                'documentos': (1 if item['dados'] else 0) if nome == 'lab_main' else len(item['dados'])
+            }
+    return {
+        'ativa': _desejada,
+        'saudavel': _desejada and all(c['pronto'] for c in colecoes.values()),
+        'iniciada_ha_seg': round(agora - _iniciada_em, 1) if _iniciada_em and _desejada else None,
+        'colecoes': colecoes
+    }
@@ -1,8 +1,16 @@
+import os
+import time
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
 from flask import request, jsonify
 from firebase_admin import auth as firebase_auth
 from functools import wraps
 from configuracao import bd_firestore
 from utilitarios import obter_agora
+from metricas import medir_operacao, incrementar
+import replica
 
 PRESETS_PERFIS = {
     'admin': ['dashboard', 'nova_solicitacao', 'meus_acompanhamentos', 'baterias', 'acompanhamento', 'lims', 'bancada', 'oee', 'history', 'protocolos', 'calendar', 'users', 'configuracoes', 'import_digatron'],
@@ -14,6 +22,163 @@ PRESETS_PERFIS = {
     'cliente': ['nova_solicitacao', 'meus_acompanhamentos', 'baterias']
 }
 
+# cache LRU dos tokens ja verificados, chaveado pelo hash do token (o token em si nunca fica na memoria)
+CACHE_TOKENS = OrderedDict()
+TAMANHO_MAX_CACHE_TOKENS = int(os.getenv("AUTH_CACHE_TAMANHO", 1024))
+FOLGA_EXPIRACAO_SEG = 30
+# 0 desliga; se > 0 o token e reverificado com check_revoked a cada N segundos
+INTERVALO_REVOGACAO_SEG = int(os.getenv("AUTH_INTERVALO_REVOGACAO", 0))
+_trava_tokens = threading.Lock()
+
+def verificar_token_com_cache(token):
+    chave = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    agora = time.time()
+
+    with _trava_tokens:
+        entrada = CACHE_TOKENS.get(chave)
+        if entrada:
+            token_decodificado, expira_em, verificado_em = entrada
+            revogacao_em_dia = not INTERVALO_REVOGACAO_SEG or (agora - verificado_em) < INTERVALO_REVOGACAO_SEG
+            if agora < expira_em and revogacao_em_dia:
+                CACHE_TOKENS.move_to_end(chave)
+                incrementar('labmanager_cache_tokens_total', {'resultado': 'hit'})
+                return dict(token_decodificado)
+            del CACHE_TOKENS[chave]
+
+    incrementar('labmanager_cache_tokens_total', {'resultado': 'miss'})
+    token_decodificado = firebase_auth.verify_id_token(token, check_revoked=bool(INTERVALO_REVOGACAO_SEG))
+
+    expira_em = token_decodificado.get('exp', 0) - FOLGA_EXPIRACAO_SEG
+    if expira_em > agora:
+        with _trava_tokens:
+            CACHE_TOKENS[chave] = (token_decodificado, expira_em, agora)
+            CACHE_TOKENS.move_to_end(chave)
+            while len(CACHE_TOKENS) > TAMANHO_MAX_CACHE_TOKENS:
+                CACHE_TOKENS.popitem(last=False)
+
+    return dict(token_decodificado)
+
+def invalidar_cache_tokens(uid=None):
+    #sem uid limpa tudo; com uid derruba so as sessoes daquele usuario (ex: conta desativada)
+    with _trava_tokens:
+        if uid is None:
+            CACHE_TOKENS.clear()
+            return
+        for chave in [k for k, v in CACHE_TOKENS.items() if v[0].get('uid') == uid]:
+            del CACHE_TOKENS[chave]
+
+# cache de role/permissions por uid; o painel de acessos grava 'users' direto pelo client,
+# entao o TTL curto e o que garante que uma mudanca feita la chegue aqui
+CACHE_PERMISSOES = {}
+TTL_PERMISSOES_SEG = int(os.getenv("PERMISSOES_CACHE_TTL", 60))
+_trava_permissoes = threading.Lock()
+_listener_permissoes = None
+INTERVALO_REINICIO_LISTENER_SEG = 30
+_ultimo_inicio_listener = 0
+_listener_desejado = False
+_trava_listener_permissoes = threading.Lock()
+
+def obter_dados_permissao(uid):
+    _verificar_listener_permissoes()
+    dados_replica = replica.obter_usuario(uid)
+    if dados_replica is not None:
+        if not dados_replica:
+            return None
+        return {'role': dados_replica.get('role', 'cliente'), 'permissions': dados_replica.get('permissions', [])}
+
+    agora = time.time()
+    with _trava_permissoes:
+        entrada = CACHE_PERMISSOES.get(uid)
+        if entrada and agora < entrada[1]:
+            incrementar('labmanager_cache_permissoes_total', {'resultado': 'hit'})
+            return entrada[0]
+
+    incrementar('labmanager_cache_permissoes_total', {'resultado': 'miss'})
+    doc_ref = bd_firestore.collection('users').document(uid).get()
+    dados_usuario = None
+    if doc_ref.exists:
+        dados = doc_ref.to_dict()
+        dados_usuario = {'role': dados.get('role', 'cliente'), 'permissions': dados.get('permissions', [])}
+
+    # usuario inexistente tambem entra no cache pra nao martelar o firestore, mas com TTL curto
+    with _trava_permissoes:
+        CACHE_PERMISSOES[uid] = (dados_usuario, agora + TTL_PERMISSOES_SEG)
+    return dados_usuario
+
+def invalidar_cache_permissoes(uid=None):
+    with _trava_permissoes:
+        if uid is None:
+            CACHE_PERMISSOES.clear()
+        else:
+            CACHE_PERMISSOES.pop(uid, None)
+
+def _ao_mudar_usuarios(snapshots, mudancas, momento_leitura):
+    # snapshots traz a colecao inteira: cada aviso do listener renova o TTL de todo mundo,
+    # e se o listener parar de avisar as entradas vencem como as do cache comum
+    expira = time.time() + TTL_PERMISSOES_SEG
+    with _trava_permissoes:
+        for doc in snapshots:
+            dados = doc.to_dict() or {}
+            CACHE_PERMISSOES[doc.id] = ({'role': dados.get('role', 'cliente'), 'permissions': dados.get('permissions', [])}, expira)
+        for mudanca in mudancas:
+            if mudanca.type.name == 'REMOVED':
+                uid = mudanca.document.id
+                CACHE_PERMISSOES[uid] = (None, expira)
+                # usuario apagado no painel: as sessoes em cache dele caem junto
+                invalidar_cache_tokens(uid)
+
+def iniciar_listener_permissoes():
+    global _listener_desejado
+    _listener_desejado = True
+    _verificar_listener_permissoes()
+
+def _iniciar_listener_permissoes():
+    global _listener_permissoes, _ultimo_inicio_listener
+    _ultimo_inicio_listener = time.time()
+    try:
+        _listener_permissoes = bd_firestore.collection('users').on_snapshot(_ao_mudar_usuarios)
+    except Exception as erro:
+        print(f"Aviso: listener de permissões não iniciado - {erro}")
+
+def _parar_listener_permissoes():
+    global _listener_permissoes
+    try:
+        _listener_permissoes.unsubscribe()
+    except Exception:
+        pass
+    _listener_permissoes = None
+
+def _verificar_listener_permissoes():
+    #chamado antes de cada leitura de permissao; try-lock como na replica: quem chega com outra thread ja
+    #verificando segue lendo do cache/firestore em vez de subir um segundo listener
+    if not _listener_desejado or not bd_firestore or not _trava_listener_permissoes.acquire(blocking=False):
+        return
+    try:
+        _verificar_listener_permissoes_travado()
+    finally:
+        _trava_listener_permissoes.release()
+
+def _verificar_listener_permissoes_travado():
+    #com a replica ligada o listener de 'users' dela ja cobre as permissoes: o daqui nao sobe (ou e desligado).
+    #o Watch fecha sozinho quando o stream da erro, sem chamar o callback: o que veio dele sai do cache e o listener
+    #e recriado (no maximo uma vez a cada INTERVALO_REINICIO_LISTENER_SEG); ate la as leituras vao no firestore
+    if replica.desejada():
+        if _listener_permissoes is not None:
+            _parar_listener_permissoes()
+        return
+    if _listener_permissoes is not None:
+        if not getattr(_listener_permissoes, '_closed', False):
+            return
+        print("Aviso: listener de permissões caiu, voltando a ler do Firestore")
+        with _trava_permissoes:
+            CACHE_PERMISSOES.clear()
+        _parar_listener_permissoes()
+    if time.time() - _ultimo_inicio_listener >= INTERVALO_REINICIO_LISTENER_SEG:
+        _iniciar_listener_permissoes()
+
+if os.getenv("PERMISSOES_LISTENER") == "1":
+    iniciar_listener_permissoes()
+
 def requer_autenticacao(funcao_rota):
     @wraps(funcao_rota)
     def funcao_decorada(*args, **kwargs):
@@ -28,7 +193,8 @@ def requer_autenticacao(funcao_rota):
         token = cabecalho_auth.split(' ')[1]
         
         try:
-            token_decodificado = firebase_auth.verify_id_token(token)
+            with medir_operacao('verificar_token'):
+                token_decodificado = verificar_token_com_cache(token)
             request.usuario = token_decodificado 
         except Exception as e:
             return jsonify({"sucesso": False, "erro": "Sessão inválida ou expirada."}), 403
@@ -37,6 +203,48 @@ def requer_autenticacao(funcao_rota):
         
     return funcao_decorada
 
+# EventSource do navegador nao manda header: o stream SSE troca o Bearer por um ticket de uso unico, pedido num POST
+# autenticado. O token do Firebase nunca vai na URL (que acaba em log de proxy/servidor); o ticket que vai la ja
+# foi consumido quando alguem ler o log. Fica em memoria do worker, entao ticket e stream tem que cair no mesmo processo
+TICKETS_STREAM = {}
+TTL_TICKET_STREAM_SEG = int(os.getenv("SSE_TICKET_TTL", 30))
+_trava_tickets = threading.Lock()
+
+def emitir_ticket_stream(usuario):
+    agora = time.time()
+    ticket = secrets.token_urlsafe(32)
+    with _trava_tickets:
+        for vencido in [t for t, (_, expira_em) in TICKETS_STREAM.items() if expira_em <= agora]:
+            del TICKETS_STREAM[vencido]
+        TICKETS_STREAM[ticket] = (dict(usuario), agora + TTL_TICKET_STREAM_SEG)
+    return ticket
+
+def consumir_ticket_stream(ticket):
+    #devolve o usuario do token que pediu o ticket, ou None se nao existe, ja foi usado ou venceu
+    with _trava_tickets:
+        entrada = TICKETS_STREAM.pop(ticket, None)
+    if not entrada or time.time() >= entrada[1]:
+        return None
+    return entrada[0]
+
+def requer_ticket_stream(funcao_rota):
+    #Bearer no header continua valendo (fetch/curl); sem header, so com ?ticket=
+    rota_com_token = requer_autenticacao(funcao_rota)
+
+    @wraps(funcao_rota)
+    def funcao_decorada(*args, **kwargs):
+        ticket = request.args.get('ticket')
+        if request.method == 'OPTIONS' or not ticket or request.headers.get('Authorization'):
+            return rota_com_token(*args, **kwargs)
+
+        usuario = consumir_ticket_stream(ticket)
+        if usuario is None:
+            return jsonify({"sucesso": False, "erro": "Ticket de stream inválido ou expirado."}), 403
+        request.usuario = usuario
+        return funcao_rota(*args, **kwargs)
+
+    return funcao_decorada
+
 def requer_permissao(permissao_necessaria):
     def decorator(f):
         @wraps(f)
@@ -49,11 +257,10 @@ def requer_permissao(permissao_necessaria):
             if not uid:
                 return jsonify({"sucesso": False, "erro": "Usuário não autenticado"}), 401
                 
-            doc_ref = bd_firestore.collection('users').document(uid).get()
-            if not doc_ref.exists:
+            dados_usuario = obter_dados_permissao(uid)
+            if not dados_usuario:
                 return jsonify({"sucesso": False, "erro": "Usuário não encontrado no sistema"}), 403
                 
-            dados_usuario = doc_ref.to_dict()
             permissoes = dados_usuario.get('permissions', [])
             role = dados_usuario.get('role', 'cliente')
             
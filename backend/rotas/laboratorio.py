@@ -1,10 +1,18 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from google.cloud.firestore import FieldFilter
-from .autenticacao import requer_autenticacao
-from banco_dados import carregar_bd, salvar_bd, salvar_log_no_bd, salvar_log_circuito
-from utilitarios import obter_agora, atualizar_progresso_realtime
+from .autenticacao import requer_autenticacao, requer_permissao, requer_ticket_stream, emitir_ticket_stream, TTL_TICKET_STREAM_SEG, invalidar_cache_permissoes, invalidar_cache_tokens
+from banco_dados import carregar_bd, salvar_bd, salvar_log_no_bd, salvar_log_circuito, salvar_logs_em_lote, descarregar_escritas
+from utilitarios import obter_agora, atualizar_progresso_realtime, data_para_epoch_ms, data_br_para_epoch_ms, codificar_cursor, decodificar_cursor
 from firebase_admin import auth
 from configuracao import bd_firestore
+import eventos_lab
+import agregados_lab
+import disponibilidade
+import confiabilidade
+import arquivo_logs
+from agendador_conclusao import agendador
+from modelos import Banho, Circuito, numero_circuito, texto_de_epoch
+import replica
 import re
 from datetime import datetime, timedelta
 import traceback
@@ -23,6 +31,15 @@ def identificar_nome_padrao(linha, db_protocols=[]):
             return p['name']
     return "Desconhecido"
 
+def notificar_banhos(db, ids_banhos, acao):
+    #manda o estado novo de cada banho afetado pro stream; bath None = banho removido
+    for bath_id in ids_banhos:
+        bath = next((b for b in db.get('baths', []) if str(b['id']) == str(bath_id)), None)
+        eventos_lab.publicar('banho', {'acao': acao, 'bathId': str(bath_id), 'bath': bath})
+
+def notificar_log(log):
+    eventos_lab.publicar('log', log)
+
 def calcular_previsao_fim(start_str, nome_protocolo, db_protocols):
     protocolos_ordenados = sorted(db_protocols, key=lambda p: len(p.get('name', '')), reverse=True)
     duracao = 0
@@ -44,8 +61,182 @@ def obter_dados_gerais():
     teve_mudanca = atualizar_progresso_realtime(bd)
     if teve_mudanca:
         salvar_bd(bd)
+        eventos_lab.publicar('banhos', {'baths': bd.get('baths', [])})
     return jsonify(bd)
 
+def varrer_conclusoes():
+    #mesmo caminho do /data, mas disparado pela varredura do agendador: grava e avisa o stream quem terminou
+    bd = carregar_bd()
+    if atualizar_progresso_realtime(bd):
+        salvar_bd(bd)
+        eventos_lab.publicar('banhos', {'baths': bd.get('baths', [])})
+
+@bp_lab.route('/dashboard/summary', methods=['GET'])
+@requer_autenticacao
+def resumo_dashboard():
+    # contadores prontos pra TV/celular, sem mandar o banco inteiro
+    return jsonify({"sucesso": True, **agregados_lab.obter_resumo(carregar_bd, replica.ativa())})
+
+@bp_lab.route('/circuits/next_finishing', methods=['GET'])
+@requer_autenticacao
+def proximos_a_terminar():
+    if not agendador.sincronizado:
+        atualizar_progresso_realtime(carregar_bd(), consumir=False)
+    try:
+        limite = max(1, min(int(request.args.get('limite', 5)), 100))
+    except ValueError:
+        return jsonify({"sucesso": False, "erro": "Parâmetro limite inválido"}), 400
+    proximos = agendador.proximos_a_terminar(limite)
+    for item in proximos:
+        item['previsao'] = texto_de_epoch(item['fimMs'])
+    return jsonify({"sucesso": True, "data": proximos})
+
+@bp_lab.route('/circuits/earliest_available', methods=['GET'])
+@requer_autenticacao
+def circuitos_mais_cedo():
+    # planejamento: onde e quando da pra comecar N amostras de um protocolo numa temperatura
+    nome_protocolo = str(request.args.get('protocol', '')).strip()
+    temp = request.args.get('temp')
+    paralelo = request.args.get('parallel', '').lower() in ('1', 'true', 'sim')
+    try:
+        amostras = max(1, min(int(request.args.get('samples', 1)), 200))
+    except ValueError:
+        return jsonify({"sucesso": False, "erro": "Parâmetro samples inválido"}), 400
+    if not nome_protocolo or temp is None:
+        return jsonify({"sucesso": False, "erro": "Informe protocol e temp"}), 400
+
+    # as duracoes dos protocolos vem no mesmo sincronismo do indice, sem ler o laboratorio a cada consulta
+    if disponibilidade.indice.precisa_sincronizar():
+        disponibilidade.indice.sincronizar(carregar_bd())
+    protocolo = disponibilidade.indice.protocolo(nome_protocolo)
+    if not protocolo or not protocolo[1]:
+        return jsonify({"sucesso": False, "erro": "Protocolo não encontrado ou sem duração"}), 404
+    nome_protocolo, duracao_horas = protocolo
+
+    agora_ms = data_para_epoch_ms(obter_agora())
+    duracao_ms = int(float(duracao_horas) * 3600 * 1000)
+    slots, livres_agora = disponibilidade.indice.mais_cedo(temp, amostras, paralelo, agora_ms)
+    for s in slots:
+        s['inicio'] = texto_de_epoch(s['inicioMs'])
+        s['previsao'] = texto_de_epoch(s['inicioMs'] + duracao_ms)
+
+    completo = len(slots) == amostras
+    inicio_conjunto = max(s['inicioMs'] for s in slots) if completo else None
+    return jsonify({
+        "sucesso": True,
+        "protocol": nome_protocolo,
+        "duracaoHoras": duracao_horas,
+        "livresAgora": livres_agora,
+        "atendeTodas": completo,
+        "inicioConjunto": texto_de_epoch(inicio_conjunto) if completo else None,
+        "slots": slots
+    })
+
+@bp_lab.route('/occupancy/projection', methods=['GET'])
+@requer_autenticacao
+def projecao_ocupacao_banhos():
+    # carga futura por banho/dia pro calendario: testes rodando + solicitacoes programadas
+    # import aqui pra nao trazer o numpy no boot de todo worker
+    import projecao_ocupacao
+    try:
+        semanas = max(1, min(int(request.args.get('semanas', 12)), 52))
+    except ValueError:
+        return jsonify({"sucesso": False, "erro": "Parâmetro semanas inválido"}), 400
+    try:
+        db = carregar_bd()
+        da_replica = replica.obter_solicitacoes()
+        if da_replica is not None:
+            solicitacoes = [dados for _, dados in da_replica]
+        else:
+            consulta = bd_firestore.collection('solicitacoes').where(filter=FieldFilter('status', 'in', projecao_ocupacao.STATUS_PROGRAMADOS))
+            solicitacoes = [doc.to_dict() for doc in consulta.select(['status', 'dataInicio', 'dataFim', 'qtdAmostras']).get()]
+        return jsonify({"sucesso": True, **projecao_ocupacao.projetar(db, solicitacoes, obter_agora(), semanas)})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"sucesso": False, "erro": str(e)}), 500
+
+@bp_lab.route('/circuits/reliability', methods=['GET'])
+@requer_autenticacao
+def ranking_confiabilidade():
+    # piores circuitos do laboratorio (falhas, MTBF, MTTR, utilizacao) lendo so a colecao de rollups
+    ordenar_por = request.args.get('ordem', 'falhas')
+    if ordenar_por not in confiabilidade.ORDENACOES:
+        return jsonify({"sucesso": False, "erro": f"Parâmetro ordem inválido (use {', '.join(confiabilidade.ORDENACOES)})"}), 400
+    try:
+        limite = max(1, min(int(request.args.get('limite', 20)), 500))
+    except ValueError:
+        return jsonify({"sucesso": False, "erro": "Parâmetro limite inválido"}), 400
+    try:
+        return jsonify({"sucesso": True, "ordem": ordenar_por, **confiabilidade.ranking(ordenar_por, limite)})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"sucesso": False, "erro": str(e)}), 500
+
+@bp_lab.route('/circuits/reliability/rebuild', methods=['POST', 'OPTIONS'], strict_slashes=False)
+@requer_autenticacao
+@requer_permissao('configuracoes')
+def recalcular_confiabilidade():
+    # backfill dos logs anteriores aos rollups (ou de um circuito so, com circuitId)
+    if request.method == 'OPTIONS': return jsonify({}), 200
+    try:
+        circuit_id = (request.json or {}).get('circuitId')
+        circuitos = confiabilidade.recalcular(str(circuit_id) if circuit_id else None)
+        return jsonify({"sucesso": True, "circuitos": circuitos})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"sucesso": False, "erro": str(e)}), 500
+
+@bp_lab.route('/logs/compact', methods=['GET', 'OPTIONS'], strict_slashes=False)
+@requer_autenticacao
+def status_compactacao_logs():
+    # andamento e resultado da ultima compactacao
+    if request.method == 'OPTIONS': return jsonify({}), 200
+    return jsonify({"sucesso": True, **arquivo_logs.status_compactacao()})
+
+@bp_lab.route('/logs/compact', methods=['POST'], strict_slashes=False)
+@requer_autenticacao
+@requer_permissao('configuracoes')
+def compactar_logs():
+    # dispara o arquivamento mensal em segundo plano (dias opcional): apaga eventos da colecao, entao so pra quem configura
+    try:
+        dias = int((request.json or {}).get('dias', arquivo_logs.ARQUIVAR_APOS_DIAS))
+    except (TypeError, ValueError):
+        return jsonify({"sucesso": False, "erro": "Parâmetro dias inválido"}), 400
+    if dias < 31:
+        return jsonify({"sucesso": False, "erro": "Arquive só eventos com mais de 31 dias"}), 400
+    iniciou = arquivo_logs.compactar_em_segundo_plano(dias)
+    return jsonify({"sucesso": True, "iniciado": iniciou, **arquivo_logs.status_compactacao()}), 202 if iniciou else 200
+
+@bp_lab.route('/stream/ticket', methods=['POST', 'OPTIONS'], strict_slashes=False)
+@requer_autenticacao
+def ticket_stream():
+    # o EventSource nao manda Authorization: a tela pede aqui um ticket de uso unico e abre /stream?ticket=
+    if request.method == 'OPTIONS': return jsonify({}), 200
+    return jsonify({"sucesso": True, "ticket": emitir_ticket_stream(request.usuario), "expiraEmSeg": TTL_TICKET_STREAM_SEG})
+
+@bp_lab.route('/stream', methods=['GET'])
+@requer_ticket_stream
+def stream_laboratorio():
+    # uma conexao SSE por tela no lugar do polling de /data
+    if not eventos_lab.reservar_conexao():
+        resposta = jsonify({"sucesso": False, "erro": "Limite de conexões de tempo real atingido, use /data"})
+        resposta.headers['Retry-After'] = '60'
+        return resposta, 503
+    ultimo_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+
+    def obter_snapshot():
+        bd = carregar_bd()
+        atualizar_progresso_realtime(bd, consumir=False)
+        return bd
+
+    gerador = eventos_lab.gerar_stream(obter_snapshot, ultimo_id, encerrar_em=request.usuario.get('exp'))
+    resposta = Response(stream_with_context(gerador), mimetype='text/event-stream')
+    # roda no close da resposta mesmo se o gerador nunca chegou a iniciar (cliente caiu antes do primeiro byte)
+    resposta.call_on_close(eventos_lab.liberar_conexao)
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
+
 @bp_lab.route('/criar_conta_local', methods=['POST', 'OPTIONS'], strict_slashes=False)
 @requer_autenticacao
 def criar_conta_local():
@@ -64,6 +255,8 @@ def criar_conta_local():
             'name': dados.get('nome'), 'email': email, 'role': dados.get('role', 'cliente'),
             'permissions': dados.get('permissions', []), 'createdAt': obter_agora().isoformat()
         })
+        invalidar_cache_permissoes(user_record.uid)
+        invalidar_cache_tokens(user_record.uid)
         return jsonify({"sucesso": True, "uid": user_record.uid})
     except Exception as e:
         return jsonify({"sucesso": False, "erro": str(e)}), 400
@@ -80,6 +273,7 @@ def importar_digatron():
         db = carregar_bd()
         
         try:
+            descarregar_escritas()
             doc = bd_firestore.collection('lab_data').document('main').get()
             if doc.exists:
                 dados_nuvem = doc.to_dict()
@@ -92,7 +286,9 @@ def importar_digatron():
         protocols = db.get('protocols', [])
         experience_owners = db.get('experienceOwners', {})
         atualizados = []
+        banhos_afetados = []
         detalhes_importacao = [] 
+        logs_individuais = []
         agora = obter_agora()
         
         matches = re.finditer(r"Circuit\s*0*(\d+).*?(\d{2}/\d{2}/\d{4}\s\d{2}:\d{2})", text, re.IGNORECASE)
@@ -128,12 +324,13 @@ def importar_digatron():
                             'batteryId': bat_id, 'protocol': proto_name, 'progress': 0, 'noSpace': False
                         })
                         atualizados.append(c['id'])
+                        if str(bath['id']) not in banhos_afetados: banhos_afetados.append(str(bath['id']))
                         detalhes_importacao.append(f"C-{cid_num} ({bat_id} | Solicitante: {dono})")
                         
                         data_inicio = t_start.split(' ')[0]
                         
                         log_individual = {
-                            "id": int(agora.timestamp() * 1000) + len(atualizados),
+                            "id": data_para_epoch_ms(agora) + len(atualizados),
                             "action": "Início de Teste",
                             "bath": str(bath['id']),
                             "circuitId": c['id'],
@@ -141,14 +338,17 @@ def importar_digatron():
                             "date": agora.strftime("%d/%m/%Y %H:%M"),
                             "details": f"Data: {data_inicio} | Exp/Ano: {expCode_display} | Lote/ID: {bat_id} | Prot: {proto_name}"
                         }
-                        salvar_log_circuito(log_individual)
+                        logs_individuais.append(log_individual)
                         
+        # um batch no lugar de um set por circuito importado
+        salvar_logs_em_lote(logs_individuais, colecoes=('circuit_logs',))
+
         if atualizados:
             detalhes_str = ", ".join(detalhes_importacao)
             if len(detalhes_str) > 250:
                  detalhes_str = detalhes_str[:247] + "..."
             new_log = {
-                "id": int(agora.timestamp() * 1000),
+                "id": data_para_epoch_ms(agora),
                 "action": "Importação em Massa",
                 "bath": "Vários",
                 "circuitId": "Vários",
@@ -161,6 +361,8 @@ def importar_digatron():
             db['logs'] = db['logs'][:100]
             
         salvar_bd(db)
+        notificar_banhos(db, banhos_afetados, 'import')
+        if atualizados: notificar_log(new_log)
         return jsonify({"sucesso": True, "atualizados": atualizados, "db_atualizado": db})
     except Exception as e:
         traceback.print_exc()
@@ -177,6 +379,7 @@ def salvar_owners():
             db['experienceOwners'] = {}
         db['experienceOwners'].update(novos_donos)
         salvar_bd(db)
+        eventos_lab.publicar('donos', {'experienceOwners': db['experienceOwners']})
         return jsonify({"sucesso": True, "db_atualizado": db})
     except Exception as e:
         return jsonify({"sucesso": False, "erro": str(e)}), 500
@@ -187,9 +390,10 @@ def bath_add():
     if request.method == 'OPTIONS': return jsonify({}), 200
     d = request.json
     db = carregar_bd()
-    db['baths'].append({"id": d['bathId'], "temp": d.get('temp', 25), "circuits": [], "isFull": False})
+    db['baths'].append(Banho(id=d['bathId'], temp=d.get('temp', 25)).para_dict())
     db['baths'].sort(key=lambda x: x['id'])
     salvar_bd(db)
+    notificar_banhos(db, [d['bathId']], 'add')
     return jsonify({"sucesso": True, "db_atualizado": db})
 
 @bp_lab.route('/baths/delete', methods=['POST', 'OPTIONS'], strict_slashes=False)
@@ -200,6 +404,7 @@ def bath_delete():
     db = carregar_bd()
     db['baths'] = [b for b in db['baths'] if str(b['id']) != str(d['bathId'])]
     salvar_bd(db)
+    notificar_banhos(db, [d['bathId']], 'delete')
     return jsonify({"sucesso": True, "db_atualizado": db})
 
 @bp_lab.route('/baths/rename', methods=['POST', 'OPTIONS'], strict_slashes=False)
@@ -219,6 +424,7 @@ def bath_rename():
                 break
         if found:
             salvar_bd(db)
+            eventos_lab.publicar('banho', {'acao': 'rename', 'oldId': old_id, 'bathId': new_id, 'bath': next((b for b in db['baths'] if str(b['id']) == new_id), None)})
             return jsonify({"sucesso": True, "db_atualizado": db})
         return jsonify({"sucesso": False, "erro": "Banho não encontrado"}), 404
     except Exception as e:
@@ -238,6 +444,7 @@ def bath_update_temp():
                 b['temp'] = new_temp
                 break
         salvar_bd(db)
+        notificar_banhos(db, [bath_id], 'temp')
         return jsonify({"sucesso": True, "db_atualizado": db})
     except Exception as e:
         return jsonify({"sucesso": False, "erro": str(e)}), 500
@@ -267,7 +474,7 @@ def bath_toggle_full():
         agora = obter_agora()
         status_log = "Lotado (Sem Espaço)" if is_full else "Com Espaço Restaurado"
         new_log = {
-            "id": int(agora.timestamp() * 1000),
+            "id": data_para_epoch_ms(agora),
             "action": "Espaço Físico",
             "bath": bath_id,
             "circuitId": "Todos",
@@ -278,11 +485,190 @@ def bath_toggle_full():
         if 'logs' not in db: db['logs'] = []
         db['logs'].insert(0, new_log)
         db['logs'] = db['logs'][:100]
+        notificar_banhos(db, [bath_id], 'full')
+        notificar_log(new_log)
         return jsonify({"sucesso": True, "db_atualizado": db})
     except Exception as e:
         traceback.print_exc()
         return jsonify({"sucesso": False, "erro": str(e)}), 500
 
+def _registrar_logs_no_db(db, logs):
+    if 'logs' not in db: db['logs'] = []
+    for log in logs:
+        db['logs'].insert(0, log)
+    db['logs'] = db['logs'][:100]
+
+# as operacoes de circuito so mexem no dict do banco e devolvem (banhos afetados, logs novos)
+# gravar, logar e notificar fica com a rota, assim a rota unitaria e o /circuits/batch usam o mesmo codigo
+# banhos afetados vazio = banho/circuito nao encontrado (nada foi alterado)
+
+def aplicar_circuit_add(db, d, agora):
+    cid = f"C-{d['circuitId']}" if not str(d['circuitId']).startswith("C-") else d['circuitId']
+    encontrado = False
+    for b in db['baths']:
+        if str(b['id']) == str(d['bathId']):
+            b['circuits'].append(Circuito(id=cid, previsao_texto='-', no_space=b.get('isFull', False)).para_dict())
+            encontrado = True
+            break
+    new_log = {"id": data_para_epoch_ms(agora), "action": "Adição", "bath": str(d['bathId']), "circuitId": cid, "date": agora.strftime("%d/%m/%Y %H:%M"), "details": f"Circuito {cid} adicionado"}
+    return ([str(d['bathId'])] if encontrado else []), [new_log]
+
+def aplicar_circuit_status(db, d, agora):
+    target_bath = str(d.get('bathId'))
+    target_circuit = str(d.get('circuitId'))
+    new_status = str(d.get('status')).lower() 
+    if new_status == 'true': new_status = 'maintenance'
+    if new_status == 'false': new_status = 'free'
+    
+    alvo_num = numero_circuito(target_circuit)
+    
+    for b in db.get('baths', []):
+        if str(b['id']) == target_bath:
+            for c in b.get('circuits', []):
+                if alvo_num is not None and numero_circuito(c['id']) == alvo_num:
+                    old_status = c.get('status', 'free')
+                    battery_id = c.get('batteryId', 'N/A')
+                    
+                    action_text = "Status Alterado"
+                    details_text = f"Status mudou de {old_status} para {new_status}."
+
+                    if new_status == 'maintenance':
+                        action_text = "Entrada em Manutenção"
+                        details_text = "Circuito bloqueado para verificação preventiva ou corretiva."
+                        battery_id = 'N/A' 
+                    elif new_status == 'free' and old_status == 'maintenance':
+                        action_text = "Saída de Manutenção"
+                        details_text = "Circuito liberado pela equipe técnica e pronto para uso."
+                    elif new_status == 'free' and old_status in ['running', 'finished']:
+                        action_text = "Teste Concluído"
+                        details_text = f"Bateria {battery_id} finalizada. Circuito vazio e liberado."
+                    elif new_status == 'finished':
+                        action_text = "Conclusão Manual"
+                        details_text = f"Teste da bateria {battery_id} foi marcado como finalizado manualmente."
+                    
+                    if new_status == 'free':
+                        c.update({'status': 'free', 'batteryId': None, 'protocol': None, 'previsao': '-', 'startTime': None, 'progress': 0, 'isParallel': False})
+                    else:
+                        c['status'] = new_status
+                        c['noSpace'] = False
+                        
+                    new_log = {
+                        "id": data_para_epoch_ms(agora), "action": action_text, 
+                        "bath": target_bath, "circuitId": c['id'], "batteryId": battery_id if battery_id != 'N/A' else None,
+                        "date": agora.strftime("%d/%m/%Y %H:%M"), "details": details_text
+                    }
+                    return [target_bath], [new_log]
+    return [], []
+
+def aplicar_circuit_nospace(db, d, agora):
+    circuit_id = str(d.get('circuitId'))
+    no_space = bool(d.get('noSpace', True))
+    ckt_num = numero_circuito(circuit_id)
+
+    for b in db.get('baths', []):
+        for c in b.get('circuits', []):
+            if ckt_num is not None and numero_circuito(c['id']) == ckt_num:
+                c['noSpace'] = no_space
+                return [str(b['id'])], []
+    return [], []
+
+def aplicar_circuit_move(db, d, agora):
+    src_bath_id = str(d['sourceBathId'])
+    tgt_bath_id = str(d['targetBathId'])
+    circuit_id = str(d['circuitId'])
+    circuit_obj = None
+    ckt_num = numero_circuito(circuit_id) if numero_circuito(circuit_id) is not None else -1
+
+    # confere o destino antes de tirar o circuito da origem, senao ele sumia do quadro
+    banho_destino = next((b for b in db['baths'] if str(b['id']) == tgt_bath_id), None)
+    if banho_destino is None:
+        return [], []
+    
+    for b in db['baths']:
+        if str(b['id']) == src_bath_id:
+            for idx, c in enumerate(b['circuits']):
+                c_num = numero_circuito(c['id']) if numero_circuito(c['id']) is not None else -2
+                if c['id'] == circuit_id or c_num == ckt_num:
+                    circuit_obj = c
+                    b['circuits'].pop(idx)
+                    break
+            break
+
+    if not circuit_obj:
+        return [], []
+
+    # mudou de banho: o par fisico com quem ficou na origem deixa de existir
+    parceiro = circuit_obj.pop('linkedTo', None)
+    if parceiro is not None:
+        for b in db['baths']:
+            if str(b['id']) == src_bath_id:
+                for c in b['circuits']:
+                    if c['id'] == parceiro and c.get('linkedTo') == circuit_obj['id']:
+                        c.pop('linkedTo', None)
+
+    ids_existentes = [x['id'] for x in banho_destino['circuits']]
+    if circuit_obj['id'] in ids_existentes:
+         circuit_obj['id'] = f"{circuit_obj['id']}_mov"
+    banho_destino['circuits'].append(circuit_obj)
+    banho_destino['circuits'].sort(key=lambda x: numero_circuito(x['id']) if numero_circuito(x['id']) is not None else 999)
+    new_log = {
+        "id": data_para_epoch_ms(agora), "action": "Mudança de Local", 
+        "bath": tgt_bath_id, "circuitId": circuit_obj['id'], "batteryId": circuit_obj.get('batteryId'),
+        "date": agora.strftime("%d/%m/%Y %H:%M"), "details": f"Migrado fisicamente de {src_bath_id} para {tgt_bath_id}."
+    }
+    return [src_bath_id, tgt_bath_id], [new_log]
+
+def aplicar_circuit_link(db, d, agora):
+    bath_id = str(d['bathId'])
+    source_id = str(d['sourceId'])
+    target_id = str(d['targetId'])
+    source_circuit = None
+    target_circuit = None
+    source_num = numero_circuito(source_id)
+    target_num = numero_circuito(target_id)
+    for b in db['baths']:
+        if str(b['id']) == bath_id:
+            for c in b['circuits']:
+                c_num = numero_circuito(c['id'])
+                if c_num is not None and c_num == source_num:source_circuit = c
+                if c_num is not None and c_num == target_num:target_circuit = c
+            break
+    if not (source_circuit and target_circuit):
+        return [], []
+
+    target_circuit['status'] = source_circuit['status']
+    target_circuit['batteryId'] = source_circuit.get('batteryId')
+    target_circuit['protocol'] = source_circuit.get('protocol')
+    target_circuit['startTime'] = source_circuit.get('startTime')
+    target_circuit['previsao'] = source_circuit.get('previsao')
+    target_circuit['progress'] = source_circuit.get('progress', 0)
+    target_circuit['isParallel'] = True 
+    source_circuit['isParallel'] = True 
+    # par fisico fica registrado (sobrevive ao fim do teste): a busca de vagas em paralelo usa esse vinculo
+    for b in db['baths']:
+        if str(b['id']) == bath_id:
+            for c in b['circuits']:
+                if c is not source_circuit and c is not target_circuit and c.get('linkedTo') in (source_circuit['id'], target_circuit['id']):
+                    c.pop('linkedTo', None)
+    source_circuit['linkedTo'] = target_circuit['id']
+    target_circuit['linkedTo'] = source_circuit['id']
+    
+    new_log = {
+        "id": data_para_epoch_ms(agora), "action": "Vínculo em Paralelo", 
+        "bath": bath_id, "circuitId": target_circuit['id'], "batteryId": target_circuit.get('batteryId'),
+        "date": agora.strftime("%d/%m/%Y %H:%M"), "details": f"Clonou as configurações do circuito mestre {source_circuit['id']}."
+    }
+    return [bath_id], [new_log]
+
+OPERACOES_CIRCUITO = {
+    'add': aplicar_circuit_add,
+    'status': aplicar_circuit_status,
+    'nospace': aplicar_circuit_nospace,
+    'move': aplicar_circuit_move,
+    'link': aplicar_circuit_link,
+}
+LIMITE_OPERACOES_LOTE = 200
+
 @bp_lab.route('/circuits/add', methods=['POST', 'OPTIONS'], strict_slashes=False)
 @requer_autenticacao
 def circuit_add():
@@ -290,19 +676,15 @@ def circuit_add():
     try:
         d = request.json
         db = carregar_bd()
-        cid = f"C-{d['circuitId']}" if not str(d['circuitId']).startswith("C-") else d['circuitId']
-        for b in db['baths']:
-            if str(b['id']) == str(d['bathId']):
-                b['circuits'].append({"id": cid, "status": "free", "batteryId": None, "previsao": "-", "noSpace": b.get('isFull', False)})
-                break
-        agora = obter_agora()
-        new_log = {"id": int(agora.timestamp() * 1000), "action": "Adição", "bath": str(d['bathId']), "circuitId": cid, "date": agora.strftime("%d/%m/%Y %H:%M"), "details": f"Circuito {cid} adicionado"}
-        salvar_log_no_bd(new_log)
-        salvar_log_circuito(new_log)
-        if 'logs' not in db: db['logs'] = []
-        db['logs'].insert(0, new_log)
-        db['logs'] = db['logs'][:100]
+        _, logs = aplicar_circuit_add(db, d, obter_agora())
+        for new_log in logs:
+            salvar_log_no_bd(new_log)
+            salvar_log_circuito(new_log)
+        _registrar_logs_no_db(db, logs)
         salvar_bd(db)
+        notificar_banhos(db, [d['bathId']], 'circuit_add')
+        for new_log in logs:
+            notificar_log(new_log)
         return jsonify({"sucesso": True, "db_atualizado": db})
     except Exception as e:
         return jsonify({"sucesso": False, "erro": str(e)}), 500
@@ -321,6 +703,7 @@ def circuit_delete():
                 b['circuits'] = [c for c in b['circuits'] if apenas_numeros(c['id']) != ckt_clean]
                 break
         salvar_bd(db)
+        notificar_banhos(db, [bath_id], 'circuit_delete')
         return jsonify({"sucesso": True, "db_atualizado": db})
     except Exception as e:
         return jsonify({"sucesso": False, "erro": str(e)}), 500
@@ -332,55 +715,14 @@ def update_circuit_status():
     try:
         d = request.json
         db = carregar_bd()
-        target_bath = str(d.get('bathId'))
-        target_circuit = str(d.get('circuitId'))
-        new_status = str(d.get('status')).lower() 
-        if new_status == 'true': new_status = 'maintenance'
-        if new_status == 'false': new_status = 'free'
-        
-        for b in db.get('baths', []):
-            if str(b['id']) == target_bath:
-                for c in b.get('circuits', []):
-                    if int(apenas_numeros(c['id'])) == int(apenas_numeros(target_circuit)):
-                        old_status = c.get('status', 'free')
-                        battery_id = c.get('batteryId', 'N/A')
-                        
-                        action_text = "Status Alterado"
-                        details_text = f"Status mudou de {old_status} para {new_status}."
-
-                        if new_status == 'maintenance':
-                            action_text = "Entrada em Manutenção"
-                            details_text = "Circuito bloqueado para verificação preventiva ou corretiva."
-                            battery_id = 'N/A' 
-                        elif new_status == 'free' and old_status == 'maintenance':
-                            action_text = "Saída de Manutenção"
-                            details_text = "Circuito liberado pela equipe técnica e pronto para uso."
-                        elif new_status == 'free' and old_status in ['running', 'finished']:
-                            action_text = "Teste Concluído"
-                            details_text = f"Bateria {battery_id} finalizada. Circuito vazio e liberado."
-                        elif new_status == 'finished':
-                            action_text = "Conclusão Manual"
-                            details_text = f"Teste da bateria {battery_id} foi marcado como finalizado manualmente."
-                        
-                        if new_status == 'free':
-                            c.update({'status': 'free', 'batteryId': None, 'protocol': None, 'previsao': '-', 'startTime': None, 'progress': 0, 'isParallel': False})
-                        else:
-                            c['status'] = new_status
-                            c['noSpace'] = False
-                            
-                        agora = obter_agora()
-                        new_log = {
-                            "id": int(agora.timestamp() * 1000), "action": action_text, 
-                            "bath": target_bath, "circuitId": c['id'], "batteryId": battery_id if battery_id != 'N/A' else None,
-                            "date": agora.strftime("%d/%m/%Y %H:%M"), "details": details_text
-                        }
-                        salvar_log_no_bd(new_log)
-                        salvar_log_circuito(new_log)
-                        if 'logs' not in db: db['logs'] = []
-                        db['logs'].insert(0, new_log)
-                        db['logs'] = db['logs'][:100]
-                        break
+        _, logs = aplicar_circuit_status(db, d, obter_agora())
+        for new_log in logs:
+            salvar_log_no_bd(new_log)
+            salvar_log_circuito(new_log)
+            notificar_log(new_log)
+        _registrar_logs_no_db(db, logs)
         salvar_bd(db)
+        notificar_banhos(db, [str(d.get('bathId'))], 'circuit_status')
         return jsonify({"sucesso": True, "db_atualizado": db})
     except Exception as e:
         return jsonify({"sucesso": False, "erro": str(e)}), 500
@@ -392,18 +734,9 @@ def circuit_toggle_no_space():
     try:
         d = request.json
         db = carregar_bd()
-        circuit_id = str(d.get('circuitId'))
-        no_space = bool(d.get('noSpace', True))
-        ckt_num = apenas_numeros(circuit_id)
-        target_bath_id = "Desconhecido"
-
-        for b in db.get('baths', []):
-            for c in b.get('circuits', []):
-                if int(apenas_numeros(c['id'])) == int(ckt_num):
-                    c['noSpace'] = no_space
-                    target_bath_id = str(b['id'])
-                    break
+        banhos, _ = aplicar_circuit_nospace(db, d, obter_agora())
         salvar_bd(db)
+        notificar_banhos(db, banhos or ["Desconhecido"], 'circuit_nospace')
         return jsonify({"sucesso": True, "db_atualizado": db})
     except Exception as e:
         return jsonify({"sucesso": False, "erro": str(e)}), 500
@@ -415,43 +748,16 @@ def circuit_move():
     try:
         d = request.json
         db = carregar_bd()
-        src_bath_id = str(d['sourceBathId'])
-        tgt_bath_id = str(d['targetBathId'])
-        circuit_id = str(d['circuitId'])
-        circuit_obj = None
-        ckt_num = int(apenas_numeros(circuit_id)) if apenas_numeros(circuit_id) else -1
-        
-        for b in db['baths']:
-            if str(b['id']) == src_bath_id:
-                for idx, c in enumerate(b['circuits']):
-                    c_num = int(apenas_numeros(c['id'])) if apenas_numeros(c['id']) else -2
-                    if c['id'] == circuit_id or c_num == ckt_num:
-                        circuit_obj = c
-                        b['circuits'].pop(idx)
-                        break
-                break
-
-        if circuit_obj:
-            for b in db['baths']:
-                if str(b['id']) == tgt_bath_id:
-                    ids_existentes = [x['id'] for x in b['circuits']]
-                    if circuit_obj['id'] in ids_existentes:
-                         circuit_obj['id'] = f"{circuit_obj['id']}_mov"
-                    b['circuits'].append(circuit_obj)
-                    b['circuits'].sort(key=lambda x: int(apenas_numeros(x['id'])) if apenas_numeros(x['id']) else 999)
-                    break
-            agora = obter_agora()
-            new_log = {
-                "id": int(agora.timestamp() * 1000), "action": "Mudança de Local", 
-                "bath": tgt_bath_id, "circuitId": circuit_obj['id'], "batteryId": circuit_obj.get('batteryId'),
-                "date": agora.strftime("%d/%m/%Y %H:%M"), "details": f"Migrado fisicamente de {src_bath_id} para {tgt_bath_id}."
-            }
-            salvar_log_no_bd(new_log)
-            salvar_log_circuito(new_log)
-            if 'logs' not in db: db['logs'] = []
-            db['logs'].insert(0, new_log)
-            db['logs'] = db['logs'][:100]
+        banhos, logs = aplicar_circuit_move(db, d, obter_agora())
+        if banhos:
+            for new_log in logs:
+                salvar_log_no_bd(new_log)
+                salvar_log_circuito(new_log)
+            _registrar_logs_no_db(db, logs)
             salvar_bd(db)
+            notificar_banhos(db, banhos, 'circuit_move')
+            for new_log in logs:
+                notificar_log(new_log)
             
         return jsonify({"sucesso": True, "db_atualizado": db})
     except Exception as e:
@@ -464,44 +770,65 @@ def circuit_link():
     try:
         d = request.json
         db = carregar_bd()
-        bath_id = str(d['bathId'])
-        source_id = str(d['sourceId'])
-        target_id = str(d['targetId'])
-        source_circuit = None
-        target_circuit = None
-        for b in db['baths']:
-            if str(b['id']) == bath_id:
-                for c in b['circuits']:
-                    if int(apenas_numeros(c['id'])) == int(apenas_numeros(source_id)):source_circuit = c
-                    if int(apenas_numeros(c['id'])) == int(apenas_numeros(target_id)):target_circuit = c
-                break
-        if source_circuit and target_circuit:
-            target_circuit['status'] = source_circuit['status']
-            target_circuit['batteryId'] = source_circuit.get('batteryId')
-            target_circuit['protocol'] = source_circuit.get('protocol')
-            target_circuit['startTime'] = source_circuit.get('startTime')
-            target_circuit['previsao'] = source_circuit.get('previsao')
-            target_circuit['progress'] = source_circuit.get('progress', 0)
-            target_circuit['isParallel'] = True 
-            source_circuit['isParallel'] = True 
-            
-            agora = obter_agora()
-            new_log = {
-                "id": int(agora.timestamp() * 1000), "action": "Vínculo em Paralelo", 
-                "bath": bath_id, "circuitId": target_circuit['id'], "batteryId": target_circuit.get('batteryId'),
-                "date": agora.strftime("%d/%m/%Y %H:%M"), "details": f"Clonou as configurações do circuito mestre {source_circuit['id']}."
-            }
-            salvar_log_no_bd(new_log)
-            salvar_log_circuito(new_log)
-            if 'logs' not in db: db['logs'] = []
-            db['logs'].insert(0, new_log)
-            db['logs'] = db['logs'][:100]
+        banhos, logs = aplicar_circuit_link(db, d, obter_agora())
+        if banhos:
+            for new_log in logs:
+                salvar_log_no_bd(new_log)
+                salvar_log_circuito(new_log)
+            _registrar_logs_no_db(db, logs)
             
             salvar_bd(db)
+            notificar_banhos(db, banhos, 'circuit_link')
+            for new_log in logs:
+                notificar_log(new_log)
             return jsonify({"sucesso": True, "db_atualizado": db})
         return jsonify({"sucesso": False, "erro": "Circuitos não encontrados"}), 404
     except Exception as e:
         return jsonify({"sucesso": False, "erro": str(e)}), 500
+
+@bp_lab.route('/circuits/batch', methods=['POST', 'OPTIONS'], strict_slashes=False)
+@requer_autenticacao
+def circuit_batch():
+    # varias operacoes de circuito em cima de um carregar_bd so; se uma falha nenhuma e gravada
+    if request.method == 'OPTIONS': return jsonify({}), 200
+    try:
+        operacoes = (request.json or {}).get('operacoes')
+        if not isinstance(operacoes, list) or not operacoes:
+            return jsonify({"sucesso": False, "erro": "Envie a lista 'operacoes'"}), 400
+        if len(operacoes) > LIMITE_OPERACOES_LOTE:
+            return jsonify({"sucesso": False, "erro": f"Máximo de {LIMITE_OPERACOES_LOTE} operações por lote"}), 400
+
+        db = carregar_bd()
+        agora = obter_agora()
+        banhos_afetados = []
+        logs = []
+        for i, op in enumerate(operacoes, start=1):
+            tipo = op.get('op') if isinstance(op, dict) else None
+            aplicar = OPERACOES_CIRCUITO.get(tipo)
+            if not aplicar:
+                return jsonify({"sucesso": False, "erro": f"Operação {i}: tipo '{tipo}' desconhecido", "indice": i}), 400
+            try:
+                # 1 ms a mais por log pro id (que e o id do documento) nao repetir dentro do lote
+                banhos, novos_logs = aplicar(db, op, agora + timedelta(milliseconds=len(logs)))
+            except (KeyError, TypeError, ValueError) as e:
+                return jsonify({"sucesso": False, "erro": f"Operação {i} ({tipo}): parâmetro inválido {e}", "indice": i}), 400
+            if not banhos:
+                return jsonify({"sucesso": False, "erro": f"Operação {i} ({tipo}): banho ou circuito não encontrado", "indice": i}), 404
+            for bath_id in banhos:
+                if bath_id not in banhos_afetados:
+                    banhos_afetados.append(bath_id)
+            logs.extend(novos_logs)
+
+        _registrar_logs_no_db(db, logs)
+        salvar_bd(db)
+        salvar_logs_em_lote(logs)
+        notificar_banhos(db, banhos_afetados, 'batch')
+        for new_log in logs:
+            notificar_log(new_log)
+        return jsonify({"sucesso": True, "aplicadas": len(operacoes), "db_atualizado": db})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"sucesso": False, "erro": str(e)}), 500
     
 
 @bp_lab.route('/protocols/add', methods=['POST', 'OPTIONS'], strict_slashes=False)
@@ -516,6 +843,7 @@ def protocol_add():
         duracao = int(d.get('duration', 0))
         db['protocols'].append({"id": name, "name": name, "duration": duracao})
         salvar_bd(db)
+        eventos_lab.publicar('protocolos', {'protocols': db['protocols']})
         return jsonify({"sucesso": True, "db_atualizado": db})
     except Exception as e:
         import traceback
@@ -533,26 +861,84 @@ def protocol_delete():
         p_id = d.get('id')
         db['protocols'] = [p for p in db['protocols'] if p.get('id') != p_id]
         salvar_bd(db)
+        eventos_lab.publicar('protocolos', {'protocols': db['protocols']})
         return jsonify({"sucesso": True, "db_atualizado": db})
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({"sucesso": False, "erro": str(e)}), 500
 
+LIMITE_HISTORICO_PADRAO = 50
+LIMITE_HISTORICO_MAX = 200
+# o firestore aceita no maximo 30 valores num filtro 'in'
+LIMITE_ACOES_HISTORICO = 30
+
 @bp_lab.route('/circuits/history', methods=['POST', 'OPTIONS'], strict_slashes=False)
 @requer_autenticacao
 def get_circuit_history():
+    # uma pagina por vez, mais novo primeiro: o id do log e o epoch em ms, entao ordenar por ele e ordenar por data
+    # precisa dos indices compostos circuitId+id (desc) e circuitId+action+id (desc) no firestore
     if request.method == 'OPTIONS': return jsonify({}), 200
     try:
         data = request.json
         circuit_id = str(data.get('circuitId'))
-        
-        logs_ref = bd_firestore.collection('circuit_logs').where(filter=FieldFilter('circuitId', '==', circuit_id)).get()
-        
-        history = [doc.to_dict() for doc in logs_ref]
-        history.sort(key=lambda x: x.get('id', 0), reverse=True)
-        
-        return jsonify({"sucesso": True, "logs": history})
+        try:
+            limite = max(1, min(int(data.get('limite', LIMITE_HISTORICO_PADRAO)), LIMITE_HISTORICO_MAX))
+        except (TypeError, ValueError):
+            return jsonify({"sucesso": False, "erro": "Parâmetro limite inválido"}), 400
+
+        consulta = bd_firestore.collection('circuit_logs').where(filter=FieldFilter('circuitId', '==', circuit_id))
+
+        inicio_ms = fim_ms = None
+        acoes = data.get('acoes') or data.get('action')
+        if acoes:
+            acoes = [acoes] if isinstance(acoes, str) else list(acoes)
+            if len(acoes) > LIMITE_ACOES_HISTORICO:
+                return jsonify({"sucesso": False, "erro": f"No máximo {LIMITE_ACOES_HISTORICO} ações por consulta"}), 400
+            consulta = consulta.where(filter=FieldFilter('action', 'in', acoes))
+
+        if data.get('dataInicio'):
+            inicio_ms = data_br_para_epoch_ms(data['dataInicio'])
+            if inicio_ms is None:
+                return jsonify({"sucesso": False, "erro": "dataInicio inválida (use dd/mm/aaaa)"}), 400
+            consulta = consulta.where(filter=FieldFilter('id', '>=', inicio_ms))
+        if data.get('dataFim'):
+            fim_ms = data_br_para_epoch_ms(data['dataFim'])
+            if fim_ms is None:
+                return jsonify({"sucesso": False, "erro": "dataFim inválida (use dd/mm/aaaa)"}), 400
+            # so a data: o dia inteiro entra
+            if len(str(data['dataFim']).strip()) <= 10:
+                fim_ms += 24 * 3600 * 1000 - 1
+            consulta = consulta.where(filter=FieldFilter('id', '<=', fim_ms))
+
+        consulta = consulta.order_by('id', direction='DESCENDING')
+
+        antes_de_ms = None
+        if data.get('cursor'):
+            posicao = decodificar_cursor(data['cursor'])
+            if not posicao or 'id' not in posicao:
+                return jsonify({"sucesso": False, "erro": "Cursor inválido"}), 400
+            consulta = consulta.start_after({'id': posicao['id']})
+            antes_de_ms = int(posicao['id'])
+
+        # um a mais pra saber se tem proxima pagina sem outra leitura
+        history = [doc.to_dict() for doc in consulta.limit(limite + 1).get()]
+        if len(history) <= limite:
+            # acabaram os eventos quentes: o resto vem dos meses arquivados (sempre mais antigos que os quentes)
+            if history:
+                antes_de_ms = int(history[-1]['id'])
+            tetos = [t for t in (fim_ms, antes_de_ms - 1 if antes_de_ms is not None else None) if t is not None]
+            arquivados = arquivo_logs.ler_arquivados('circuit_logs', circuit_id, inicio_ms, min(tetos) if tetos else None)
+            if acoes:
+                arquivados = [log for log in arquivados if log.get('action') in acoes]
+            arquivados.sort(key=lambda log: int(log['id']), reverse=True)
+            history += arquivados[:limite + 1 - len(history)]
+        proximo_cursor = None
+        if len(history) > limite:
+            history = history[:limite]
+            proximo_cursor = codificar_cursor({'id': history[-1].get('id')})
+
+        return jsonify({"sucesso": True, "logs": history, "proximoCursor": proximo_cursor})
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -574,7 +960,7 @@ def add_circuit_history():
 
         agora = obter_agora()
         new_log = {
-            "id": int(agora.timestamp() * 1000),
+            "id": data_para_epoch_ms(agora),
             "action": action,
             "bath": "Registro Manual",
             "circuitId": circuit_id,
@@ -586,24 +972,28 @@ def add_circuit_history():
         salvar_log_circuito(new_log)
         
         db = carregar_bd()
+        banhos_afetados = []
         
         if action == 'Falha no Equipamento' or action == 'Reparo Realizado':
-            ckt_num = int(apenas_numeros(circuit_id)) if apenas_numeros(circuit_id) else -1
+            ckt_num = numero_circuito(circuit_id) if numero_circuito(circuit_id) is not None else -1
             for b in db.get('baths', []):
                 for c in b.get('circuits', []):
-                    c_num = int(apenas_numeros(c['id'])) if apenas_numeros(c['id']) else -2
+                    c_num = numero_circuito(c['id']) if numero_circuito(c['id']) is not None else -2
                     if c['id'] == circuit_id or c_num == ckt_num:
                         if action == 'Falha no Equipamento':
                             c['status'] = 'maintenance'
                             c['noSpace'] = False
                         elif action == 'Reparo Realizado':
                             c.update({'status': 'free', 'batteryId': None, 'protocol': None, 'previsao': '-', 'startTime': None, 'progress': 0, 'isParallel': False})
+                        banhos_afetados.append(str(b['id']))
                         break
                         
         if 'logs' not in db: db['logs'] = []
         db['logs'].insert(0, new_log)
         db['logs'] = db['logs'][:100]
         salvar_bd(db)
+        notificar_banhos(db, banhos_afetados, 'circuit_history')
+        notificar_log(new_log)
 
         return jsonify({"sucesso": True, "log": new_log})
     except Exception as e:
@@ -619,12 +1009,24 @@ def delete_circuit_history():
         data = request.json
         log_id = str(data.get('logId'))
         
-        bd_firestore.collection('circuit_logs').document(log_id).delete()
+        log_ref = bd_firestore.collection('circuit_logs').document(log_id)
+        log_apagado = log_ref.get()
+        if log_apagado.exists:
+            log_ref.delete()
+            log_apagado = log_apagado.to_dict()
+        elif log_id.isdigit():
+            log_apagado = arquivo_logs.remover_arquivado('circuit_logs', log_id)
+        else:
+            log_apagado = None
+        if log_apagado and log_apagado.get('action') in confiabilidade.TRANSICOES:
+            # apagar um evento muda os intervalos do circuito: refaz so o dele a partir do circuit_logs
+            confiabilidade.recalcular(log_apagado.get('circuitId'))
         
         db = carregar_bd()
         if 'logs' in db:
             db['logs'] = [log for log in db['logs'] if str(log.get('id')) != log_id]
             salvar_bd(db)
+        eventos_lab.publicar('log_removido', {'id': log_id})
             
         return jsonify({"sucesso": True})
     except Exception as e:
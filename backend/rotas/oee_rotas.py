@@ -1,10 +1,13 @@
 
 import os
+import time
+import threading
 from datetime import datetime
 from flask import Blueprint, request, jsonify
 
 
 from .autenticacao import requer_autenticacao, requer_permissao
+from metricas import registrar_inicializacao
 
 
 diretorio_base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -12,11 +15,33 @@ PASTA_UPLOAD_OEE = os.path.join(diretorio_base, 'oee_uploads')
 os.makedirs(PASTA_UPLOAD_OEE, exist_ok=True)
 
 
-servico_oee = None
-try:
-    import oee_service as servico_oee
-except ImportError:
-    print("Aviso crítico: Módulo oee_service.py não encontrado.")
+# oee_service puxa pandas + numpy; so e importado na primeira rota de OEE (ou no aquecimento em background)
+_servico_oee = None
+_servico_indisponivel = False
+_trava_servico = threading.Lock()
+
+def obter_servico_oee():
+    global _servico_oee, _servico_indisponivel
+    if _servico_oee is not None or _servico_indisponivel:
+        return _servico_oee
+    with _trava_servico:
+        if _servico_oee is None and not _servico_indisponivel:
+            inicio = time.perf_counter()
+            try:
+                import oee_service
+                _servico_oee = oee_service
+                registrar_inicializacao('oee_service', time.perf_counter() - inicio)
+            except ImportError:
+                _servico_indisponivel = True
+                print("Aviso crítico: Módulo oee_service.py não encontrado.")
+    return _servico_oee
+
+def aquecer_servico_oee(atraso_seg=0):
+    #carrega o OEE numa thread depois do boot, pra primeira tela de OEE nao pagar o import
+    def _aquecer():
+        time.sleep(atraso_seg)
+        obter_servico_oee()
+    threading.Thread(target=_aquecer, name='aquecimento-oee', daemon=True).start()
 
 bp_oee = Blueprint('oee', __name__)
 
@@ -25,6 +50,7 @@ bp_oee = Blueprint('oee', __name__)
 @requer_permissao('oee')
 def processar_upload():
    
+    servico_oee = obter_servico_oee()
     if not servico_oee: 
         return jsonify({"sucesso": False, "erro": "Serviço OEE Offline"}), 503
         
@@ -47,10 +73,28 @@ def processar_upload():
             
     return jsonify(resultado)
 
+@bp_oee.route('/from_logs', methods=['POST'])
+@requer_autenticacao
+@requer_permissao('oee')
+def processar_de_logs():
+    # alternativa ao upload: monta o mapa do mes com os testes registrados no circuit_logs
+    servico_oee = obter_servico_oee()
+    if not servico_oee: 
+        return jsonify({"sucesso": False, "erro": "Serviço OEE Offline"}), 503
+
+    dados = request.json or {}
+    mes = dados.get('mes')
+    ano = dados.get('ano')
+    if not mes or not ano:
+        return jsonify({"sucesso": False, "erro": "Informe mes e ano."}), 400
+
+    return jsonify(servico_oee.processar_logs_oee(mes, ano))
+
 @bp_oee.route('/calcular', methods=['POST'])
 @requer_autenticacao
 def calcular_indicadores():
    
+    servico_oee = obter_servico_oee()
     if not servico_oee: 
         return jsonify({"sucesso": False, "erro": "Serviço OEE Offline"})
     
@@ -63,6 +107,7 @@ def calcular_indicadores():
 @requer_permissao('oee') 
 def salvar_historico():
     
+    servico_oee = obter_servico_oee()
     if not servico_oee: 
         return jsonify({"sucesso": False, "erro": "Serviço OEE Offline"})
         
@@ -80,6 +125,7 @@ def salvar_historico():
 
 def listar_historico():
    
+    servico_oee = obter_servico_oee()
     if not servico_oee: 
         return jsonify({"sucesso": False, "historico": []})
         
@@ -90,6 +136,7 @@ def listar_historico():
 @requer_permissao('oee') 
 def deletar_historico():
    
+    servico_oee = obter_servico_oee()
     if not servico_oee: 
         return jsonify({"sucesso": False, "erro": "Serviço Offline"})
         
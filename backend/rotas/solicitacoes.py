@@ -1,12 +1,123 @@
+import os
+import time
+import uuid
+import threading
 import traceback
+from datetime import datetime
 from flask import Blueprint, request, jsonify
 from firebase_admin import firestore
-from .autenticacao import requer_autenticacao
+from google.cloud.firestore import FieldFilter
+from .autenticacao import requer_autenticacao, requer_permissao
 from configuracao import bd_firestore
-from utilitarios import obter_agora
+from metricas import desembrulhar, medir_operacao
+from indice_busca import IndiceBusca
+import replica
+from utilitarios import obter_agora, data_para_epoch_ms, data_br_para_epoch_ms, codificar_cursor, decodificar_cursor
 
 bp_solicitacoes = Blueprint('solicitacoes', __name__)
 
+# campos que a tela de acompanhamento usa na lista; o resto (historico, descricao longa) so no detalhe
+CAMPOS_LISTA = [
+    'idSolicitacao', 'tituloProjeto', 'nomeSolicitante', 'laboratorio', 'status', 'dataCriacao', 'dataCriacaoTs',
+    'experiencia', 'codigoSap', 'modeloAmostras', 'qtdAmostras', 'lote', 'fornecedor', 'emailContato',
+    'emailProprietario', 'sharedWith', 'responsavel', 'dataInicio', 'dataFim', 'dataEntrega', 'dataMovimentacao'
+]
+FILTROS_IGUALDADE = ['status', 'laboratorio', 'nomeSolicitante']
+LIMITE_MAX_PAGINA = 200
+
+_datas_migradas = False
+_trava_migracao_datas = threading.Lock()
+
+def migrar_datas_pendentes():
+    #preenche dataCriacaoTs nas solicitacoes antigas a partir da dataCriacao 'dd/mm/YYYY HH:MM'
+    docs = bd_firestore.collection('solicitacoes').select(['dataCriacao', 'dataCriacaoTs']).get()
+    lote = bd_firestore.batch()
+    pendentes = 0
+    migrados = 0
+    sem_data = []
+
+    for doc in docs:
+        dados = doc.to_dict()
+        if dados.get('dataCriacaoTs'):
+            continue
+        ts = data_br_para_epoch_ms(dados.get('dataCriacao'))
+        if ts is None:
+            sem_data.append(doc.id)
+            ts = 0
+        lote.update(bd_firestore.collection('solicitacoes').document(doc.id), {'dataCriacaoTs': ts})
+        pendentes += 1
+        migrados += 1
+        if pendentes >= 400:
+            lote.commit()
+            lote = bd_firestore.batch()
+            pendentes = 0
+
+    if pendentes:
+        lote.commit()
+    return migrados, sem_data
+
+def garantir_datas_criacao():
+    #o order_by deixa de fora quem nao tem dataCriacaoTs: a primeira pagina listada roda o backfill uma vez e grava
+    #o marcador em lab_data/migracoes; dai pra frente (e nos outros workers) so le o marcador
+    global _datas_migradas
+    if _datas_migradas:
+        return
+    with _trava_migracao_datas:
+        if _datas_migradas:
+            return
+        marcador_ref = bd_firestore.collection('lab_data').document('migracoes')
+        marcador = marcador_ref.get()
+        if not (marcador.exists and (marcador.to_dict() or {}).get('dataCriacaoTs')):
+            migrados, sem_data = migrar_datas_pendentes()
+            marcador_ref.set({'dataCriacaoTs': {'em': data_para_epoch_ms(obter_agora()), 'migrados': migrados, 'semData': sem_data}}, merge=True)
+        _datas_migradas = True
+
+def _listar_pagina(limite):
+    garantir_datas_criacao()
+    consulta = bd_firestore.collection('solicitacoes')
+
+    for campo in FILTROS_IGUALDADE:
+        valor = request.args.get(campo)
+        if valor:
+            consulta = consulta.where(filter=FieldFilter(campo, '==', valor))
+
+    email_compartilhado = request.args.get('sharedWith')
+    if email_compartilhado:
+        consulta = consulta.where(filter=FieldFilter('sharedWith', 'array_contains', email_compartilhado))
+
+    consulta = consulta.order_by('dataCriacaoTs', direction='DESCENDING').order_by('__name__', direction='DESCENDING')
+
+    campos = request.args.get('campos', 'lista')
+    if campos == 'lista':
+        consulta = consulta.select(CAMPOS_LISTA)
+    elif campos != 'completo':
+        consulta = consulta.select([c.strip() for c in campos.split(',') if c.strip()] + ['dataCriacaoTs'])
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        posicao = decodificar_cursor(cursor)
+        if not posicao or 'ts' not in posicao or 'id' not in posicao:
+            return jsonify({"sucesso": False, "erro": "Cursor inválido"}), 400
+        consulta = consulta.start_after({'dataCriacaoTs': posicao['ts'], '__name__': posicao['id']})
+
+    # pede um a mais so pra saber se existe proxima pagina
+    docs = list(consulta.limit(limite + 1).get())
+    tem_mais = len(docs) > limite
+    docs = docs[:limite]
+
+    resultados = []
+    for doc in docs:
+        dados = doc.to_dict()
+        if 'idSolicitacao' not in dados: dados['idSolicitacao'] = doc.id
+        resultados.append(dados)
+
+    proximo_cursor = None
+    if tem_mais and docs:
+        ultimo = docs[-1]
+        proximo_cursor = codificar_cursor({'ts': ultimo.get('dataCriacaoTs'), 'id': ultimo.id})
+
+    return jsonify({"sucesso": True, "data": resultados, "proximoCursor": proximo_cursor})
+
 @bp_solicitacoes.route('/listar', methods=['GET', 'OPTIONS'])
 @requer_autenticacao
 def listar_solicitacoes():
@@ -14,20 +125,46 @@ def listar_solicitacoes():
     if not bd_firestore: return jsonify({"sucesso": False, "erro": "Firestore não conectado"}), 500
 
     try:
-        solicitacoes_ref = bd_firestore.collection('solicitacoes').order_by('dataCriacao', direction='DESCENDING')
-        docs = solicitacoes_ref.get()
+        # com ?limite= a listagem vira paginada/filtrada; sem ele mantem a resposta completa das telas atuais
+        if request.args.get('limite'):
+            try:
+                limite = max(1, min(int(request.args.get('limite')), LIMITE_MAX_PAGINA))
+            except ValueError:
+                return jsonify({"sucesso": False, "erro": "Parâmetro limite inválido"}), 400
+            return _listar_pagina(limite)
+
+        documentos = replica.obter_solicitacoes()
+        if documentos is None:
+            documentos = [(doc.id, doc.to_dict()) for doc in bd_firestore.collection('solicitacoes').get()]
         
         resultados = []
-        for doc in docs:
-            dados = doc.to_dict()
-            if 'idSolicitacao' not in dados: dados['idSolicitacao'] = doc.id
+        for id_doc, dados in documentos:
+            if 'idSolicitacao' not in dados: dados['idSolicitacao'] = id_doc
             resultados.append(dados)
+
+        # dataCriacao e 'dd/mm/YYYY HH:MM', ordenar pela string embaralha meses e anos
+        resultados.sort(key=lambda d: d.get('dataCriacaoTs') or data_br_para_epoch_ms(d.get('dataCriacao')) or 0, reverse=True)
             
         return jsonify({"sucesso": True, "data": resultados})
     except Exception as e:
         traceback.print_exc()
         return jsonify({"sucesso": False, "erro": str(e)}), 500
 
+@bp_solicitacoes.route('/migrar_datas', methods=['POST', 'OPTIONS'])
+@requer_autenticacao
+@requer_permissao('configuracoes')
+def migrar_datas_criacao():
+    # a listagem paginada ja roda isso sozinha na primeira vez; aqui e pra refazer na mao (ex: import em massa sem dataCriacaoTs)
+    if request.method == 'OPTIONS': return jsonify({}), 200
+    if not bd_firestore: return jsonify({"sucesso": False, "erro": "Firestore não conectado"}), 500
+
+    try:
+        migrados, sem_data = migrar_datas_pendentes()
+        return jsonify({"sucesso": True, "migrados": migrados, "semData": sem_data})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"sucesso": False, "erro": str(e)}), 500
+
 @bp_solicitacoes.route('/adicionar', methods=['POST', 'OPTIONS'])
 @requer_autenticacao
 def adicionar_solicitacao():
@@ -44,14 +181,180 @@ def adicionar_solicitacao():
 
         agora = obter_agora()
         dados['dataCriacao'] = agora.strftime("%d/%m/%Y %H:%M")
+        dados['dataCriacaoTs'] = data_para_epoch_ms(agora)
         dados['status'] = 'pendente'
         
         bd_firestore.collection('solicitacoes').document(id_doc).set(dados)
+        indice_busca.indexar('solicitacao', id_doc, dados)
         return jsonify({"sucesso": True, "message": "Solicitação criada com sucesso!"})
     except Exception as e:
         traceback.print_exc()
         return jsonify({"sucesso": False, "erro": str(e)}), 500
     
+# Dicionário de monitoramento: Adicionamos os campos do painel de controle!
+CAMPOS_MONITORADOS = {
+    'tituloProjeto': 'Projeto/Motivo',
+    'nomeSolicitante': 'Nome Solicitante',
+    'laboratorio': 'Laboratório',
+    'modeloAmostras': 'Modelo',
+    'qtdAmostras': 'Qtd. Amostras',
+    'codigoSap': 'Código SAP',
+    'objetivoEnsaio': 'Objetivo do Ensaio',
+    'tituloNorma': 'Norma/Procedimento',
+    'descricao': 'Descrição/Escopo',
+    'capacidadeNominal': 'Capacidade Nominal',
+    'cca': 'CCA',
+    'rc': 'RC',
+    'densidade': 'Densidade',
+    'nivelEletrolito': 'Nível do Eletrólito',
+    'separador': 'Separador',
+    'placaPos': 'Placa (+)',
+    'placaNeg': 'Placa (-)',
+    'tipoBateria': 'Tipo de Bateria',
+    'tipoProcedimento': 'Tipo de Procedimento',
+    'tipoEnsaioMecanico': 'Tipo Ensaio Mecânico',
+    'composicaoLiga': 'Composição Liga',
+    'analiseSolicitada': 'Análise Solicitada',
+    'dadosAmostra': 'Dados Amostra',
+    'caracteristicaAmostra': 'Característica Amostra',
+    'lote': 'Lote',
+    'fornecedor': 'Fornecedor',
+    'notaFiscal': 'Nota Fiscal',
+    'especificacaoTeste': 'Especificação Teste',
+    
+    # --- NOVOS CAMPOS PARA RASTREAR MUDANÇAS DE STATUS E DATAS ---
+    'status': 'Status Operacional',
+    'responsavel': 'Responsável pela Agenda',
+    'experiencia': 'ID da Experiência LIMS',
+    'dataInicio': 'Início do Ensaio',
+    'dataFim': 'Finalização Estimada',
+    'dataEntrega': 'Previsão de Relatório'
+}
+
+CAMPOS_BUSCA_SOLICITACAO = ['idSolicitacao', 'emailContato'] + [c for c in CAMPOS_MONITORADOS if not c.startswith('data') and c != 'qtdAmostras']
+CAMPOS_BUSCA_EXPERIENCIA = ['idExperiencia', 'idSolicitacao', 'dadosTecnicos.solicitante', 'dadosTecnicos.modelo', 'dadosTecnicos.tipoBateria']
+PESOS_BUSCA = {
+    'idSolicitacao': 3.0, 'idExperiencia': 3.0, 'experiencia': 3.0, 'codigoSap': 3.0, 'lote': 3.0, 'notaFiscal': 2.5,
+    'nomeSolicitante': 2.0, 'dadosTecnicos.solicitante': 2.0, 'modeloAmostras': 2.0, 'dadosTecnicos.modelo': 2.0,
+    'fornecedor': 2.0, 'tituloProjeto': 1.5
+}
+# sem listener, cada worker so enxerga as proprias escritas, entao o indice e refeito de tempos em tempos
+INTERVALO_RECARGA_BUSCA_SEG = int(os.getenv("BUSCA_RECARGA_SEG", 300))
+
+indice_busca = IndiceBusca({'solicitacao': CAMPOS_BUSCA_SOLICITACAO, 'experiencia': CAMPOS_BUSCA_EXPERIENCIA}, PESOS_BUSCA)
+_listeners_busca = []
+_trava_carga_busca = threading.Lock()
+
+def _carregar_indice_busca():
+    with medir_operacao('carregar_indice_busca'):
+        solicitacoes = bd_firestore.collection('solicitacoes').select(CAMPOS_BUSCA_SOLICITACAO + ['dataCriacaoTs']).get()
+        experiencias = bd_firestore.collection('experiencias').select(['idExperiencia', 'idSolicitacao', 'dadosTecnicos']).get()
+        indice_busca.recarregar({
+            'solicitacao': [(doc.id, {**doc.to_dict(), 'idSolicitacao': doc.id}) for doc in solicitacoes],
+            'experiencia': [(doc.id, {**doc.to_dict(), 'idExperiencia': doc.id}) for doc in experiencias]
+        })
+
+def garantir_indice_busca():
+    with _trava_carga_busca:
+        if _listeners_busca and indice_busca.carregado_em:
+            return
+        if indice_busca.carregado_em and time.time() - indice_busca.carregado_em < INTERVALO_RECARGA_BUSCA_SEG:
+            return
+        _carregar_indice_busca()
+
+def _listener_indice(tipo, campo_id):
+    def ao_mudar(snapshots, mudancas, momento_leitura):
+        for mudanca in mudancas:
+            if mudanca.type.name == 'REMOVED':
+                indice_busca.remover(tipo, mudanca.document.id)
+            else:
+                indice_busca.indexar(tipo, mudanca.document.id, {**(mudanca.document.to_dict() or {}), campo_id: mudanca.document.id})
+        indice_busca.carregado_em = time.time()
+    return ao_mudar
+
+def iniciar_listeners_busca():
+    if _listeners_busca or not bd_firestore:
+        return
+    try:
+        _listeners_busca.append(bd_firestore.collection('solicitacoes').on_snapshot(_listener_indice('solicitacao', 'idSolicitacao')))
+        _listeners_busca.append(bd_firestore.collection('experiencias').on_snapshot(_listener_indice('experiencia', 'idExperiencia')))
+    except Exception as erro:
+        print(f"Aviso: listener do índice de busca não iniciado - {erro}")
+
+if os.getenv("BUSCA_LISTENER") == "1":
+    iniciar_listeners_busca()
+
+def listar_alteracoes(dados_atuais, dados_novos):
+    alteracoes_feitas = []
+    for campo, label in CAMPOS_MONITORADOS.items():
+        if campo in dados_novos and str(dados_novos[campo]).strip() != str(dados_atuais.get(campo, '')).strip():
+            valor_antigo = dados_atuais.get(campo, 'Vazio')
+            if not valor_antigo: valor_antigo = 'Vazio'
+            valor_novo = dados_novos[campo]
+            if not valor_novo: valor_novo = 'Vazio'
+            alteracoes_feitas.append(f"{label}: de '{valor_antigo}' para '{valor_novo}'")
+    return alteracoes_feitas
+
+def id_documento_historico(edicao):
+    # ts na frente pra ordem natural, sufixo aleatorio pra duas edicoes no mesmo ms nao se sobrescreverem
+    return f"{edicao['ts']}_{uuid.uuid4().hex[:8]}"
+
+LOTE_MIGRACAO_HISTORICO = 400
+TENTATIVAS_AMOSTRA = 5
+
+def ts_edicao_legada(edicao):
+    #o array antigo usava agora.timestamp() (relogio local do servidor) como id; volta pra data local e converte
+    #do mesmo jeito que as entradas novas (data_para_epoch_ms), senao as duas epocas se embaralham na ordenacao
+    if str(edicao.get('id', '')).isdigit():
+        return data_para_epoch_ms(datetime.fromtimestamp(int(edicao['id']) / 1000))
+    return data_br_para_epoch_ms(edicao.get('data')) or 0
+
+def migrar_historico_legado(doc_ref):
+    #documentos antigos ainda tem o array historicoEdicoes embutido: move pra subcolecao em lotes, fora da transacao
+    #da edicao (o array pode ter centenas de entradas). Ids fixos por posicao: se cair no meio, rodar de novo so regrava
+    doc_snap = doc_ref.get(field_paths=['historicoEdicoes'])
+    legado = (doc_snap.to_dict() or {}).get('historicoEdicoes') if doc_snap.exists else None
+    if legado is None:
+        return 0
+    historico_ref = doc_ref.collection('historico')
+    for inicio in range(0, len(legado), LOTE_MIGRACAO_HISTORICO):
+        lote = bd_firestore.batch()
+        for posicao, edicao_antiga in enumerate(legado[inicio:inicio + LOTE_MIGRACAO_HISTORICO], start=inicio):
+            entrada = dict(edicao_antiga)
+            entrada['ts'] = ts_edicao_legada(entrada)
+            lote.set(desembrulhar(historico_ref.document(f"{entrada['ts']}_legado{posicao:05d}")), entrada)
+        lote.commit()
+    doc_ref.update({'historicoEdicoes': firestore.DELETE_FIELD})
+    return len(legado)
+
+@firestore.transactional
+def _aplicar_atualizacao(transacao, doc_ref, dados_novos, agora, autor_nome):
+    doc_snap = doc_ref.get(transaction=transacao)
+    if not doc_snap.exists:
+        return False
+
+    dados_atuais = doc_snap.to_dict()
+    dados_update = dados_novos.copy()
+    dados_update.pop('historicoEdicoes', None)
+    dados_update['dataMovimentacao'] = agora.isoformat()
+
+    historico_ref = doc_ref.collection('historico')
+
+    alteracoes_feitas = listar_alteracoes(dados_atuais, dados_novos)
+    if alteracoes_feitas:
+        ts = data_para_epoch_ms(agora)
+        nova_edicao = {
+            "id": str(ts),
+            "ts": ts,
+            "autor": autor_nome,
+            "data": agora.strftime("%d/%m/%Y %H:%M"),
+            "alteracoes": alteracoes_feitas
+        }
+        transacao.set(desembrulhar(historico_ref.document(id_documento_historico(nova_edicao))), nova_edicao)
+
+    transacao.update(desembrulhar(doc_ref), dados_update)
+    return True
+
 @bp_solicitacoes.route('/update', methods=['POST', 'OPTIONS'])
 @requer_autenticacao
 def atualizar_solicitacao():
@@ -68,84 +371,64 @@ def atualizar_solicitacao():
 
         doc_ref = bd_firestore.collection('solicitacoes').document(id_solicitacao)
         agora = obter_agora()
+        autor_nome = getattr(request, 'usuario', {}).get('name') or getattr(request, 'usuario', {}).get('email', '').split('@')[0] if hasattr(request, 'usuario') else 'Administração'
 
-        doc_snap = doc_ref.get()
-        if not doc_snap.exists:
+        migrar_historico_legado(doc_ref)
+        # transacao: se duas pessoas editarem juntas o firestore refaz a segunda e nenhuma entrada se perde
+        if not _aplicar_atualizacao(bd_firestore.transaction(), doc_ref, dados_novos, agora, autor_nome):
             return jsonify({"sucesso": False, "erro": "Solicitação não encontrada"}), 404
-        
-        dados_atuais = doc_snap.to_dict()
-        dados_update = dados_novos.copy()
-        dados_update['dataMovimentacao'] = agora.isoformat()
-
-        # Dicionário de monitoramento: Adicionamos os campos do painel de controle!
-        campos_monitorados = {
-            'tituloProjeto': 'Projeto/Motivo',
-            'nomeSolicitante': 'Nome Solicitante',
-            'laboratorio': 'Laboratório',
-            'modeloAmostras': 'Modelo',
-            'qtdAmostras': 'Qtd. Amostras',
-            'codigoSap': 'Código SAP',
-            'objetivoEnsaio': 'Objetivo do Ensaio',
-            'tituloNorma': 'Norma/Procedimento',
-            'descricao': 'Descrição/Escopo',
-            'capacidadeNominal': 'Capacidade Nominal',
-            'cca': 'CCA',
-            'rc': 'RC',
-            'densidade': 'Densidade',
-            'nivelEletrolito': 'Nível do Eletrólito',
-            'separador': 'Separador',
-            'placaPos': 'Placa (+)',
-            'placaNeg': 'Placa (-)',
-            'tipoBateria': 'Tipo de Bateria',
-            'tipoProcedimento': 'Tipo de Procedimento',
-            'tipoEnsaioMecanico': 'Tipo Ensaio Mecânico',
-            'composicaoLiga': 'Composição Liga',
-            'analiseSolicitada': 'Análise Solicitada',
-            'dadosAmostra': 'Dados Amostra',
-            'caracteristicaAmostra': 'Característica Amostra',
-            'lote': 'Lote',
-            'fornecedor': 'Fornecedor',
-            'notaFiscal': 'Nota Fiscal',
-            'especificacaoTeste': 'Especificação Teste',
-            
-            # --- NOVOS CAMPOS PARA RASTREAR MUDANÇAS DE STATUS E DATAS ---
-            'status': 'Status Operacional',
-            'responsavel': 'Responsável pela Agenda',
-            'experiencia': 'ID da Experiência LIMS',
-            'dataInicio': 'Início do Ensaio',
-            'dataFim': 'Finalização Estimada',
-            'dataEntrega': 'Previsão de Relatório'
-        }
-        
-        alteracoes_feitas = []
-        
-        for campo, label in campos_monitorados.items():
-            if campo in dados_novos and str(dados_novos[campo]).strip() != str(dados_atuais.get(campo, '')).strip():
-                valor_antigo = dados_atuais.get(campo, 'Vazio')
-                if not valor_antigo: valor_antigo = 'Vazio'
-                valor_novo = dados_novos[campo]
-                if not valor_novo: valor_novo = 'Vazio'
-                alteracoes_feitas.append(f"{label}: de '{valor_antigo}' para '{valor_novo}'")
-                
-        if alteracoes_feitas:
-            autor_nome = getattr(request, 'usuario', {}).get('name') or getattr(request, 'usuario', {}).get('email', '').split('@')[0] if hasattr(request, 'usuario') else 'Administração'
-            nova_edicao = {
-                "id": str(int(agora.timestamp() * 1000)),
-                "autor": autor_nome,
-                "data": agora.strftime("%d/%m/%Y %H:%M"),
-                "alteracoes": alteracoes_feitas
-            }
-            if 'historicoEdicoes' in dados_atuais:
-                dados_update['historicoEdicoes'] = dados_atuais['historicoEdicoes'] + [nova_edicao]
-            else:
-                dados_update['historicoEdicoes'] = [nova_edicao]
+        indice_busca.indexar('solicitacao', id_solicitacao, dados_novos, parcial=True)
 
-        doc_ref.update(dados_update)
         return jsonify({"sucesso": True, "data": {"id": id_solicitacao, "agora": agora.isoformat()}})
     except Exception as e:
         traceback.print_exc()
         return jsonify({"sucesso": False, "erro": str(e)}), 500
 
+@bp_solicitacoes.route('/historico', methods=['GET', 'OPTIONS'])
+@requer_autenticacao
+def listar_historico_solicitacao():
+    if request.method == 'OPTIONS': return jsonify({}), 200
+    if not bd_firestore: return jsonify({"sucesso": False, "erro": "Firestore não conectado"}), 500
+
+    try:
+        id_solicitacao = request.args.get('id')
+        if not id_solicitacao:
+            return jsonify({"sucesso": False, "erro": "Dados incompletos"}), 400
+        try:
+            limite = max(1, min(int(request.args.get('limite', 20)), LIMITE_MAX_PAGINA))
+        except ValueError:
+            return jsonify({"sucesso": False, "erro": "Parâmetro limite inválido"}), 400
+
+        doc_ref = bd_firestore.collection('solicitacoes').document(id_solicitacao)
+        consulta = doc_ref.collection('historico').order_by('ts', direction='DESCENDING').order_by('__name__', direction='DESCENDING')
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            posicao = decodificar_cursor(cursor)
+            if not posicao or 'ts' not in posicao or 'id' not in posicao:
+                return jsonify({"sucesso": False, "erro": "Cursor inválido"}), 400
+            consulta = consulta.start_after({'ts': posicao['ts'], '__name__': posicao['id']})
+
+        docs = list(consulta.limit(limite + 1).get())
+        tem_mais = len(docs) > limite
+        docs = docs[:limite]
+        entradas = [doc.to_dict() for doc in docs]
+
+        proximo_cursor = None
+        if tem_mais:
+            proximo_cursor = codificar_cursor({'ts': docs[-1].get('ts'), 'id': docs[-1].id})
+        else:
+            # solicitacao que nunca foi editada depois da mudanca ainda guarda o array antigo no documento
+            doc_snap = doc_ref.get(field_paths=['historicoEdicoes'])
+            if doc_snap.exists:
+                legado = (doc_snap.to_dict() or {}).get('historicoEdicoes') or []
+                entradas.extend(sorted(legado, key=ts_edicao_legada, reverse=True))
+
+        return jsonify({"sucesso": True, "data": entradas, "proximoCursor": proximo_cursor})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"sucesso": False, "erro": str(e)}), 500
+
 @bp_solicitacoes.route('/share', methods=['POST', 'OPTIONS'])
 @requer_autenticacao
 def compartilhar_solicitacao():
@@ -186,22 +469,16 @@ def gerar_experiencia():
         if qtd_amostras <= 0:
             return jsonify({"sucesso": False, "erro": "A quantidade de amostras na solicitação é inválida ou zerada."}), 400
 
-        amostras = []
-        for i in range(1, qtd_amostras + 1):
-            amostras.append({
-                "idAmostra": f"{codigo_exp}-{i:02d}", 
-                "status": "pendente", 
-                "circuito": "",
-                "testesManuais": [] 
-            })
-
         agora = obter_agora()
+        exp_ref = bd_firestore.collection('experiencias').document(codigo_exp)
+        amostras_ref = exp_ref.collection('amostras')
+
         nova_exp = {
             "idExperiencia": codigo_exp,
             "idSolicitacao": id_solic,
             "dataGeracao": agora.strftime("%d/%m/%Y %H:%M"),
-            "status": "configurando", 
-            "amostras": amostras, 
+            "status": "gerando",
+            "qtdAmostras": qtd_amostras, 
             "dadosTecnicos": {
                 "solicitante": solic_data.get("nomeSolicitante", ""),
                 "modelo": solic_data.get("modeloAmostras", solic_data.get("nomeProduto", "")),
@@ -215,10 +492,43 @@ def gerar_experiencia():
                 "placaNeg": solic_data.get("placaNeg", "")
             }
         }
+        # cabecalho primeiro como 'gerando': se as amostras nao fecharem, quem abrir a experiencia ve que ela esta incompleta
+        exp_ref.set(nova_exp)
+
+        # amostras viram documentos proprios: mudar o status de uma nao reescreve o lote inteiro
+        falhas = []
+        def ao_falhar_amostra(falha, _escritor):
+            if falha.attempts < TENTATIVAS_AMOSTRA:
+                return True
+            falhas.append(f"{falha.operation.reference.id}: {falha.message}")
+            return False
+
+        with medir_operacao('gravar_amostras'):
+            escritor = bd_firestore.bulk_writer()
+            escritor.on_write_error(ao_falhar_amostra)
+            for i in range(1, qtd_amostras + 1):
+                id_amostra = f"{codigo_exp}-{i:02d}"
+                escritor.set(desembrulhar(amostras_ref.document(id_amostra)), {
+                    "idAmostra": id_amostra,
+                    "ordem": i,
+                    "status": "pendente", 
+                    "circuito": "",
+                    "testesManuais": [] 
+                })
+            escritor.close()
+
+        if falhas:
+            # desfaz o que entrou: nem amostras soltas nem cabecalho 'gerando' ficam pra tras
+            limpeza = bd_firestore.bulk_writer()
+            for i in range(1, qtd_amostras + 1):
+                limpeza.delete(desembrulhar(amostras_ref.document(f"{codigo_exp}-{i:02d}")))
+            limpeza.close()
+            exp_ref.delete()
+            print(f"Erro ao gravar amostras de {codigo_exp}: {len(falhas)} falharam - {falhas[0]}")
+            return jsonify({"sucesso": False, "erro": f"Falha ao gravar {len(falhas)} de {qtd_amostras} amostras; o lote não foi gerado."}), 500
+
+        nova_exp["status"] = "configurando"
 
-        bd_firestore.collection('experiencias').document(codigo_exp).set(nova_exp)
-        
-       
         update_data = {
             "status": "Programado",
             "experiencia": codigo_exp,
@@ -227,10 +537,100 @@ def gerar_experiencia():
             "dataAprovacao": agora.strftime("%d/%m/%Y %H:%M"),
             "dataMovimentacao": agora.isoformat()
         }
-        bd_firestore.collection('solicitacoes').document(id_solic).update(update_data)
+
+        # experiencia sai de 'gerando' e a solicitacao vira Programado juntas, ou nenhuma das duas
+        lote = bd_firestore.batch()
+        lote.set(desembrulhar(exp_ref), nova_exp)
+        lote.update(desembrulhar(bd_firestore.collection('solicitacoes').document(id_solic)), update_data)
+        lote.commit()
+        indice_busca.indexar('experiencia', codigo_exp, nova_exp)
+        indice_busca.indexar('solicitacao', id_solic, update_data, parcial=True)
 
         return jsonify({"sucesso": True, "message": f"Lote {codigo_exp} gerado com {qtd_amostras} amostras!"})
 
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"sucesso": False, "erro": str(e)}), 500
\ No newline at end of file
+        return jsonify({"sucesso": False, "erro": str(e)}), 500
+
+@bp_solicitacoes.route('/experiencias/amostras', methods=['GET', 'OPTIONS'])
+@requer_autenticacao
+def listar_amostras():
+    if request.method == 'OPTIONS': return jsonify({}), 200
+    if not bd_firestore: return jsonify({"sucesso": False, "erro": "Firestore não conectado"}), 500
+
+    try:
+        codigo_exp = request.args.get('id')
+        if not codigo_exp:
+            return jsonify({"sucesso": False, "erro": "Dados incompletos"}), 400
+
+        docs = bd_firestore.collection('experiencias').document(codigo_exp).collection('amostras').order_by('ordem').get()
+        return jsonify({"sucesso": True, "data": [doc.to_dict() for doc in docs]})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"sucesso": False, "erro": str(e)}), 500
+
+@bp_solicitacoes.route('/experiencias/amostras/update', methods=['POST', 'OPTIONS'])
+@requer_autenticacao
+def atualizar_amostra():
+    if request.method == 'OPTIONS': return jsonify({}), 200
+    if not bd_firestore: return jsonify({"sucesso": False, "erro": "Firestore não conectado"}), 500
+
+    try:
+        dados = request.json
+        codigo_exp = dados.get('idExperiencia')
+        id_amostra = dados.get('idAmostra')
+        dados_novos = dados.get('dados')
+
+        if not codigo_exp or not id_amostra or not dados_novos:
+            return jsonify({"sucesso": False, "erro": "Dados incompletos"}), 400
+
+        dados_novos = {k: v for k, v in dados_novos.items() if k not in ('idAmostra', 'ordem')}
+        dados_novos['dataMovimentacao'] = obter_agora().isoformat()
+        bd_firestore.collection('experiencias').document(codigo_exp).collection('amostras').document(id_amostra).update(dados_novos)
+        return jsonify({"sucesso": True})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"sucesso": False, "erro": str(e)}), 500
+
+def _anexar_solicitacoes(resultados):
+    #com completo=1 cada solicitacao achada vem com o documento inteiro em 'dados', pra tela de gestao mostrar
+    #quem ainda nao foi carregado nas paginas sem uma leitura por item
+    ids = [r['id'] for r in resultados if r['tipo'] == 'solicitacao']
+    if not ids:
+        return
+    documentos = replica.obter_solicitacoes()
+    if documentos is not None:
+        procurados = set(ids)
+        por_id = {id_doc: dados for id_doc, dados in documentos if id_doc in procurados}
+    else:
+        colecao = bd_firestore.collection('solicitacoes')
+        refs = [desembrulhar(colecao.document(id_doc)) for id_doc in ids]
+        por_id = {snap.id: snap.to_dict() for snap in bd_firestore.get_all(refs) if snap.exists}
+    for resultado in resultados:
+        dados = por_id.get(resultado['id']) if resultado['tipo'] == 'solicitacao' else None
+        if dados is not None:
+            resultado['dados'] = {**dados, 'idSolicitacao': dados.get('idSolicitacao', resultado['id'])}
+
+@bp_solicitacoes.route('/buscar', methods=['GET', 'OPTIONS'])
+@requer_autenticacao
+def buscar_solicitacoes():
+    if request.method == 'OPTIONS': return jsonify({}), 200
+    if not bd_firestore: return jsonify({"sucesso": False, "erro": "Firestore não conectado"}), 500
+
+    try:
+        consulta = request.args.get('q', '').strip()
+        if not consulta:
+            return jsonify({"sucesso": True, "data": []})
+        try:
+            limite = max(1, min(int(request.args.get('limite', 20)), LIMITE_MAX_PAGINA))
+        except ValueError:
+            return jsonify({"sucesso": False, "erro": "Parâmetro limite inválido"}), 400
+
+        garantir_indice_busca()
+        resultados = indice_busca.buscar(consulta, limite=limite, tipo=request.args.get('tipo'))
+        if request.args.get('completo') == '1':
+            _anexar_solicitacoes(resultados)
+        return jsonify({"sucesso": True, "data": resultados})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"sucesso": False, "erro": str(e)}), 500
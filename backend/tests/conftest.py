@@ -0,0 +1,373 @@
+#firestore em memoria pros testes: so o pedaco da API que o backend usa (colecoes, consultas simples,
+#batch, transacao, bulk writer); os modulos guardam bd_firestore no import, entao a fixture troca em cada um
+
+import os
+import sys
+import copy
+import time
+import uuid
+import importlib
+import pytest
+from google.cloud.firestore_v1 import DELETE_FIELD
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# a varredura do agendador e uma thread que acordaria no meio dos testes
+os.environ.setdefault('AGENDADOR_VARREDURA_SEG', '0')
+
+from metricas import FirestoreInstrumentado
+
+def _valor_ordem(dados, doc_id, campo):
+    return doc_id if campo == '__name__' else dados.get(campo)
+
+def _aplicar_set(atual, dados, merge):
+    novo = copy.deepcopy(atual) if (merge and atual is not None) else {}
+    for campo, valor in dados.items():
+        if valor is DELETE_FIELD:
+            novo.pop(campo, None)
+        elif merge and isinstance(valor, dict) and isinstance(novo.get(campo), dict):
+            novo[campo] = _aplicar_set(novo[campo], valor, True)
+        else:
+            novo[campo] = copy.deepcopy(valor)
+    return novo
+
+class FakeSnapshot:
+    def __init__(self, referencia, dados):
+        self.reference = referencia
+        self.id = referencia.id
+        self._dados = dados
+        self.exists = dados is not None
+        self.update_time = None
+
+    def to_dict(self):
+        return copy.deepcopy(self._dados) if self._dados is not None else None
+
+    def get(self, campo):
+        return copy.deepcopy((self._dados or {}).get(campo))
+
+class FakeWatch:
+    #o que o on_snapshot devolve; _closed=True sem unsubscribe e o stream que caiu sozinho
+    def __init__(self, alvo, callback):
+        self.alvo = alvo
+        self.callback = callback
+        self._closed = False
+
+    def unsubscribe(self):
+        self._closed = True
+
+class FakeMudanca:
+    def __init__(self, tipo, snapshot):
+        self.type = type('TipoMudanca', (), {'name': tipo})()
+        self.document = snapshot
+
+def _ouvir(banco, alvo, callback):
+    watch = FakeWatch(alvo, callback)
+    banco.watches.append(watch)
+    snapshots = alvo.get() if isinstance(alvo, FakeConsulta) else [alvo.get()]
+    callback(snapshots, [FakeMudanca('ADDED', snap) for snap in snapshots], None)
+    return watch
+
+class FakeDocumento:
+    def __init__(self, banco, caminho, doc_id):
+        self._banco = banco
+        self._caminho = caminho
+        self.id = str(doc_id)
+
+    @property
+    def path(self):
+        return f"{self._caminho}/{self.id}"
+
+    def collection(self, nome):
+        return FakeColecao(self._banco, f"{self.path}/{nome}")
+
+    def on_snapshot(self, callback):
+        return _ouvir(self._banco, self, callback)
+
+    def get(self, transaction=None, field_paths=None):
+        dados = self._banco.docs(self._caminho).get(self.id)
+        if dados is not None and field_paths is not None:
+            dados = {k: v for k, v in dados.items() if k in field_paths}
+        return FakeSnapshot(self, copy.deepcopy(dados) if dados is not None else None)
+
+    def set(self, dados, merge=False):
+        self._banco.gravar(self, 'set', dados, merge)
+
+    def create(self, dados):
+        if self.id in self._banco.docs(self._caminho):
+            raise ValueError(f"{self.path} já existe")
+        self._banco.gravar(self, 'set', dados, False)
+
+    def update(self, dados):
+        if self.id not in self._banco.docs(self._caminho):
+            raise ValueError(f"{self.path} não existe")
+        self._banco.gravar(self, 'set', dados, True)
+
+    def delete(self):
+        self._banco.gravar(self, 'delete', None, False)
+
+class FakeConsulta:
+    def __init__(self, banco, caminho, filtros=(), ordens=(), limite=None, depois_de=None, campos=None):
+        self._banco = banco
+        self._caminho = caminho
+        self._filtros = list(filtros)
+        self._ordens = list(ordens)
+        self._limite = limite
+        self._depois_de = depois_de
+        self._campos = campos
+
+    def _copiar(self, **mudancas):
+        atributos = dict(filtros=self._filtros, ordens=self._ordens, limite=self._limite, depois_de=self._depois_de, campos=self._campos)
+        atributos.update(mudancas)
+        return FakeConsulta(self._banco, self._caminho, **atributos)
+
+    def where(self, filter):
+        return self._copiar(filtros=self._filtros + [(filter.field_path, filter.op_string, filter.value)])
+
+    def order_by(self, campo, direction='ASCENDING'):
+        return self._copiar(ordens=self._ordens + [(campo, direction == 'DESCENDING')])
+
+    def limit(self, n):
+        return self._copiar(limite=n)
+
+    def select(self, campos):
+        return self._copiar(campos=list(campos))
+
+    def start_after(self, posicao):
+        return self._copiar(depois_de=posicao)
+
+    @staticmethod
+    def _passa(dados, campo, operador, valor):
+        if campo not in dados:
+            return False
+        atual = dados[campo]
+        try:
+            if operador == '==': return atual == valor
+            if operador == 'in': return atual in valor
+            if operador == 'array_contains': return isinstance(atual, list) and valor in atual
+            if operador == '>=': return atual >= valor
+            if operador == '>': return atual > valor
+            if operador == '<=': return atual <= valor
+            if operador == '<': return atual < valor
+        except TypeError:
+            return False
+        raise NotImplementedError(operador)
+
+    def stream(self):
+        itens = [(doc_id, dados) for doc_id, dados in self._banco.docs(self._caminho).items()
+                 if all(self._passa(dados, *f) for f in self._filtros)]
+        # ordem do firestore: campos pedidos e depois o id; documento sem o campo da ordenacao nao aparece
+        for campo, _ in self._ordens:
+            if campo != '__name__':
+                itens = [(i, d) for i, d in itens if campo in d]
+        itens.sort(key=lambda item: item[0])
+        for campo, decrescente in reversed(self._ordens):
+            itens.sort(key=lambda item: _valor_ordem(item[1], item[0], campo), reverse=decrescente)
+        if self._depois_de is not None:
+            posicao = self._depois_de
+            chave = lambda item: tuple(_valor_ordem(item[1], item[0], c) for c, _ in self._ordens)
+            alvo = tuple(posicao.get(c) if c != '__name__' else posicao.get('__name__') for c, _ in self._ordens)
+            indice = next((n for n, item in enumerate(itens) if chave(item) == alvo), None)
+            itens = itens[indice + 1:] if indice is not None else []
+        if self._limite is not None:
+            itens = itens[:self._limite]
+        for doc_id, dados in itens:
+            if self._campos is not None:
+                dados = {k: v for k, v in dados.items() if k in self._campos}
+            yield FakeSnapshot(FakeDocumento(self._banco, self._caminho, doc_id), copy.deepcopy(dados))
+
+    def get(self):
+        return list(self.stream())
+
+class FakeColecao(FakeConsulta):
+    def __init__(self, banco, caminho):
+        super().__init__(banco, caminho)
+        self.id = caminho.rsplit('/', 1)[-1]
+
+    def document(self, doc_id=None):
+        return FakeDocumento(self._banco, self._caminho, doc_id if doc_id is not None else uuid.uuid4().hex[:20])
+
+    def on_snapshot(self, callback):
+        return _ouvir(self._banco, self, callback)
+
+    def add(self, dados):
+        ref = self.document()
+        ref.set(dados)
+        return None, ref
+
+class FakeLote:
+    def __init__(self, banco):
+        self._banco = banco
+        self._operacoes = []
+
+    def set(self, ref, dados, merge=False):
+        self._operacoes.append((ref, 'set', dados, merge))
+
+    def update(self, ref, dados):
+        self._operacoes.append((ref, 'update', dados, True))
+
+    def create(self, ref, dados):
+        self._operacoes.append((ref, 'create', dados, False))
+
+    def delete(self, ref):
+        self._operacoes.append((ref, 'delete', None, False))
+
+    def commit(self):
+        self._banco.antes_do_commit(self._operacoes)
+        for ref, tipo, dados, merge in self._operacoes:
+            if tipo == 'update':
+                ref.update(dados)
+            elif tipo == 'create':
+                ref.create(dados)
+            else:
+                self._banco.gravar(ref, tipo, dados, merge)
+        self._operacoes = []
+
+class FakeTransacao(FakeLote):
+    _max_attempts = 5
+    _read_only = False
+    _id = b'transacao'
+
+    def _clean_up(self):
+        self._operacoes = []
+
+    def _begin(self, retry_id=None):
+        pass
+
+    def _commit(self):
+        self.commit()
+
+    def _rollback(self):
+        self._operacoes = []
+
+class FakeFalha:
+    def __init__(self, operacao, tentativas, mensagem):
+        self.operation = operacao
+        self.attempts = tentativas
+        self.message = mensagem
+
+class FakeOperacaoBulk:
+    def __init__(self, ref):
+        self.reference = ref
+
+class FakeBulkWriter:
+    def __init__(self, banco):
+        self._banco = banco
+        self._ao_falhar = lambda falha, escritor: False
+        self._operacoes = []
+
+    def on_write_error(self, funcao):
+        self._ao_falhar = funcao
+
+    def set(self, ref, dados):
+        self._operacoes.append((ref, 'set', dados))
+
+    def delete(self, ref):
+        self._operacoes.append((ref, 'delete', None))
+
+    def close(self):
+        for ref, tipo, dados in self._operacoes:
+            tentativas = 0
+            while True:
+                tentativas += 1
+                try:
+                    self._banco.antes_do_commit([(ref, tipo, dados, False)])
+                    self._banco.gravar(ref, tipo, dados, False)
+                    break
+                except Exception as erro:
+                    if not self._ao_falhar(FakeFalha(FakeOperacaoBulk(ref), tentativas, str(erro)), self):
+                        break
+        self._operacoes = []
+
+class FakeFirestore:
+    def __init__(self):
+        self._colecoes = {}
+        self.watches = []
+        # teste pode trocar por uma funcao que levanta excecao pra simular o firestore fora do ar
+        self.antes_do_commit = lambda operacoes: None
+
+    def docs(self, caminho):
+        return self._colecoes.setdefault(caminho, {})
+
+    def gravar(self, ref, tipo, dados, merge):
+        docs = self.docs(ref._caminho)
+        if tipo == 'delete':
+            docs.pop(ref.id, None)
+        else:
+            docs[ref.id] = _aplicar_set(docs.get(ref.id), dados, merge)
+
+    def collection(self, nome):
+        return FakeColecao(self, nome)
+
+    def batch(self):
+        return FakeLote(self)
+
+    def transaction(self):
+        return FakeTransacao(self)
+
+    def bulk_writer(self):
+        return FakeBulkWriter(self)
+
+    def get_all(self, refs, field_paths=None, transaction=None):
+        for ref in refs:
+            yield ref.get()
+
+    def conteudo(self, caminho):
+        return copy.deepcopy(self.docs(caminho))
+
+@pytest.fixture
+def banco_falso():
+    return FakeFirestore()
+
+MODULOS_COM_FIRESTORE = ('configuracao', 'arquivo_logs', 'confiabilidade', 'oee_service', 'outbox', 'banco_dados', 'replica',
+                         'rotas.autenticacao', 'rotas.laboratorio', 'rotas.solicitacoes')
+
+@pytest.fixture
+def firestore_falso(banco_falso, monkeypatch):
+    #mesmo embrulho de metricas que o app usa, pra desembrulhar() e os contadores passarem pelo caminho real
+    instrumentado = FirestoreInstrumentado(banco_falso)
+    for nome in MODULOS_COM_FIRESTORE:
+        monkeypatch.setattr(importlib.import_module(nome), 'bd_firestore', instrumentado, raising=False)
+    yield banco_falso
+    # rollups que ficaram na thread de confiabilidade gravam neste banco, nao no do proximo teste
+    importlib.import_module('confiabilidade').descarregar_pendentes()
+
+def verificar_token_falso(token, check_revoked=False):
+    #'token-<uid>' vale por uma hora; qualquer outra coisa e token invalido
+    if not token.startswith('token-'):
+        raise ValueError('token inválido')
+    uid = token[len('token-'):]
+    return {'uid': uid, 'email': f"{uid}@moura.com", 'exp': int(time.time()) + 3600}
+
+@pytest.fixture
+def cliente(firestore_falso, monkeypatch):
+    #test client do app inteiro com o firestore falso, o usuario 'admin' logado e o estado em memoria dos modulos zerado
+    from app import app
+    from rotas import autenticacao, laboratorio, solicitacoes
+    from agendador_conclusao import AgendadorConclusao
+    from disponibilidade import IndiceDisponibilidade
+    from indice_busca import IndiceBusca
+    import agendador_conclusao
+    import agregados_lab
+    import disponibilidade
+
+    verificacoes = []
+    def verificar(token, check_revoked=False):
+        verificacoes.append(token)
+        return verificar_token_falso(token, check_revoked)
+    monkeypatch.setattr(autenticacao.firebase_auth, 'verify_id_token', verificar)
+    autenticacao.invalidar_cache_tokens()
+    autenticacao.invalidar_cache_permissoes()
+
+    novo_agendador = AgendadorConclusao()
+    monkeypatch.setattr(agendador_conclusao, 'agendador', novo_agendador)
+    monkeypatch.setattr(laboratorio, 'agendador', novo_agendador)
+    monkeypatch.setattr(disponibilidade, 'indice', IndiceDisponibilidade())
+    monkeypatch.setattr(agregados_lab, '_calculado_em', None)
+    monkeypatch.setattr(solicitacoes, '_datas_migradas', False)
+    monkeypatch.setattr(solicitacoes, 'indice_busca', IndiceBusca(solicitacoes.indice_busca.campos_por_tipo, solicitacoes.indice_busca.pesos))
+
+    firestore_falso.docs('users')['admin'] = {'role': 'admin', 'permissions': []}
+    app.testing = True
+    cliente = app.test_client()
+    cliente.environ_base['HTTP_AUTHORIZATION'] = 'Bearer token-admin'
+    cliente.verificacoes = verificacoes
+    return cliente
@@ -0,0 +1,77 @@
+from agendador_conclusao import AgendadorConclusao
+from utilitarios import data_br_para_epoch_ms
+
+def _circuito(cid, inicio, previsao, status='running'):
+    return {'id': cid, 'status': status, 'startTime': inicio, 'previsao': previsao}
+
+def _db():
+    return {'baths': [
+        {'id': 'B1', 'circuits': [_circuito('C1', '01/03/2026 08:00', '01/03/2026 10:00'),
+                                  _circuito('C2', '01/03/2026 08:00', '02/03/2026 08:00'),
+                                  _circuito('C3', '01/03/2026 08:00', '01/03/2026 09:00', status='free')]},
+        {'id': 'B2', 'circuits': [_circuito('C4', '01/03/2026 09:00', '01/03/2026 12:00'),
+                                  _circuito('C5', '-', 'A calcular')]},
+    ]}
+
+def _ms(texto):
+    return data_br_para_epoch_ms(texto)
+
+def test_sincronizar_agenda_so_quem_esta_rodando_com_datas():
+    agendador = AgendadorConclusao()
+    agendador.sincronizar(_db())
+    assert agendador.sincronizado
+    assert agendador.tempos('B1', 'C1') == (_ms('01/03/2026 08:00'), _ms('01/03/2026 10:00'))
+    assert agendador.tempos('B1', 'C3') is None
+    assert agendador.tempos('B2', 'C5') is None
+
+def test_retirar_vencidos_consome_e_vencidos_nao():
+    agendador = AgendadorConclusao()
+    agendador.sincronizar(_db())
+    agora = _ms('01/03/2026 12:00')
+
+    assert sorted(agendador.vencidos(agora)) == [('B1', 'C1'), ('B2', 'C4')]
+    assert agendador.tem_vencidos(agora)
+    assert sorted(agendador.vencidos(agora)) == [('B1', 'C1'), ('B2', 'C4')]
+
+    assert agendador.retirar_vencidos(agora) == [('B1', 'C1'), ('B2', 'C4')]
+    assert agendador.retirar_vencidos(agora) == []
+    assert agendador.vencidos(agora) == []
+    assert not agendador.tem_vencidos(agora)
+
+def test_proximos_a_terminar_ignora_entrada_velha_do_heap():
+    agendador = AgendadorConclusao()
+    agendador.sincronizar(_db())
+    # reagendar C1 pra depois de C2 deixa a entrada antiga no heap
+    banho = {'id': 'B1', 'circuits': [_circuito('C1', '01/03/2026 08:00', '03/03/2026 08:00'),
+                                      _circuito('C2', '01/03/2026 08:00', '02/03/2026 08:00')]}
+    agendador.atualizar_banho('B1', banho)
+
+    proximos = agendador.proximos_a_terminar(3)
+    assert [p['circuitId'] for p in proximos] == ['C4', 'C2', 'C1']
+    assert proximos[0] == {'circuitId': 'C4', 'bathId': 'B2', 'fimMs': _ms('01/03/2026 12:00')}
+    assert agendador.retirar_vencidos(_ms('01/03/2026 11:00')) == []
+
+def test_atualizar_banho_removido_ou_renomeado():
+    agendador = AgendadorConclusao()
+    agendador.sincronizar(_db())
+    agendador.atualizar_banho('B2', None)
+    assert agendador.tempos('B2', 'C4') is None
+
+    renomeado = {'id': 'B9', 'circuits': [_circuito('C1', '01/03/2026 08:00', '01/03/2026 10:00')]}
+    agendador.atualizar_banho('B9', renomeado, old_id='B1')
+    assert agendador.tempos('B1', 'C2') is None
+    assert agendador.proximos_a_terminar() == [{'circuitId': 'C1', 'bathId': 'B9', 'fimMs': _ms('01/03/2026 10:00')}]
+
+def test_mesmo_id_de_circuito_em_banhos_diferentes():
+    agendador = AgendadorConclusao()
+    agendador.sincronizar({'baths': [
+        {'id': 'B1', 'circuits': [_circuito('C1', '01/03/2026 08:00', '01/03/2026 10:00')]},
+        {'id': 'B2', 'circuits': [_circuito('C1', '01/03/2026 08:00', '05/03/2026 08:00')]},
+    ]})
+    assert agendador.tempos('B2', 'C1') == (_ms('01/03/2026 08:00'), _ms('05/03/2026 08:00'))
+    assert agendador.retirar_vencidos(_ms('02/03/2026 08:00')) == [('B1', 'C1')]
+    assert [p['bathId'] for p in agendador.proximos_a_terminar()] == ['B2']
+
+    # mexer num banho nao derruba o circuito de mesmo id do outro
+    agendador.atualizar_banho('B1', None)
+    assert agendador.tempos('B2', 'C1') is not None
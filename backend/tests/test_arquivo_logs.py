@@ -0,0 +1,100 @@
+import time
+from datetime import datetime
+import pytest
+import arquivo_logs
+from arquivo_logs import codificar_eventos, decodificar_eventos, mes_do_log, limite_arquivamento_ms, compactar_colecao, ler_arquivados, juntar_com_quentes, remover_arquivado
+from rotas import laboratorio
+from utilitarios import data_para_epoch_ms
+
+def _ms(*data):
+    return data_para_epoch_ms(datetime(*data))
+
+def _gravar_logs(banco, logs):
+    for log in logs:
+        banco.docs('circuit_logs')[str(log['id'])] = log
+
+def test_codificar_e_decodificar_eventos():
+    eventos = [{'id': 1, 'action': 'Início de Teste', 'circuitId': 'C-01'}, {'id': 2, 'detalhe': None}]
+    assert decodificar_eventos(codificar_eventos(eventos)) == eventos
+    # mtime fixo: o mesmo conteudo gera os mesmos bytes
+    assert codificar_eventos(eventos) == codificar_eventos(eventos)
+    assert decodificar_eventos(None) == []
+
+def test_mes_do_log_usa_o_horario_local_gravado():
+    assert mes_do_log(_ms(2026, 1, 31, 23, 30)) == '2026-01'
+    assert mes_do_log(_ms(2026, 2, 1, 0, 0)) == '2026-02'
+
+def test_compactar_arquiva_por_mes_e_circuito(firestore_falso, monkeypatch):
+    monkeypatch.setattr(arquivo_logs, 'LOTE_LEITURA', 2)
+    logs = [
+        {'id': _ms(2026, 1, 5, 8), 'action': 'Início de Teste', 'circuitId': '1'},
+        {'id': _ms(2026, 1, 9, 8), 'action': 'Teste Concluído', 'circuitId': '1'},
+        {'id': _ms(2026, 1, 7, 8), 'action': 'Início de Teste', 'circuitId': '2'},
+        {'id': _ms(2026, 2, 2, 8), 'action': 'Teste Concluído', 'circuitId': '2'},
+        {'id': _ms(2026, 3, 2, 8), 'action': 'Início de Teste', 'circuitId': '1'},
+    ]
+    _gravar_logs(firestore_falso, logs)
+
+    assert compactar_colecao('circuit_logs', _ms(2026, 3, 1)) == 4
+    assert list(firestore_falso.conteudo('circuit_logs')) == [str(logs[4]['id'])]
+    arquivos = firestore_falso.conteudo('logs_arquivo')
+    assert set(arquivos) == {'circuit_logs_2026-01_1', 'circuit_logs_2026-01_2', 'circuit_logs_2026-02_2'}
+    assert arquivos['circuit_logs_2026-01_1']['quantidade'] == 2
+
+    assert sorted(e['id'] for e in ler_arquivados('circuit_logs')) == sorted(l['id'] for l in logs[:4])
+    assert [e['id'] for e in ler_arquivados('circuit_logs', '2')] == [logs[2]['id'], logs[3]['id']]
+    assert [e['id'] for e in ler_arquivados('circuit_logs', None, _ms(2026, 1, 8), _ms(2026, 1, 31))] == [logs[1]['id']]
+
+def test_compactar_de_novo_mescla_com_o_arquivo_existente(firestore_falso):
+    primeiro = {'id': _ms(2026, 1, 5, 8), 'action': 'Início de Teste', 'circuitId': '1'}
+    _gravar_logs(firestore_falso, [primeiro])
+    compactar_colecao('circuit_logs', _ms(2026, 2, 1))
+    # compactacao interrompida deixa o evento nos dois lugares
+    segundo = {'id': _ms(2026, 1, 6, 8), 'action': 'Teste Concluído', 'circuitId': '1'}
+    _gravar_logs(firestore_falso, [primeiro, segundo])
+    compactar_colecao('circuit_logs', _ms(2026, 2, 1))
+
+    arquivo = firestore_falso.conteudo('logs_arquivo')['circuit_logs_2026-01_1']
+    assert arquivo['quantidade'] == 2
+    assert (arquivo['inicioMs'], arquivo['fimMs']) == (primeiro['id'], segundo['id'])
+
+def test_juntar_com_quentes_prefere_a_versao_quente():
+    arquivados = [{'id': 1, 'v': 'arquivo'}, {'id': 2, 'v': 'arquivo'}]
+    quentes = [{'id': '2', 'v': 'quente'}, {'id': 3, 'v': 'quente'}, {'v': 'sem id'}]
+    juntos = {int(e['id']): e['v'] for e in juntar_com_quentes(quentes, arquivados)}
+    assert juntos == {1: 'arquivo', 2: 'quente', 3: 'quente'}
+
+def test_remover_arquivado(firestore_falso):
+    logs = [{'id': _ms(2026, 1, 5, 8), 'circuitId': '1'}, {'id': _ms(2026, 1, 6, 8), 'circuitId': '1'}]
+    _gravar_logs(firestore_falso, logs)
+    compactar_colecao('circuit_logs', _ms(2026, 2, 1))
+
+    assert remover_arquivado('circuit_logs', logs[0]['id']) == logs[0]
+    assert [e['id'] for e in ler_arquivados('circuit_logs')] == [logs[1]['id']]
+    assert remover_arquivado('circuit_logs', logs[0]['id']) is None
+    assert remover_arquivado('circuit_logs', str(logs[1]['id'])) == logs[1]
+    assert firestore_falso.conteudo('logs_arquivo') == {}
+
+@pytest.fixture
+def fuso_sao_paulo(monkeypatch):
+    monkeypatch.setenv('TZ', 'America/Sao_Paulo')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_virada_do_mes_segue_os_ids_gravados_pela_rota_fora_de_utc(cliente, firestore_falso, monkeypatch, fuso_sao_paulo):
+    firestore_falso.docs('lab_data')['main'] = {'protocols': [], 'logs': [], 'baths': []}
+    # 23:30 do dia 31: com o fuso do servidor somado no id o evento iria pro arquivo de fevereiro
+    for momento in (datetime(2026, 1, 31, 23, 30), datetime(2026, 2, 1, 0, 0)):
+        monkeypatch.setattr(laboratorio, 'obter_agora', lambda momento=momento: momento)
+        assert cliente.post('/api/circuits/history/add', json={'circuitId': '1', 'action': 'Comentário'}).get_json()['sucesso']
+    janeiro, fevereiro = sorted(firestore_falso.conteudo('circuit_logs').values(), key=lambda l: l['id'])
+    assert (mes_do_log(janeiro['id']), mes_do_log(fevereiro['id'])) == ('2026-01', '2026-02')
+
+    # corte em 1/2: janeiro inteiro sai, o evento da meia-noite de fevereiro fica
+    limite = limite_arquivamento_ms(dias=90, agora=datetime(2026, 5, 2, 12))
+    assert limite == fevereiro['id']
+    assert compactar_colecao('circuit_logs', limite) == 1
+    assert set(firestore_falso.conteudo('logs_arquivo')) == {'circuit_logs_2026-01_1'}
+    assert list(firestore_falso.conteudo('circuit_logs')) == [str(fevereiro['id'])]
@@ -0,0 +1,109 @@
+import copy
+import time
+import pytest
+import replica
+from rotas import autenticacao
+
+def preparar_lab(firestore_falso):
+    firestore_falso.docs('lab_data')['main'] = {'baths': [], 'protocols': [], 'logs': []}
+
+def test_token_repetido_e_verificado_uma_vez(cliente, firestore_falso):
+    preparar_lab(firestore_falso)
+    assert cliente.get('/api/data').status_code == 200
+    assert cliente.get('/api/data').status_code == 200
+    assert cliente.verificacoes == ['token-admin']
+
+def test_token_invalido_nao_entra_no_cache(cliente, firestore_falso):
+    preparar_lab(firestore_falso)
+    cabecalho = {'Authorization': 'Bearer lixo'}
+    assert cliente.get('/api/data', headers=cabecalho).status_code == 403
+    assert cliente.get('/api/data', headers=cabecalho).status_code == 403
+    assert cliente.verificacoes == ['lixo', 'lixo']
+
+def test_invalidar_por_uid_forca_nova_verificacao(cliente, firestore_falso):
+    preparar_lab(firestore_falso)
+    cliente.get('/api/data')
+    cliente.get('/api/data', headers={'Authorization': 'Bearer token-outro'})
+    autenticacao.invalidar_cache_tokens('admin')
+    cliente.get('/api/data')
+    cliente.get('/api/data', headers={'Authorization': 'Bearer token-outro'})
+    assert cliente.verificacoes == ['token-admin', 'token-outro', 'token-admin']
+
+def test_token_perto_de_expirar_nao_e_reaproveitado(cliente, firestore_falso, monkeypatch):
+    preparar_lab(firestore_falso)
+    monkeypatch.setattr(autenticacao.firebase_auth, 'verify_id_token',
+                        lambda token, check_revoked=False: {'uid': 'admin', 'exp': int(time.time()) + 10})
+    assert cliente.get('/api/data').status_code == 200
+    assert autenticacao.CACHE_TOKENS == {}
+
+def test_sem_cabecalho_e_401(cliente):
+    assert cliente.get('/api/data', headers={'Authorization': ''}).status_code == 401
+
+def rebuild(cliente, uid):
+    return cliente.post('/api/circuits/reliability/rebuild', json={}, headers={'Authorization': f"Bearer token-{uid}"})
+
+@pytest.fixture
+def listener_limpo(monkeypatch):
+    monkeypatch.setattr(autenticacao, '_listener_permissoes', None)
+    monkeypatch.setattr(autenticacao, '_listener_desejado', False)
+    monkeypatch.setattr(autenticacao, '_ultimo_inicio_listener', 0)
+    monkeypatch.setattr(replica, '_desejada', False)
+
+def test_permissao_fica_em_cache_ate_o_ttl(cliente, firestore_falso, listener_limpo, monkeypatch):
+    firestore_falso.docs('users')['tec'] = {'role': 'tecnico', 'permissions': []}
+    assert rebuild(cliente, 'tec').status_code == 403
+
+    firestore_falso.docs('users')['tec'] = {'role': 'tecnico', 'permissions': ['configuracoes']}
+    assert rebuild(cliente, 'tec').status_code == 403
+
+    monkeypatch.setattr(autenticacao, 'TTL_PERMISSOES_SEG', 0)
+    autenticacao.invalidar_cache_permissoes('tec')
+    assert rebuild(cliente, 'tec').status_code == 200
+    firestore_falso.docs('users')['tec'] = {'role': 'tecnico', 'permissions': []}
+    assert rebuild(cliente, 'tec').status_code == 403
+
+def test_listener_de_permissoes_aplica_mudanca_sem_esperar_ttl(cliente, firestore_falso, listener_limpo):
+    firestore_falso.docs('users')['tec'] = {'role': 'tecnico', 'permissions': []}
+    autenticacao.iniciar_listener_permissoes()
+    assert len(firestore_falso.watches) == 1
+    assert rebuild(cliente, 'tec').status_code == 403
+
+    watch = firestore_falso.watches[0]
+    firestore_falso.docs('users')['tec'] = {'role': 'tecnico', 'permissions': ['configuracoes']}
+    watch.callback(watch.alvo.get(), [], None)
+    assert rebuild(cliente, 'tec').status_code == 200
+    assert len(firestore_falso.watches) == 1
+
+def test_listener_caido_so_e_recriado_por_uma_thread(cliente, firestore_falso, listener_limpo, monkeypatch):
+    monkeypatch.setattr(autenticacao, 'INTERVALO_REINICIO_LISTENER_SEG', 0)
+    autenticacao.iniciar_listener_permissoes()
+    firestore_falso.watches[0]._closed = True
+
+    # outra thread no meio da verificacao: esta segue sem mexer no listener
+    assert autenticacao._trava_listener_permissoes.acquire(blocking=False)
+    try:
+        autenticacao._verificar_listener_permissoes()
+    finally:
+        autenticacao._trava_listener_permissoes.release()
+    assert len(firestore_falso.watches) == 1
+
+    autenticacao._verificar_listener_permissoes()
+    assert len(firestore_falso.watches) == 2
+    assert not firestore_falso.watches[1]._closed
+
+def test_com_replica_ligada_usa_o_listener_de_users_dela(cliente, firestore_falso, listener_limpo, monkeypatch):
+    firestore_falso.docs('users')['tec'] = {'role': 'tecnico', 'permissions': []}
+    autenticacao.iniciar_listener_permissoes()
+    proprio = firestore_falso.watches[0]
+
+    monkeypatch.setattr(replica, '_listeners', {})
+    monkeypatch.setattr(replica, '_ultimo_inicio', {})
+    monkeypatch.setattr(replica, '_estado', copy.deepcopy(replica._estado))
+    replica.iniciar()
+    try:
+        assert rebuild(cliente, 'tec').status_code == 403
+        assert proprio._closed
+        colecoes = [w.alvo.id for w in firestore_falso.watches if not w._closed]
+        assert colecoes.count('users') == 1
+    finally:
+        replica.parar()
@@ -0,0 +1,40 @@
+import banco_dados
+
+def test_escritas_na_janela_viram_um_set_so(cliente, firestore_falso, monkeypatch):
+    firestore_falso.docs('lab_data')['main'] = {'protocols': [], 'logs': [], 'baths': [{'id': 'B1', 'temp': 25, 'circuits': []}]}
+    monkeypatch.setattr(banco_dados, 'JANELA_COALESCER_MS', 60000)
+    gravacoes = []
+    gravar = banco_dados._gravar_lab
+    monkeypatch.setattr(banco_dados, '_gravar_lab', lambda dados: (gravacoes.append(dados['baths'][0]['temp']), gravar(dados)))
+
+    try:
+        cliente.post('/api/baths/temp', json={'bathId': 'B1', 'temp': 40})
+        cliente.post('/api/baths/temp', json={'bathId': 'B1', 'temp': 60})
+        assert gravacoes == []
+        assert firestore_falso.conteudo('lab_data')['main']['baths'][0]['temp'] == 25
+        # o proprio worker ja le o estado pendente
+        assert cliente.get('/api/data').get_json()['baths'][0]['temp'] == 60
+    finally:
+        banco_dados.descarregar_escritas()
+
+    assert gravacoes == [60]
+    assert firestore_falso.conteudo('lab_data')['main']['baths'][0]['temp'] == 60
+    assert banco_dados._timer is None and banco_dados._pendente is None
+
+def test_falha_ao_descarregar_mantem_o_pendente(cliente, firestore_falso, monkeypatch):
+    firestore_falso.docs('lab_data')['main'] = {'protocols': [], 'logs': [], 'baths': [{'id': 'B1', 'temp': 25, 'circuits': []}]}
+    monkeypatch.setattr(banco_dados, 'JANELA_COALESCER_MS', 60000)
+    gravar = banco_dados._gravar_lab
+    def fora_do_ar(dados):
+        raise RuntimeError('UNAVAILABLE')
+    monkeypatch.setattr(banco_dados, '_gravar_lab', fora_do_ar)
+
+    try:
+        cliente.post('/api/baths/temp', json={'bathId': 'B1', 'temp': 40})
+        banco_dados.descarregar_escritas()
+        assert banco_dados._pendente['baths'][0]['temp'] == 40
+        assert cliente.get('/api/data').get_json()['baths'][0]['temp'] == 40
+    finally:
+        monkeypatch.setattr(banco_dados, '_gravar_lab', gravar)
+        banco_dados.descarregar_escritas()
+    assert firestore_falso.conteudo('lab_data')['main']['baths'][0]['temp'] == 40
@@ -0,0 +1,47 @@
+import gzip
+import json
+from datetime import datetime
+import pytest
+import brotli
+from app import app
+import compressao
+
+def banco_grande(firestore_falso):
+    circuitos = [{'id': f"C-{i:03d}", 'status': 'free', 'previsao': '-', 'batteryId': None} for i in range(100)]
+    firestore_falso.docs('lab_data')['main'] = {'protocols': [], 'logs': [], 'baths': [{'id': 'B1', 'temp': 25, 'circuits': circuitos}]}
+
+def test_resposta_grande_vai_comprimida_conforme_o_accept_encoding(cliente, firestore_falso):
+    banco_grande(firestore_falso)
+    cru = cliente.get('/api/data', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in cru.headers
+
+    com_gzip = cliente.get('/api/data', headers={'Accept-Encoding': 'gzip'})
+    assert com_gzip.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in com_gzip.headers['Vary']
+    assert json.loads(gzip.decompress(com_gzip.data)) == cru.get_json()
+    assert len(com_gzip.data) < len(cru.data)
+
+    com_br = cliente.get('/api/data', headers={'Accept-Encoding': 'gzip;q=0.5, br'})
+    assert com_br.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(com_br.data)) == cru.get_json()
+
+def test_resposta_pequena_e_stream_passam_direto(cliente):
+    pequena = cliente.get('/api', headers={'Accept-Encoding': 'gzip, br'})
+    assert 'Content-Encoding' not in pequena.headers and pequena.get_json()['status'] == 'online'
+
+    ticket = cliente.post('/api/stream/ticket').get_json()['ticket']
+    stream = cliente.get(f"/api/stream?ticket={ticket}", headers={'Authorization': '', 'Accept-Encoding': 'gzip'}, buffered=False)
+    assert 'Content-Encoding' not in stream.headers
+    stream.close()
+
+@pytest.mark.parametrize('cabecalho,esperado', [
+    ('gzip, deflate, br', 'br'), ('br;q=0, gzip', 'gzip'), ('*', 'br'), ('identity', None), (None, None)])
+def test_escolher_codificacao(cabecalho, esperado):
+    assert compressao.escolher_codificacao(cabecalho) == esperado
+
+def test_provedor_rapido_segue_a_saida_da_stdlib():
+    dados = {'b': [1, 2.5, None, 'ç'], 'a': {'quando': datetime(2026, 3, 1, 8, 30)}, 'grande': 2 ** 70}
+    provedor = app.json
+    assert json.loads(provedor.dumps(dados)) == json.loads(provedor.dumps_stdlib(dados))
+    assert list(json.loads(provedor.dumps({'z': 1, 'a': 2}))) == ['a', 'z']
+    assert json.loads(provedor.dumps({'x': float('nan')})) == {'x': None}
@@ -0,0 +1,160 @@
+import copy
+import time
+import threading
+from datetime import datetime, timedelta
+import pytest
+import confiabilidade
+from rotas import laboratorio
+from confiabilidade import aplicar_log, indicadores, rollup_vazio, chave_circuito, HORA_MS
+
+def _log(horas, acao, circuito='C-012'):
+    return {'id': 1_700_000_000_000 + int(horas * HORA_MS), 'action': acao, 'circuitId': circuito}
+
+def test_aplicar_log_conta_horas_falhas_e_reparos():
+    rollup = rollup_vazio('C-012')
+    for log in (_log(0, 'Início de Teste'), _log(10, 'Teste Concluído'), _log(12, 'Entrada em Manutenção'),
+                _log(12.5, 'Falha no Equipamento'), _log(16, 'Reparo Realizado')):
+        aplicar_log(rollup, log)
+
+    assert rollup['estado'] == 'livre'
+    assert rollup['horasOcupado'] == 10
+    assert rollup['horasOcioso'] == 2
+    assert rollup['horasManutencao'] == 4
+    # so a falha conta; a entrada em manutencao antes dela nao
+    assert rollup['falhas'] == 1
+    assert rollup['reparos'] == 1
+    assert rollup['grafias'] == ['C-012']
+
+def test_aplicar_log_ignora_repetido_fora_de_ordem_e_acao_desconhecida():
+    rollup = rollup_vazio('12')
+    assert aplicar_log(rollup, _log(5, 'Início de Teste'))
+    assert not aplicar_log(rollup, _log(5, 'Teste Concluído'))
+    assert not aplicar_log(rollup, _log(1, 'Teste Concluído'))
+    assert not aplicar_log(rollup, _log(6, 'Comentário'))
+    assert not aplicar_log(rollup, {'id': 'abc', 'action': 'Teste Concluído'})
+    assert rollup['estado'] == 'ocupado'
+
+def test_indicadores_inclui_trecho_em_aberto():
+    rollup = rollup_vazio('12')
+    for log in (_log(0, 'Início de Teste'), _log(30, 'Falha no Equipamento'), _log(32, 'Reparo Realizado'),
+                _log(40, 'Início de Teste')):
+        aplicar_log(rollup, log)
+
+    resultado = indicadores(rollup, _log(50, '')['id'])
+    assert resultado['horasOcupado'] == 40
+    assert resultado['horasOcioso'] == 8
+    assert resultado['mtbfHoras'] == 48
+    assert resultado['mttrHoras'] == 2
+    assert resultado['utilizacao'] == round(40 / 48 * 100, 1)
+
+def test_manutencao_planejada_nao_e_falha():
+    rollup = rollup_vazio('12')
+    for log in (_log(0, 'Início de Teste'), _log(10, 'Entrada em Manutenção'), _log(12, 'Saída de Manutenção'),
+                _log(14, 'Falha no Equipamento'), _log(15, 'Falha no Equipamento'), _log(18, 'Reparo Realizado')):
+        aplicar_log(rollup, log)
+    # cada falha registrada conta, mesmo com o circuito ja parado; as duas paradas contam como reparo
+    assert rollup['falhas'] == 2
+    assert rollup['reparos'] == 2
+    assert rollup['horasManutencao'] == 6
+
+def test_acoes_de_falha_configuraveis(monkeypatch):
+    monkeypatch.setattr(confiabilidade, 'ACOES_FALHA', {'Falha no Equipamento', 'Entrada em Manutenção'})
+    rollup = rollup_vazio('12')
+    aplicar_log(rollup, _log(0, 'Entrada em Manutenção'))
+    aplicar_log(rollup, _log(1, 'Falha no Equipamento'))
+    assert rollup['falhas'] == 2
+
+def test_indicadores_sem_falha_nem_horas():
+    resultado = indicadores(rollup_vazio('7'), 0)
+    assert resultado['mtbfHoras'] is None
+    assert resultado['mttrHoras'] is None
+    assert resultado['utilizacao'] is None
+
+def test_chave_circuito_junta_grafias():
+    assert chave_circuito('C-012') == chave_circuito('c12') == chave_circuito(12) == '12'
+    assert chave_circuito('iDevice') == 'iDevice'
+
+def test_registrar_logs_grava_um_documento_por_circuito(firestore_falso):
+    confiabilidade.registrar_logs([_log(0, 'Início de Teste', 'C-012'), _log(1, 'Início de Teste', '7'),
+                                   _log(3, 'Teste Concluído', 'c12'), _log(2, 'Comentário', '7')])
+
+    docs = firestore_falso.conteudo('confiabilidade')
+    assert set(docs) == {'12', '7'}
+    assert docs['12']['horasOcupado'] == 3
+    assert docs['12']['grafias'] == ['C-012', 'c12']
+    assert docs['7']['estado'] == 'ocupado'
+
+def test_recalcular_refaz_e_apaga_circuito_sem_log(firestore_falso):
+    logs = firestore_falso.docs('circuit_logs')
+    for log in (_log(0, 'Início de Teste', 'C-03'), _log(4, 'Teste Concluído', '3')):
+        logs[str(log['id'])] = log
+    firestore_falso.docs('confiabilidade')['99'] = rollup_vazio('99')
+    firestore_falso.docs('confiabilidade')['3'] = dict(rollup_vazio('3'), falhas=5)
+
+    assert confiabilidade.recalcular() == 1
+    docs = firestore_falso.conteudo('confiabilidade')
+    assert set(docs) == {'3'}
+    assert docs['3']['falhas'] == 0
+    assert docs['3']['horasOcupado'] == 4
+
+def test_recalcular_um_circuito_acha_todas_as_grafias(firestore_falso):
+    logs = firestore_falso.docs('circuit_logs')
+    for log in (_log(0, 'Início de Teste', 'C-005'), _log(2, 'Falha no Equipamento', 5),
+                _log(3, 'Reparo Realizado', 'C5'), _log(1, 'Início de Teste', 'C-015')):
+        logs[str(log['id'])] = log
+
+    confiabilidade.recalcular('5')
+    rollup = firestore_falso.conteudo('confiabilidade')['5']
+    assert rollup['falhas'] == 1
+    assert rollup['reparos'] == 1
+    assert rollup['horasOcupado'] == 2
+
+def test_ranking_ordena_pelas_falhas(firestore_falso):
+    docs = firestore_falso.docs('confiabilidade')
+    docs['1'] = dict(rollup_vazio('1'), falhas=1)
+    docs['2'] = dict(rollup_vazio('2'), falhas=4)
+    docs['3'] = rollup_vazio('3')
+
+    resultado = confiabilidade.ranking('falhas', limite=2)
+    assert resultado['total'] == 3
+    assert [l['circuitId'] for l in resultado['circuitos']] == ['2', '1']
+
+BANCO = {'protocols': [], 'logs': [], 'baths': [{'id': 'B1', 'temp': 25, 'circuits': [{'id': 'C-1', 'status': 'free', 'previsao': '-'}]}]}
+
+@pytest.fixture
+def fuso_sao_paulo(monkeypatch):
+    monkeypatch.setenv('TZ', 'America/Sao_Paulo')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_log_da_rota_atualiza_rollup_fora_da_requisicao(cliente, firestore_falso, monkeypatch):
+    firestore_falso.docs('lab_data')['main'] = copy.deepcopy(BANCO)
+    liberar = threading.Event()
+    registrar = confiabilidade.registrar_logs
+    def registrar_travado(logs):
+        liberar.wait(5)
+        return registrar(logs)
+    monkeypatch.setattr(confiabilidade, 'registrar_logs', registrar_travado)
+
+    # a resposta nao espera a transacao do rollup
+    corpo = cliente.post('/api/circuits/history/add', json={'circuitId': 'C-1', 'action': 'Falha no Equipamento'}).get_json()
+    assert corpo['sucesso']
+    assert firestore_falso.conteudo('confiabilidade') == {}
+
+    liberar.set()
+    confiabilidade.descarregar_pendentes()
+    assert firestore_falso.conteudo('confiabilidade')['1']['falhas'] == 1
+
+def test_ranking_conta_o_trecho_aberto_com_a_mesma_epoca_dos_ids(cliente, firestore_falso, monkeypatch, fuso_sao_paulo):
+    firestore_falso.docs('lab_data')['main'] = copy.deepcopy(BANCO)
+    inicio = datetime(2026, 3, 10, 8, 0)
+    monkeypatch.setattr(laboratorio, 'obter_agora', lambda: inicio)
+    assert cliente.post('/api/circuits/history/add', json={'circuitId': 'C-1', 'action': 'Início de Teste'}).get_json()['sucesso']
+    confiabilidade.descarregar_pendentes()
+
+    monkeypatch.setattr(confiabilidade, 'obter_agora', lambda: inicio + timedelta(hours=2))
+    linha = confiabilidade.ranking('utilizacao')['circuitos'][0]
+    assert linha['estado'] == 'ocupado'
+    assert linha['horasOcupado'] == 2
@@ -0,0 +1,58 @@
+from datetime import timedelta
+from utilitarios import obter_agora
+
+def texto(delta):
+    return (obter_agora() + delta).strftime("%d/%m/%Y %H:%M")
+
+def rodando(cid, fim):
+    return {'id': cid, 'status': 'running', 'startTime': texto(timedelta(days=-5)), 'previsao': texto(fim), 'protocol': 'P'}
+
+def preparar(firestore_falso):
+    firestore_falso.docs('lab_data')['main'] = {'protocols': [], 'logs': [], 'baths': [
+        {'id': 'B1', 'temp': 25, 'circuits': [
+            rodando('C-1', timedelta(hours=-1)),
+            rodando('C-2', timedelta(hours=10)),
+            rodando('C-3', timedelta(days=3)),
+            {'id': 'C-4', 'status': 'free', 'noSpace': True},
+        ]},
+        {'id': 'B2', 'temp': 40, 'isFull': True, 'circuits': [
+            {'id': 'C-1', 'status': 'maintenance'},
+            {'id': 'C-5', 'status': 'finished'},
+        ]},
+    ]}
+
+def test_resumo_conta_vencidos_como_finalizados(cliente, firestore_falso):
+    preparar(firestore_falso)
+    corpo = cliente.get('/api/dashboard/summary').get_json()
+    assert corpo['sucesso']
+    assert corpo['circuitos'] == {'free': 1, 'running': 2, 'finished': 2, 'maintenance': 1, 'total': 6}
+    assert corpo['banhos'] == 2 and corpo['banhosLotados'] == 1 and corpo['emManutencao'] == 1
+    assert corpo['terminando24h'] == 1
+    assert corpo['utilizacaoPorTemperatura'] == {'25': 50.0, '40': 0}
+
+def test_resumo_acompanha_mudanca_de_um_banho_sem_reler_o_banco(cliente, firestore_falso):
+    preparar(firestore_falso)
+    versao = cliente.get('/api/dashboard/summary').get_json()['versao']
+
+    assert cliente.post('/api/baths/temp', json={'bathId': 'B2', 'temp': 25}).get_json()['sucesso']
+    # o banco mudou por fora: o resumo so ve o que chegou pelo evento do banho
+    firestore_falso.docs('lab_data')['main'] = {'protocols': [], 'logs': [], 'baths': []}
+
+    corpo = cliente.get('/api/dashboard/summary').get_json()
+    assert corpo['versao'] == versao + 1
+    assert corpo['banhos'] == 2
+    assert corpo['utilizacaoPorTemperatura'] == {'25': 33.3}
+
+def test_data_conclui_so_o_circuito_do_banho_certo_com_ids_repetidos(cliente, firestore_falso):
+    firestore_falso.docs('lab_data')['main'] = {'protocols': [], 'logs': [], 'baths': [
+        {'id': 'B1', 'temp': 25, 'circuits': [rodando('C-1', timedelta(hours=-1))]},
+        {'id': 'B2', 'temp': 25, 'circuits': [rodando('C-1', timedelta(days=2))]},
+    ]}
+    banhos = cliente.get('/api/data').get_json()['baths']
+    assert [b['circuits'][0]['status'] for b in banhos] == ['finished', 'running']
+    assert 0 < banhos[1]['circuits'][0]['progress'] < 100
+
+    gravado = firestore_falso.conteudo('lab_data')['main']['baths']
+    assert [b['circuits'][0]['status'] for b in gravado] == ['finished', 'running']
+    proximos = cliente.get('/api/circuits/next_finishing').get_json()['data']
+    assert [(p['bathId'], p['circuitId']) for p in proximos] == [('B2', 'C-1')]
@@ -0,0 +1,49 @@
+from datetime import timedelta
+from modelos import Circuito
+from disponibilidade import pares_do_banho
+from utilitarios import obter_agora
+
+def texto(delta):
+    return (obter_agora() + delta).strftime("%d/%m/%Y %H:%M")
+
+def livre(cid, **extra):
+    return {'id': cid, 'status': 'free', 'previsao': '-', **extra}
+
+def rodando(cid, fim, **extra):
+    return {'id': cid, 'status': 'running', 'startTime': texto(timedelta(hours=-2)), 'previsao': texto(fim), **extra}
+
+def test_pares_pelo_linked_to_e_pelo_legado():
+    circuitos = [Circuito.de_dict(c) for c in [
+        livre('C-1', linkedTo='C-2', isParallel=True), livre('C-2', linkedTo='C-1', isParallel=True),
+        rodando('C-3', timedelta(hours=5), isParallel=True, batteryId='X'),
+        rodando('C-4', timedelta(hours=5), isParallel=True, batteryId='X'),
+        livre('C-5', linkedTo='C-9'),
+    ]]
+    assert sorted(tuple(c.id for c in par) for par in pares_do_banho(circuitos)) == [('C-1', 'C-2'), ('C-3', 'C-4')]
+
+def preparar(firestore_falso):
+    firestore_falso.docs('lab_data')['main'] = {'logs': [], 'protocols': [{'name': 'C20', 'duration': 20}], 'baths': [
+        {'id': 'B1', 'temp': 25, 'circuits': [
+            rodando('C-1', timedelta(hours=3)),
+            livre('C-2'),
+            livre('C-3', noSpace=True),
+            {'id': 'C-4', 'status': 'maintenance'},
+        ]},
+        {'id': 'B2', 'temp': '25.0', 'circuits': [rodando('C-7', timedelta(hours=1))]},
+        {'id': 'B3', 'temp': 25, 'isFull': True, 'circuits': [livre('C-9')]},
+        {'id': 'B4', 'temp': 40, 'circuits': [livre('C-1')]},
+    ]}
+
+def test_earliest_available_ordena_por_liberacao_na_temperatura(cliente, firestore_falso):
+    preparar(firestore_falso)
+    corpo = cliente.get('/api/circuits/earliest_available?protocol=c20&temp=25&samples=3').get_json()
+    assert corpo['sucesso'] and corpo['protocol'] == 'C20' and corpo['livresAgora'] == 1
+    assert [(s['bathId'], s['circuitIds']) for s in corpo['slots']] == [('B1', ['C-2']), ('B2', ['C-7']), ('B1', ['C-1'])]
+    assert corpo['atendeTodas'] and corpo['inicioConjunto'] == corpo['slots'][-1]['inicio']
+
+def test_earliest_available_sem_vagas_suficientes_e_protocolo_desconhecido(cliente, firestore_falso):
+    preparar(firestore_falso)
+    corpo = cliente.get('/api/circuits/earliest_available?protocol=C20&temp=25&samples=5').get_json()
+    assert len(corpo['slots']) == 3 and not corpo['atendeTodas'] and corpo['inicioConjunto'] is None
+    assert cliente.get('/api/circuits/earliest_available?protocol=XYZ&temp=25').status_code == 404
+    assert cliente.get('/api/circuits/earliest_available?protocol=C20').status_code == 400
@@ -0,0 +1,69 @@
+import gzip
+import brotli
+from flask import Flask
+from comprimir_dist import comprimir_pasta
+from estaticos import registrar_estaticos, CACHE_IMUTAVEL, CACHE_INDEX
+
+JS = b"export const x = 1;\n" * 200
+INDEX = b"<!doctype html><html><body><div id='root'></div>" + b"<!-- -->" * 300 + b"</body></html>"
+
+def montar_dist(pasta):
+    (pasta / 'assets').mkdir(parents=True)
+    (pasta / 'index.html').write_bytes(INDEX)
+    (pasta / 'assets' / 'index-B2x9kQ1a.js').write_bytes(JS)
+    (pasta / 'favicon.txt').write_bytes(b"oi")
+    return pasta
+
+def cliente_estatico(pasta):
+    app = Flask(__name__)
+    manifesto = registrar_estaticos(app, str(pasta))
+    return app.test_client(), manifesto
+
+def test_comprimir_dist_gera_variantes_que_o_manifesto_entrega(tmp_path):
+    pasta = montar_dist(tmp_path / 'dist')
+    assert comprimir_pasta(str(pasta)) == 2
+    # arquivo pequeno demais nao ganha variante
+    assert not (pasta / 'favicon.txt.gz').exists()
+
+    cliente, manifesto = cliente_estatico(pasta)
+    assert 'assets/index-B2x9kQ1a.js.gz' not in manifesto
+    assert set(manifesto['assets/index-B2x9kQ1a.js']['variantes']) == {'br', 'gzip'}
+
+    com_br = cliente.get('/assets/index-B2x9kQ1a.js', headers={'Accept-Encoding': 'gzip, br'})
+    assert com_br.status_code == 200
+    assert com_br.headers['Content-Encoding'] == 'br'
+    assert com_br.headers['Cache-Control'] == CACHE_IMUTAVEL
+    assert 'Accept-Encoding' in com_br.headers['Vary']
+    assert brotli.decompress(com_br.data) == JS
+
+    com_gzip = cliente.get('/assets/index-B2x9kQ1a.js', headers={'Accept-Encoding': 'gzip'})
+    assert com_gzip.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(com_gzip.data) == JS
+
+    cru = cliente.get('/assets/index-B2x9kQ1a.js', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in cru.headers and cru.data == JS
+
+def test_index_revalida_e_rotas_do_spa_caem_no_index(tmp_path):
+    pasta = montar_dist(tmp_path / 'dist')
+    comprimir_pasta(str(pasta))
+    cliente, _ = cliente_estatico(pasta)
+
+    index = cliente.get('/', headers={'Accept-Encoding': 'br'})
+    assert index.headers['Cache-Control'] == CACHE_INDEX
+    assert brotli.decompress(index.data) == INDEX
+    revalidado = cliente.get('/', headers={'Accept-Encoding': 'br', 'If-None-Match': index.headers['ETag']})
+    assert revalidado.status_code == 304
+
+    spa = cliente.get('/oee', headers={'Accept-Encoding': 'identity'})
+    assert spa.status_code == 200 and spa.data == INDEX
+
+def test_asset_de_build_antigo_e_api_desconhecida_dao_404(tmp_path):
+    cliente, _ = cliente_estatico(montar_dist(tmp_path / 'dist'))
+    assert cliente.get('/assets/index-Antigo123.js').status_code == 404
+    assert cliente.get('/api/nao-existe').get_json()['sucesso'] is False
+
+def test_sem_build_responde_404_explicando(tmp_path):
+    cliente, manifesto = cliente_estatico(tmp_path / 'nao-existe')
+    assert manifesto == {}
+    resposta = cliente.get('/solicitacoes')
+    assert resposta.status_code == 404 and 'build' in resposta.get_json()['erro']
@@ -0,0 +1,50 @@
+def pedido(qtd=3):
+    return {'idSolicitacao': 'S1', 'experiencia': 'E1', 'previsaoFinal': '10/02/2026',
+            'dadosSolicitacao': {'qtdAmostras': qtd, 'nomeSolicitante': 'Ana', 'modeloAmostras': 'M60GD'}}
+
+def preparar(firestore_falso):
+    firestore_falso.docs('solicitacoes')['S1'] = {'status': 'Aguardando Aprovação', 'dataCriacaoTs': 1}
+
+def test_gerar_experiencia_grava_amostras_e_programa_a_solicitacao(cliente, firestore_falso):
+    preparar(firestore_falso)
+    resposta = cliente.post('/api/solicitacoes/experiencias/gerar', json=pedido())
+    assert resposta.get_json()['sucesso']
+
+    assert firestore_falso.conteudo('experiencias')['E1']['status'] == 'configurando'
+    amostras = firestore_falso.conteudo('experiencias/E1/amostras')
+    assert sorted(amostras) == ['E1-01', 'E1-02', 'E1-03']
+    assert amostras['E1-02']['ordem'] == 2
+    solicitacao = firestore_falso.conteudo('solicitacoes')['S1']
+    assert solicitacao['status'] == 'Programado' and solicitacao['experiencia'] == 'E1'
+
+def test_falha_transitoria_de_amostra_e_repetida(cliente, firestore_falso):
+    preparar(firestore_falso)
+    tentativas = []
+    def instavel(operacoes):
+        ref = operacoes[0][0]
+        if ref.id == 'E1-02' and len(tentativas) < 2:
+            tentativas.append(ref.id)
+            raise RuntimeError('DEADLINE_EXCEEDED')
+    firestore_falso.antes_do_commit = instavel
+
+    assert cliente.post('/api/solicitacoes/experiencias/gerar', json=pedido()).get_json()['sucesso']
+    assert len(firestore_falso.conteudo('experiencias/E1/amostras')) == 3
+
+def test_amostra_que_nunca_grava_desfaz_o_lote_inteiro(cliente, firestore_falso):
+    preparar(firestore_falso)
+    def rejeita(operacoes):
+        ref, tipo = operacoes[0][0], operacoes[0][1]
+        if ref.id == 'E1-02' and tipo == 'set':
+            raise RuntimeError('PERMISSION_DENIED')
+    firestore_falso.antes_do_commit = rejeita
+
+    resposta = cliente.post('/api/solicitacoes/experiencias/gerar', json=pedido())
+    assert resposta.status_code == 500
+    assert '1 de 3' in resposta.get_json()['erro']
+    assert firestore_falso.conteudo('experiencias/E1/amostras') == {}
+    assert 'E1' not in firestore_falso.conteudo('experiencias')
+    assert firestore_falso.conteudo('solicitacoes')['S1']['status'] == 'Aguardando Aprovação'
+
+def test_quantidade_zerada_e_400(cliente, firestore_falso):
+    preparar(firestore_falso)
+    assert cliente.post('/api/solicitacoes/experiencias/gerar', json=pedido(qtd=0)).status_code == 400
@@ -0,0 +1,43 @@
+import copy
+import time
+from datetime import datetime
+import pytest
+from rotas import laboratorio
+from utilitarios import data_para_epoch_ms
+from modelos import texto_de_epoch
+
+BANCO = {'protocols': [], 'logs': [], 'baths': [{'id': 'B1', 'temp': 25, 'circuits': []}]}
+
+@pytest.fixture
+def fuso_sao_paulo(monkeypatch):
+    # servidor fora de utc: datetime.timestamp() de uma data sem fuso passaria a usar o fuso do sistema
+    monkeypatch.setenv('TZ', 'America/Sao_Paulo')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_id_do_log_e_filtro_por_data_usam_a_mesma_conversao(cliente, firestore_falso, monkeypatch, fuso_sao_paulo):
+    firestore_falso.docs('lab_data')['main'] = copy.deepcopy(BANCO)
+    agora = datetime(2026, 3, 10, 22, 30)
+    monkeypatch.setattr(laboratorio, 'obter_agora', lambda: agora)
+
+    assert cliente.post('/api/circuits/batch', json={'operacoes': [{'op': 'add', 'bathId': 'B1', 'circuitId': '7'}]}).get_json()['sucesso']
+    log = next(iter(firestore_falso.conteudo('circuit_logs').values()))
+    assert log['id'] == data_para_epoch_ms(agora)
+    assert texto_de_epoch(log['id']) == log['date'] == '10/03/2026 22:30'
+
+    # 22:30 do dia 10 tem que cair no dia 10, nao no dia 11 (o que aconteceria somando o fuso do servidor)
+    do_dia = cliente.post('/api/circuits/history', json={'circuitId': 'C-7', 'dataInicio': '10/03/2026', 'dataFim': '10/03/2026'}).get_json()
+    assert [h['id'] for h in do_dia['logs']] == [log['id']]
+    dia_seguinte = cliente.post('/api/circuits/history', json={'circuitId': 'C-7', 'dataInicio': '11/03/2026'}).get_json()
+    assert dia_seguinte['logs'] == []
+
+def test_mais_acoes_que_o_firestore_aceita_da_400(cliente, firestore_falso):
+    firestore_falso.docs('lab_data')['main'] = copy.deepcopy(BANCO)
+    acoes = [f"Acao {i}" for i in range(laboratorio.LIMITE_ACOES_HISTORICO + 1)]
+    resposta = cliente.post('/api/circuits/history', json={'circuitId': 'C-7', 'acoes': acoes})
+    assert resposta.status_code == 400 and resposta.get_json()['sucesso'] is False
+
+    no_limite = cliente.post('/api/circuits/history', json={'circuitId': 'C-7', 'acoes': acoes[:-1]})
+    assert no_limite.status_code == 200
@@ -0,0 +1,55 @@
+from indice_busca import IndiceBusca, tokenizar
+
+CAMPOS = {'solicitacao': ['projeto', 'nomeSolicitante', 'detalhes.bateria'], 'experiencia': ['nome']}
+
+def _indice():
+    indice = IndiceBusca(CAMPOS, pesos={'projeto': 2.0})
+    indice.recarregar({
+        'solicitacao': [
+            ('s1', {'projeto': 'Ciclagem Laboratório', 'nomeSolicitante': 'Ana', 'detalhes': {'bateria': 'Moura 60Ah'}, 'dataCriacaoTs': 1}),
+            ('s2', {'projeto': 'Vida útil', 'nomeSolicitante': 'Laura', 'dataCriacaoTs': 2}),
+        ],
+        'experiencia': [('e1', {'nome': 'Laboratorio frio'})],
+    })
+    return indice
+
+def _ids(resultados):
+    return [r['id'] for r in resultados]
+
+def test_tokenizar_tira_acento_e_pontuacao():
+    assert tokenizar('Vida Útil / 60Ah-B') == ['vida', 'util', '60ah', 'b']
+    assert tokenizar(None) == []
+
+def test_busca_sem_acento_e_exato_antes_do_prefixo():
+    indice = _indice()
+    assert _ids(indice.buscar('laboratorio')) == ['s1', 'e1']
+    # 'la' e prefixo de laboratorio e de laura
+    assert set(_ids(indice.buscar('la'))) == {'s1', 's2', 'e1'}
+    assert _ids(indice.buscar('moura')) == ['s1']
+
+def test_busca_exige_todos_os_termos_e_filtra_tipo():
+    indice = _indice()
+    assert _ids(indice.buscar('lab ana')) == ['s1']
+    assert _ids(indice.buscar('lab', tipo='experiencia')) == ['e1']
+    assert indice.buscar('lab inexistente') == []
+    assert indice.buscar('  ') == []
+
+def test_indexar_parcial_mantem_campos_antigos():
+    indice = _indice()
+    indice.indexar('solicitacao', 's2', {'nomeSolicitante': 'Bruno'}, parcial=True)
+    assert _ids(indice.buscar('vida')) == ['s2']
+    assert _ids(indice.buscar('bruno')) == ['s2']
+    assert indice.buscar('laura') == []
+
+def test_indexar_completo_substitui_tokens():
+    indice = _indice()
+    indice.indexar('solicitacao', 's2', {'projeto': 'Descarga'})
+    assert indice.buscar('vida') == []
+    assert _ids(indice.buscar('desc')) == ['s2']
+
+def test_remover_limpa_postings_e_prefixos():
+    indice = _indice()
+    indice.remover('solicitacao', 's2')
+    assert indice.buscar('laura') == []
+    assert 'lau' not in indice._prefixos
+    assert indice.total_documentos() == 2
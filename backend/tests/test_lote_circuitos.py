@@ -0,0 +1,48 @@
+import copy
+import banco_dados
+
+BANCO = {'protocols': [], 'logs': [], 'baths': [
+    {'id': 'B1', 'temp': 25, 'circuits': [{'id': 'C-1', 'status': 'free', 'previsao': '-'},
+                                          {'id': 'C-2', 'status': 'free', 'previsao': '-'}]}]}
+
+def preparar(firestore_falso):
+    firestore_falso.docs('lab_data')['main'] = copy.deepcopy(BANCO)
+
+def test_lote_aplica_tudo_com_uma_gravacao(cliente, firestore_falso, monkeypatch):
+    preparar(firestore_falso)
+    gravacoes = []
+    gravar = banco_dados._gravar_lab
+    monkeypatch.setattr(banco_dados, '_gravar_lab', lambda dados: (gravacoes.append(1), gravar(dados)))
+    corpo = cliente.post('/api/circuits/batch', json={'operacoes': [
+        {'op': 'add', 'bathId': 'B1', 'circuitId': '3'},
+        {'op': 'status', 'bathId': 'B1', 'circuitId': 'C-1', 'status': 'maintenance'},
+        {'op': 'nospace', 'circuitId': 'C-2', 'noSpace': True},
+    ]}).get_json()
+    assert corpo['sucesso'] and corpo['aplicadas'] == 3
+    assert len(gravacoes) == 1
+
+    circuitos = {c['id']: c for c in firestore_falso.conteudo('lab_data')['main']['baths'][0]['circuits']}
+    assert set(circuitos) == {'C-1', 'C-2', 'C-3'}
+    assert circuitos['C-1']['status'] == 'maintenance' and circuitos['C-2']['noSpace'] is True
+    logs = firestore_falso.conteudo('circuit_logs')
+    assert len(logs) == 2 and len(set(logs)) == 2
+    assert set(firestore_falso.conteudo('lab_logs')) == set(logs)
+
+def test_operacao_invalida_no_meio_nao_grava_nenhuma(cliente, firestore_falso):
+    preparar(firestore_falso)
+    resposta = cliente.post('/api/circuits/batch', json={'operacoes': [
+        {'op': 'add', 'bathId': 'B1', 'circuitId': '3'},
+        {'op': 'status', 'bathId': 'B9', 'circuitId': 'C-1', 'status': 'maintenance'},
+        {'op': 'nospace', 'circuitId': 'C-2'},
+    ]})
+    assert resposta.status_code == 404
+    assert resposta.get_json()['indice'] == 2
+    assert firestore_falso.conteudo('lab_data')['main'] == BANCO
+    assert firestore_falso.conteudo('circuit_logs') == {}
+
+def test_tipo_desconhecido_e_lote_vazio_sao_400(cliente, firestore_falso):
+    preparar(firestore_falso)
+    resposta = cliente.post('/api/circuits/batch', json={'operacoes': [{'op': 'add', 'bathId': 'B1', 'circuitId': '3'}, {'op': 'explodir'}]})
+    assert resposta.status_code == 400 and resposta.get_json()['indice'] == 2
+    assert cliente.post('/api/circuits/batch', json={'operacoes': []}).status_code == 400
+    assert firestore_falso.conteudo('lab_data')['main'] == BANCO
@@ -0,0 +1,34 @@
+import re
+
+def valor_metrica(texto, linha_sem_valor):
+    #valor da serie no texto do /api/metrics, 0 se ainda nao apareceu
+    for linha in texto.splitlines():
+        if linha.startswith(linha_sem_valor + ' '):
+            return float(linha.rsplit(' ', 1)[1])
+    return 0.0
+
+def test_metrics_conta_requisicoes_e_leituras_do_firestore(cliente, firestore_falso):
+    firestore_falso.docs('lab_data')['main'] = {'baths': [], 'protocols': [], 'logs': []}
+    serie_req = 'labmanager_requisicoes_total{metodo="GET",rota="/api/data",status="200"}'
+    serie_leitura = 'labmanager_firestore_segundos_count{colecao="lab_data",operacao="get"}'
+    antes = cliente.get('/api/metrics').get_data(as_text=True)
+
+    assert cliente.get('/api/data').status_code == 200
+    assert cliente.get('/api/data').status_code == 200
+
+    depois = cliente.get('/api/metrics').get_data(as_text=True)
+    assert valor_metrica(depois, serie_req) == valor_metrica(antes, serie_req) + 2
+    assert valor_metrica(depois, serie_leitura) > valor_metrica(antes, serie_leitura)
+    assert re.search(r'labmanager_firestore_leituras_por_requisicao_count\{metodo="GET",rota="/api/data"\} \d+', depois)
+
+def test_metrics_rota_desconhecida_nao_vira_rotulo_novo(cliente):
+    cliente.get('/api/nao-existe/123')
+    texto = cliente.get('/api/metrics').get_data(as_text=True)
+    assert '/api/nao-existe/123' not in texto
+
+def test_metrics_exige_token_quando_configurado(cliente, monkeypatch):
+    monkeypatch.setenv('METRICS_TOKEN', 'segredo')
+    assert cliente.get('/api/metrics').status_code == 401
+    resposta = cliente.get('/api/metrics', headers={'Authorization': 'Bearer segredo'})
+    assert resposta.status_code == 200
+    assert resposta.mimetype == 'text/plain'
@@ -0,0 +1,26 @@
+from modelos import Banho, Circuito
+
+def test_para_dict_devolve_o_formato_do_banco():
+    original = {'id': 'B1', 'temp': 25, 'isFull': False, 'nome': 'Banho 1', 'circuits': [
+        {'id': 'C-001', 'status': 'running', 'batteryId': 'BAT9', 'protocol': 'C20', 'startTime': '01/03/2026 08:00',
+         'previsao': '03/03/2026 08:00', 'progress': 12.5, 'noSpace': False, 'isParallel': True, 'linkedTo': 'C-002',
+         'observacao': 'extra'},
+        {'id': 'C-003', 'status': 'free', 'batteryId': None, 'protocol': None, 'startTime': None, 'previsao': '-',
+         'progress': 0, 'noSpace': True, 'isParallel': False},
+    ]}
+    assert Banho.de_dict(original).para_dict() == original
+
+def test_circuito_novo_sai_livre():
+    assert Circuito(id='C-7', previsao_texto='-').para_dict() == {
+        'id': 'C-7', 'status': 'free', 'batteryId': None, 'protocol': None, 'startTime': None, 'previsao': '-',
+        'progress': 0, 'noSpace': False, 'isParallel': False}
+
+def test_rotas_de_criacao_montam_banho_e_circuito_pelo_modelo(cliente, firestore_falso):
+    firestore_falso.docs('lab_data')['main'] = {'baths': [], 'protocols': [], 'logs': []}
+    cliente.post('/api/baths/add', json={'bathId': 'B1', 'temp': 40})
+    corpo = cliente.post('/api/circuits/add', json={'bathId': 'B1', 'circuitId': '12'}).get_json()
+
+    banho = corpo['db_atualizado']['baths'][0]
+    assert banho['temp'] == 40 and banho['isFull'] is False
+    assert banho['circuits'] == [Circuito(id='C-12', previsao_texto='-').para_dict()]
+    assert firestore_falso.conteudo('lab_data')['main']['baths'][0]['circuits'][0]['id'] == 'C-12'
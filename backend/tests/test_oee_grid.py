@@ -0,0 +1,111 @@
+import time
+import random
+from calendar import monthrange
+from datetime import datetime, timedelta
+import pytest
+import pandas as pd
+import oee_service
+from oee_service import montar_grid_oee, eventos_de_circuit_logs, processar_logs_oee
+from rotas import laboratorio
+from utilitarios import data_para_epoch_ms
+
+def _grid_referencia(df_final, target_mes, target_ano):
+    #laco dia a dia de antes da versao vetorizada
+    _, dias_no_mes = monthrange(target_ano, target_mes)
+    circuitos_eventos = {}
+    for _, row in df_final.iterrows():
+        stop = row['stop'] if not pd.isna(row['stop']) else datetime(target_ano + 1, 1, 1)
+        circuitos_eventos.setdefault(row['clean_id'], []).append((row['start'], stop))
+
+    mapa = {}
+    for cid in ['iDevice'] + list(set(df_final['clean_id'])):
+        status = []
+        for dia in range(1, dias_no_mes + 1):
+            dia_inicio = datetime(target_ano, target_mes, dia, 0, 0, 0)
+            dia_fim = datetime(target_ano, target_mes, dia, 23, 59, 59)
+            status_dia = 'PP' if dia_inicio.weekday() >= 5 else 'SD'
+            if any(start <= dia_fim and stop >= dia_inicio for start, stop in circuitos_eventos.get(cid, [])):
+                status_dia = 'UP'
+            status.append(status_dia)
+        mapa[cid] = status
+    return mapa
+
+def _eventos_aleatorios(semente, mes, ano):
+    sorteio = random.Random(semente)
+    base = datetime(ano, mes, 1)
+    linhas = []
+    for _ in range(300):
+        start = base + timedelta(seconds=sorteio.randint(-40 * 86400, 40 * 86400))
+        stop = None if sorteio.random() < 0.1 else start + timedelta(seconds=sorteio.randint(0, 12 * 86400))
+        linhas.append({'clean_id': str(sorteio.randint(1, 25)), 'start': start, 'stop': stop})
+    # bordas: fim exatamente na meia-noite, comeco no ultimo segundo do mes, evento todo fora do mes
+    linhas += [
+        {'clean_id': '30', 'start': datetime(ano, mes, 3, 10), 'stop': datetime(ano, mes, 5)},
+        {'clean_id': '31', 'start': datetime(ano, mes, monthrange(ano, mes)[1], 23, 59, 59), 'stop': None},
+        {'clean_id': '32', 'start': base - timedelta(days=20), 'stop': base - timedelta(days=10)},
+        {'clean_id': 'iDevice', 'start': base + timedelta(days=7), 'stop': base + timedelta(days=8)},
+    ]
+    df = pd.DataFrame(linhas)
+    df['start'] = pd.to_datetime(df['start'])
+    df['stop'] = pd.to_datetime(df['stop'])
+    return df
+
+def test_grid_vetorizado_igual_ao_laco_antigo():
+    for semente, (mes, ano) in enumerate([(2, 2026), (12, 2025), (7, 2026), (2, 2028)]):
+        df = _eventos_aleatorios(semente, mes, ano)
+        mapa, encontrados = montar_grid_oee(df, mes, ano)
+        assert encontrados == set(df['clean_id'])
+        assert mapa == _grid_referencia(df, mes, ano)
+
+def test_grid_sem_eventos_no_circuito_fica_sd_e_pp():
+    df = pd.DataFrame({'clean_id': ['5'], 'start': pd.to_datetime([datetime(2026, 3, 2, 8)]), 'stop': pd.to_datetime([datetime(2026, 3, 3, 8)])})
+    mapa, _ = montar_grid_oee(df, 3, 2026)
+    assert mapa['5'][:4] == ['PP', 'UP', 'UP', 'SD']
+    assert 'UP' not in mapa['iDevice']
+
+def test_eventos_de_circuit_logs_emparelha_inicio_com_proximo_evento():
+    def log(dia, hora, acao, circuito):
+        return {'id': data_para_epoch_ms(datetime(2026, 3, dia, hora)), 'action': acao, 'circuitId': circuito}
+
+    df = eventos_de_circuit_logs([
+        log(2, 8, 'Início de Teste', 'C-01'), log(4, 8, 'Teste Concluído', '1'),
+        log(5, 8, 'Início de Teste', 'C-02'), log(6, 8, 'Comentário', 'C-02'),
+    ])
+    assert list(df['clean_id']) == ['1', '2']
+    assert df.loc[0, 'stop'] == pd.Timestamp(2026, 3, 4, 8)
+    assert pd.isna(df.loc[1, 'stop'])
+    assert eventos_de_circuit_logs([log(2, 8, 'Comentário', '1')]) is None
+
+@pytest.fixture
+def grid_limpo(monkeypatch):
+    monkeypatch.setattr(oee_service, 'GLOBAL_DB', {'processed_data': {}, 'overrides': {}, 'meta': {}, 'latest_medias': {}})
+    return oee_service.GLOBAL_DB
+
+@pytest.fixture
+def fuso_sao_paulo(monkeypatch):
+    monkeypatch.setenv('TZ', 'America/Sao_Paulo')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_logs_gravados_pela_rota_caem_no_dia_certo_fora_de_utc(cliente, firestore_falso, monkeypatch, grid_limpo, fuso_sao_paulo):
+    firestore_falso.docs('lab_data')['main'] = {'protocols': [], 'logs': [], 'baths': []}
+    # teste que comeca 22:30 do ultimo dia do mes: somando o fuso do servidor ele iria pro mes seguinte
+    for momento, acao in ((datetime(2026, 3, 31, 22, 30), 'Início de Teste'), (datetime(2026, 4, 2, 9, 0), 'Teste Concluído')):
+        monkeypatch.setattr(laboratorio, 'obter_agora', lambda momento=momento: momento)
+        assert cliente.post('/api/circuits/history/add', json={'circuitId': 'C-07', 'action': acao}).get_json()['sucesso']
+
+    assert processar_logs_oee(3, 2026)['sucesso']
+    assert grid_limpo['processed_data']['7'][30] == 'UP'
+    assert 'UP' not in grid_limpo['processed_data']['7'][:30]
+
+    assert processar_logs_oee(4, 2026)['sucesso']
+    assert grid_limpo['processed_data']['7'][:3] == ['UP', 'UP', 'SD']
+
+def test_mes_sem_teste_limpa_grid_e_ajustes_anteriores(firestore_falso, grid_limpo):
+    grid_limpo['processed_data'] = {'7': ['UP'] * 31}
+    grid_limpo['overrides'] = {'7': 'SD'}
+    assert not processar_logs_oee(5, 2026)['sucesso']
+    assert oee_service.GLOBAL_DB['processed_data'] == {}
+    assert oee_service.GLOBAL_DB['overrides'] == {}
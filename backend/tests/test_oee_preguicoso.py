@@ -0,0 +1,33 @@
+import os
+import sys
+import json
+import subprocess
+from rotas import oee_rotas
+
+PASTA_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_boot_do_app_nao_importa_pandas():
+    # processo novo: nos testes o oee_service ja foi importado por outros modulos
+    codigo = (
+        "import sys, json, app\n"
+        "antes = {m: m in sys.modules for m in ('pandas', 'numpy', 'oee_service')}\n"
+        "from rotas.oee_rotas import obter_servico_oee\n"
+        "from metricas import obter_inicializacao\n"
+        "servico = obter_servico_oee()\n"
+        "print(json.dumps({'antes': antes, 'carregou': servico is not None and 'pandas' in sys.modules,"
+        " 'etapas': sorted(obter_inicializacao())}))\n"
+    )
+    ambiente = {**os.environ, 'AGENDADOR_VARREDURA_SEG': '0', 'OEE_AQUECER': '0'}
+    saida = subprocess.run([sys.executable, '-c', codigo], cwd=PASTA_BACKEND, env=ambiente, capture_output=True, text=True, timeout=120)
+    assert saida.returncode == 0, saida.stderr
+    resultado = json.loads(saida.stdout.strip().splitlines()[-1])
+    assert resultado['antes'] == {'pandas': False, 'numpy': False, 'oee_service': False}
+    assert resultado['carregou']
+    assert 'oee_service' in resultado['etapas']
+
+def test_rota_de_oee_carrega_o_servico_na_primeira_chamada(cliente, firestore_falso, monkeypatch):
+    monkeypatch.setattr(oee_rotas, '_servico_oee', None)
+    firestore_falso.docs('lab_data/history/oee_monthly')['2026_03'] = {'mes': 3, 'ano': 2026}
+    corpo = cliente.get('/api/oee/history').get_json()
+    assert oee_rotas._servico_oee is not None
+    assert corpo['sucesso'] and corpo['historico'] == [{'mes': 3, 'ano': 2026, 'id_doc': '2026_03'}]
@@ -0,0 +1,133 @@
+import logging
+import threading
+import pytest
+from google.api_core import exceptions as erros_google
+import outbox
+from outbox import Outbox, MAX_TENTATIVAS
+from metricas import gerar_texto_prometheus
+
+@pytest.fixture
+def fila(firestore_falso, tmp_path):
+    return Outbox(str(tmp_path / 'o.db'))
+
+def _falhar_documento(banco, documento, erro):
+    def antes_do_commit(operacoes):
+        if any(ref.id == documento for ref, *_ in operacoes):
+            raise erro
+    banco.antes_do_commit = antes_do_commit
+
+def test_drenar_grava_a_ultima_versao_de_cada_documento(fila, firestore_falso):
+    fila.enfileirar([('lab_data', 'main', {'v': 1}), ('solicitacoes', 's1', {'status': 'Pendente'})])
+    fila.enfileirar([('lab_data', 'main', {'v': 2})])
+    assert fila.profundidade() == 2
+    assert fila.pendente('lab_data', 'main') == {'v': 2}
+
+    assert fila.drenar_uma_vez() == (2, False)
+    assert firestore_falso.conteudo('lab_data') == {'main': {'v': 2}}
+    assert firestore_falso.conteudo('solicitacoes') == {'s1': {'status': 'Pendente'}}
+    assert fila.profundidade() == 0
+    assert fila.pendente('lab_data', 'main') is None
+
+def test_espelho_copia_o_que_foi_pro_disco(fila):
+    dados = {'baths': []}
+    fila.enfileirar([('lab_data', 'main', dados)])
+    dados['baths'].append('mexido depois')
+    assert fila.pendente('lab_data', 'main') == {'baths': []}
+
+def test_firestore_fora_do_ar_nao_descarta(fila, firestore_falso):
+    fila.enfileirar([('solicitacoes', f's{n}', {'n': n}) for n in range(3)])
+    def fora_do_ar(operacoes):
+        raise erros_google.ServiceUnavailable('sem rede')
+    firestore_falso.antes_do_commit = fora_do_ar
+
+    for _ in range(MAX_TENTATIVAS + 2):
+        gravadas, falhou = fila.drenar_uma_vez()
+        assert (gravadas, falhou) == (0, True)
+    assert fila.profundidade() == 3
+    assert fila.descartadas() == 0
+    assert not fila.drenar(timeout_seg=1)
+
+    firestore_falso.antes_do_commit = lambda operacoes: None
+    assert fila.drenar(timeout_seg=5)
+    assert len(firestore_falso.conteudo('solicitacoes')) == 3
+
+def test_documento_recusado_vai_pra_descartadas_sem_travar_os_outros(fila, firestore_falso, caplog):
+    _falhar_documento(firestore_falso, 'ruim', erros_google.InvalidArgument('documento invalido'))
+    fila.enfileirar([('solicitacoes', 'ruim', {'x': 1}), ('solicitacoes', 'bom', {'x': 2})])
+
+    assert fila.drenar_uma_vez() == (1, False)
+    assert firestore_falso.conteudo('solicitacoes') == {'bom': {'x': 2}}
+
+    with caplog.at_level(logging.ERROR, logger='outbox'):
+        for _ in range(MAX_TENTATIVAS):
+            fila.drenar_uma_vez()
+    assert fila.profundidade() == 0
+    assert fila.descartadas() == 1
+    assert any('solicitacoes/ruim' in r.getMessage() for r in caplog.records)
+
+def test_fila_sobrevive_a_reinicio(firestore_falso, tmp_path):
+    caminho = str(tmp_path / 'o.db')
+    Outbox(caminho).enfileirar([('lab_data', 'main', {'v': 3}), ('solicitacoes', 's1', {'a': 1})])
+
+    reaberta = Outbox(caminho)
+    assert reaberta.profundidade() == 2
+    assert reaberta.pendente('lab_data', 'main') == {'v': 3}
+    assert reaberta.drenar(timeout_seg=5)
+    assert firestore_falso.conteudo('lab_data') == {'main': {'v': 3}}
+
+def test_gravador_e_pos_gravacao_por_colecao(fila, firestore_falso):
+    gravados, avisados = [], []
+    fila.registrar_gravador('lab_data', lambda documento, dados: gravados.append((documento, dados)))
+    fila.registrar_apos_gravar('circuit_logs', avisados.append)
+    fila.enfileirar([('lab_data', 'main', {'v': 1}), ('circuit_logs', '1', {'id': 1})])
+
+    assert fila.drenar(timeout_seg=5)
+    assert gravados == [('main', {'v': 1})]
+    assert avisados == [[{'id': 1}]]
+    assert firestore_falso.conteudo('lab_data') == {}
+
+def test_contador_de_descartes_exportado_desde_a_primeira_escrita(fila):
+    fila.enfileirar([('colecao_nova', 'd1', {'x': 1})])
+    assert 'labmanager_outbox_descartadas_total{colecao="colecao_nova"} 0' in gerar_texto_prometheus()
+
+def test_dois_processos_no_mesmo_arquivo_nao_gravam_a_mesma_linha(firestore_falso, tmp_path):
+    # duas instancias abrem o .lock cada uma, como dois processos
+    caminho = str(tmp_path / 'o.db')
+    a, b = Outbox(caminho), Outbox(caminho)
+    avisados = []
+    dentro, liberar = threading.Event(), threading.Event()
+    def gravador_lento(documento, dados):
+        dentro.set()
+        liberar.wait(5)
+    a.registrar_gravador('lab_data', gravador_lento)
+    for fila in (a, b):
+        fila.registrar_apos_gravar('circuit_logs', avisados.extend)
+    a.enfileirar([('lab_data', 'main', {'v': 1}), ('circuit_logs', '1', {'id': 1})])
+
+    dreno_a = threading.Thread(target=a.drenar_uma_vez)
+    dreno_a.start()
+    assert dentro.wait(5)
+    resultado_b = []
+    dreno_b = threading.Thread(target=lambda: resultado_b.append(b.drenar_uma_vez()))
+    dreno_b.start()
+    dreno_b.join(0.2)
+    # b espera o lote de a terminar em vez de pegar as mesmas linhas
+    assert dreno_b.is_alive()
+
+    liberar.set()
+    dreno_a.join(5)
+    dreno_b.join(5)
+    assert resultado_b == [(0, False)]
+    assert avisados == [{'id': 1}]
+    assert firestore_falso.conteudo('lab_data') == {}
+
+def test_pendente_enxerga_o_que_outro_processo_drenou_ou_trocou(firestore_falso, tmp_path):
+    caminho = str(tmp_path / 'o.db')
+    a, b = Outbox(caminho), Outbox(caminho)
+    a.enfileirar([('lab_data', 'main', {'v': 1})])
+    b.enfileirar([('lab_data', 'main', {'v': 2})])
+    assert a.pendente('lab_data', 'main') == {'v': 2}
+
+    assert b.drenar(timeout_seg=5)
+    assert a.pendente('lab_data', 'main') is None
+    assert firestore_falso.conteudo('lab_data') == {'main': {'v': 2}}
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+import numpy as np
+from projecao_ocupacao import contar_por_dia, projetar, epoch_de_data_qualquer, DIA_MS
+from utilitarios import obter_agora
+
+def test_contar_por_dia_corta_no_horizonte_e_soma_pesos():
+    inicio = 0
+    contagem = contar_por_dia(
+        inicios=[0.5 * DIA_MS, -3 * DIA_MS, 2 * DIA_MS, 4 * DIA_MS, 1 * DIA_MS],
+        fins=[2 * DIA_MS, 1 * DIA_MS, np.nan, 9 * DIA_MS, 1 * DIA_MS],
+        linhas=[0, 0, 1, 1, 1], n_linhas=2, inicio_ms=inicio, n_dias=5, pesos=[1, 2, 1, 3, 7])
+    # fim exatamente na meia-noite nao ocupa o dia seguinte; intervalo vazio nao conta
+    assert contagem[0].tolist() == [3, 1, 0, 0, 0]
+    assert contagem[1].tolist() == [0, 0, 1, 1, 4]
+
+def test_contar_por_dia_vazio():
+    assert contar_por_dia([], [], [], 3, 0, 4).shape == (3, 4)
+
+def test_epoch_de_data_qualquer_aceita_os_dois_formatos():
+    assert epoch_de_data_qualquer('26/03/2026 09:00') == epoch_de_data_qualquer('2026-03-26T09:00')
+    assert epoch_de_data_qualquer('amanha') is None
+
+def test_projetar_banhos_e_programadas():
+    db = {'baths': [{'id': 'B1', 'temp': 25, 'circuits': [
+        {'id': 'C1', 'status': 'running', 'startTime': '01/03/2026 08:00', 'previsao': '03/03/2026 08:00'},
+        {'id': 'C2', 'status': 'running', 'startTime': '01/03/2026 08:00', 'previsao': 'A calcular'},
+        {'id': 'C3', 'status': 'maintenance'},
+        {'id': 'C4', 'status': 'free'},
+    ]}]}
+    solicitacoes = [
+        {'status': 'Programado', 'dataInicio': '2026-03-04T09:00', 'dataFim': '05/03/2026 18:00', 'qtdAmostras': '3'},
+        {'status': 'Concluído', 'dataInicio': '02/03/2026', 'dataFim': '03/03/2026'},
+        {'status': 'Em Andamento', 'dataInicio': '02/03/2026', 'dataFim': None},
+    ]
+
+    resultado = projetar(db, solicitacoes, datetime(2026, 3, 2, 15, 30), semanas=1)
+    assert resultado['dias'][0] == '02/03/2026'
+    assert len(resultado['dias']) == 7
+    banho = resultado['banhos'][0]
+    assert banho['capacidade'] == 3
+    assert banho['manutencao'] == 1
+    assert banho['ocupados'] == [2, 2, 1, 1, 1, 1, 1]
+    assert resultado['programadas'] == [0, 0, 3, 3, 0, 0, 0]
+
+def test_rota_projecao_junta_banhos_e_solicitacoes_programadas(cliente, firestore_falso):
+    amanha = (obter_agora() + timedelta(days=1)).strftime("%d/%m/%Y")
+    firestore_falso.docs('lab_data')['main'] = {'protocols': [], 'logs': [], 'baths': [
+        {'id': 'B1', 'temp': 25, 'circuits': [{'id': 'C1', 'status': 'free'}, {'id': 'C2', 'status': 'free'}]}]}
+    solicitacoes = firestore_falso.docs('solicitacoes')
+    solicitacoes['S1'] = {'status': 'Programado', 'dataInicio': f"{amanha} 08:00", 'dataFim': f"{amanha} 18:00", 'qtdAmostras': 2}
+    solicitacoes['S2'] = {'status': 'Concluída', 'dataInicio': f"{amanha} 08:00", 'dataFim': f"{amanha} 18:00", 'qtdAmostras': 5}
+
+    corpo = cliente.get('/api/occupancy/projection?semanas=1').get_json()
+    assert corpo['sucesso'] and len(corpo['dias']) == 7
+    assert corpo['programadas'][:3] == [0, 2, 0]
+    assert corpo['banhos'][0]['capacidade'] == 2
+    assert cliente.get('/api/occupancy/projection?semanas=x').status_code == 400
@@ -0,0 +1,53 @@
+import copy
+import pytest
+import replica
+
+@pytest.fixture
+def replica_limpa(monkeypatch):
+    monkeypatch.setattr(replica, '_listeners', {})
+    monkeypatch.setattr(replica, '_ultimo_inicio', {})
+    monkeypatch.setattr(replica, '_estado', copy.deepcopy(replica._estado))
+    monkeypatch.setattr(replica, '_ouvintes_lab', [])
+    monkeypatch.setattr(replica, '_desejada', False)
+    yield
+    replica.parar()
+
+def watch_de(firestore_falso, nome):
+    return next(w for w in reversed(firestore_falso.watches) if w.alvo.id == nome)
+
+def test_data_sai_da_replica_sem_ler_o_firestore(cliente, firestore_falso, replica_limpa):
+    firestore_falso.docs('lab_data')['main'] = {'baths': [{'id': 'B1', 'circuits': []}], 'protocols': [], 'logs': []}
+    replica.iniciar()
+    assert cliente.get('/api/replica/status').get_json()['saudavel']
+
+    # o firestore mudou sem o listener avisar: quem responde e a copia da replica
+    firestore_falso.docs('lab_data')['main'] = {'baths': [], 'protocols': [], 'logs': []}
+    assert [b['id'] for b in cliente.get('/api/data').get_json()['baths']] == ['B1']
+
+def test_listener_caido_tira_a_colecao_do_ar_e_volta_depois_do_intervalo(cliente, firestore_falso, replica_limpa, monkeypatch):
+    firestore_falso.docs('lab_data')['main'] = {'baths': [{'id': 'B1', 'circuits': []}], 'protocols': [], 'logs': []}
+    firestore_falso.docs('users')['ana'] = {'role': 'tecnico'}
+    replica.iniciar()
+
+    watch_de(firestore_falso, 'users')._closed = True
+    firestore_falso.docs('users').pop('ana')
+    resposta = cliente.get('/api/replica/status')
+    assert resposta.status_code == 503
+    status = resposta.get_json()['colecoes']['users']
+    assert status['pronto'] is False and status['falhas'] == 1
+    # enquanto isso a leitura vai no firestore
+    assert replica.obter_usuario('ana') is None
+
+    monkeypatch.setattr(replica, 'INTERVALO_REINICIO_SEG', 0)
+    assert cliente.get('/api/replica/status').status_code == 200
+    assert not watch_de(firestore_falso, 'users')._closed
+    # o snapshot novo nao traz quem foi apagado durante a queda
+    assert replica.obter_usuario('ana') == {}
+
+def test_listener_caido_nao_e_recriado_antes_do_intervalo(cliente, firestore_falso, replica_limpa):
+    replica.iniciar()
+    total = len(firestore_falso.watches)
+    watch_de(firestore_falso, 'solicitacoes')._closed = True
+    for _ in range(3):
+        cliente.get('/api/replica/status')
+    assert len(firestore_falso.watches) == total
@@ -0,0 +1,109 @@
+def solicitacao(ts, **extra):
+    dados = {'tituloProjeto': 'Projeto', 'status': 'pendente', 'dataCriacao': '01/01/2026 10:00', 'modeloAmostras': 'M60GD'}
+    if ts is not None:
+        dados['dataCriacaoTs'] = ts
+    return {**dados, **extra}
+
+def listar_tudo(cliente, limite):
+    ids = []
+    cursor = None
+    while True:
+        url = f"/api/solicitacoes/listar?limite={limite}" + (f"&cursor={cursor}" if cursor else '')
+        corpo = cliente.get(url).get_json()
+        assert corpo['sucesso']
+        ids += [s['idSolicitacao'] for s in corpo['data']]
+        cursor = corpo['proximoCursor']
+        if not cursor:
+            return ids
+
+def test_paginacao_inclui_solicitacoes_antigas_sem_data_ts(cliente, firestore_falso):
+    docs = firestore_falso.docs('solicitacoes')
+    docs['nova'] = solicitacao(1767700000000)
+    docs['antiga'] = solicitacao(None, dataCriacao='15/03/2025 08:30')
+    docs['sem-data'] = solicitacao(None, dataCriacao='')
+    docs['media'] = solicitacao(1760000000000)
+
+    assert listar_tudo(cliente, 2) == ['nova', 'media', 'antiga', 'sem-data']
+    assert firestore_falso.conteudo('solicitacoes')['sem-data']['dataCriacaoTs'] == 0
+    marcador = firestore_falso.conteudo('lab_data')['migracoes']['dataCriacaoTs']
+    assert marcador['migrados'] == 2 and marcador['semData'] == ['sem-data']
+
+def test_backfill_nao_roda_de_novo_com_marcador_gravado(cliente, firestore_falso):
+    firestore_falso.docs('lab_data')['migracoes'] = {'dataCriacaoTs': {'em': 1, 'migrados': 0, 'semData': []}}
+    firestore_falso.docs('solicitacoes')['antiga'] = solicitacao(None)
+    assert listar_tudo(cliente, 10) == []
+    assert 'dataCriacaoTs' not in firestore_falso.conteudo('solicitacoes')['antiga']
+
+def test_cursor_invalido_e_400(cliente, firestore_falso):
+    resposta = cliente.get('/api/solicitacoes/listar?limite=10&cursor=lixo')
+    assert resposta.status_code == 400
+    assert resposta.get_json()['erro'] == 'Cursor inválido'
+
+def test_buscar_completo_traz_solicitacao_fora_das_paginas_carregadas(cliente, firestore_falso):
+    docs = firestore_falso.docs('solicitacoes')
+    for i in range(5):
+        docs[f"SOL-{i}"] = solicitacao(1767000000000 + i)
+    docs['SOL-VELHA'] = solicitacao(1600000000000, modeloAmostras='HX75', mensagens=[{'texto': 'oi'}])
+
+    primeira = cliente.get('/api/solicitacoes/listar?limite=2&campos=completo').get_json()['data']
+    assert 'SOL-VELHA' not in [s['idSolicitacao'] for s in primeira]
+
+    corpo = cliente.get('/api/solicitacoes/buscar?q=hx75&tipo=solicitacao&completo=1').get_json()
+    assert [r['id'] for r in corpo['data']] == ['SOL-VELHA']
+    assert corpo['data'][0]['dados']['mensagens'] == [{'texto': 'oi'}]
+    assert corpo['data'][0]['dados']['idSolicitacao'] == 'SOL-VELHA'
+
+    sem_completo = cliente.get('/api/solicitacoes/buscar?q=hx75&tipo=solicitacao').get_json()
+    assert 'dados' not in sem_completo['data'][0]
+
+def test_update_move_historico_legado_pra_subcolecao(cliente, firestore_falso):
+    legado = [
+        {'id': 'a', 'autor': 'ana', 'data': '10/01/2025 09:00', 'alteracoes': ['Status: de x para y']},
+        {'id': 'b', 'autor': 'bia', 'data': '05/02/2025 14:30', 'alteracoes': ['Lote: de 1 para 2']},
+    ]
+    firestore_falso.docs('solicitacoes')['S1'] = solicitacao(1767000000000, historicoEdicoes=legado)
+
+    resposta = cliente.post('/api/solicitacoes/update', json={'id': 'S1', 'dados': {'status': 'Em Análise'}})
+    assert resposta.get_json()['sucesso']
+
+    documento = firestore_falso.conteudo('solicitacoes')['S1']
+    assert 'historicoEdicoes' not in documento and documento['status'] == 'Em Análise'
+    historico = firestore_falso.conteudo('solicitacoes/S1/historico')
+    assert len(historico) == 3
+
+    entradas = cliente.get('/api/solicitacoes/historico?id=S1').get_json()['data']
+    assert [e['autor'] for e in entradas] == ['admin', 'bia', 'ana']
+    assert entradas[0]['alteracoes'] == ["Status Operacional: de 'pendente' para 'Em Análise'"]
+
+def test_historico_pagina_pela_subcolecao_e_junta_o_legado_no_fim(cliente, firestore_falso):
+    firestore_falso.docs('solicitacoes')['S2'] = solicitacao(1767000000000, historicoEdicoes=[
+        {'id': 'x', 'autor': 'antigo', 'data': '01/01/2024 08:00', 'alteracoes': []}])
+    historico = firestore_falso.docs('solicitacoes/S2/historico')
+    for ts in (1767000000001, 1767000000002, 1767000000003):
+        historico[f"{ts}_abc"] = {'ts': ts, 'autor': str(ts), 'alteracoes': []}
+
+    primeira = cliente.get('/api/solicitacoes/historico?id=S2&limite=2').get_json()
+    assert [e['ts'] for e in primeira['data']] == [1767000000003, 1767000000002]
+    segunda = cliente.get(f"/api/solicitacoes/historico?id=S2&limite=2&cursor={primeira['proximoCursor']}").get_json()
+    assert [e['autor'] for e in segunda['data']] == ['1767000000001', 'antigo']
+    assert segunda['proximoCursor'] is None
+
+def test_update_de_solicitacao_inexistente_e_404(cliente, firestore_falso):
+    resposta = cliente.post('/api/solicitacoes/update', json={'id': 'nao-existe', 'dados': {'status': 'x'}})
+    assert resposta.status_code == 404
+
+def test_buscar_acha_por_prefixo_e_ve_solicitacao_recem_criada(cliente, firestore_falso):
+    firestore_falso.docs('solicitacoes')['S-OLD'] = solicitacao(1, tituloProjeto='Ciclagem térmica', lote='L123')
+    firestore_falso.docs('experiencias')['EXP9'] = {'idExperiencia': 'EXP9', 'idSolicitacao': 'S-OLD', 'dadosTecnicos': {'modelo': 'M60GD'}}
+
+    corpo = cliente.get('/api/solicitacoes/buscar?q=ciclag termica').get_json()
+    assert [(r['tipo'], r['id']) for r in corpo['data']] == [('solicitacao', 'S-OLD')]
+
+    cliente.post('/api/solicitacoes/adicionar', json={'idSolicitacao': 'S-NOVA', 'tituloProjeto': 'Ciclagem rápida'})
+    ids = [r['id'] for r in cliente.get('/api/solicitacoes/buscar?q=ciclagem&tipo=solicitacao').get_json()['data']]
+    assert sorted(ids) == ['S-NOVA', 'S-OLD']
+    assert [r['id'] for r in cliente.get('/api/solicitacoes/buscar?q=m60gd&tipo=experiencia').get_json()['data']] == ['EXP9']
+
+def test_buscar_sem_termo_e_limite_invalido(cliente):
+    assert cliente.get('/api/solicitacoes/buscar?q=').get_json()['data'] == []
+    assert cliente.get('/api/solicitacoes/buscar?q=x&limite=abc').status_code == 400
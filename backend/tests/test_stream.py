@@ -0,0 +1,37 @@
+import eventos_lab
+from rotas import autenticacao
+
+SEM_HEADER = {'Authorization': '', 'Accept': 'text/event-stream'}
+
+def abrir_stream(cliente, url):
+    resposta = cliente.get(url, headers=SEM_HEADER, buffered=False)
+    primeiro = next(resposta.response).decode() if resposta.status_code == 200 else None
+    resposta.close()
+    return resposta.status_code, primeiro
+
+def pedir_ticket(cliente):
+    corpo = cliente.post('/api/stream/ticket').get_json()
+    assert corpo['sucesso']
+    return corpo['ticket']
+
+def test_ticket_abre_o_stream_uma_vez_so(cliente, firestore_falso):
+    firestore_falso.docs('lab_data')['main'] = {'baths': [{'id': 'B1', 'circuits': []}], 'protocols': [], 'logs': []}
+    ticket = pedir_ticket(cliente)
+
+    status, primeiro = abrir_stream(cliente, f"/api/stream?ticket={ticket}")
+    assert status == 200
+    assert primeiro.startswith('id: ') and 'event: snapshot' in primeiro and '"B1"' in primeiro
+    assert eventos_lab.conexoes_abertas() == 0
+
+    assert abrir_stream(cliente, f"/api/stream?ticket={ticket}")[0] == 403
+
+def test_ticket_vencido_e_recusado(cliente, monkeypatch):
+    monkeypatch.setattr(autenticacao, 'TTL_TICKET_STREAM_SEG', 0)
+    assert abrir_stream(cliente, f"/api/stream?ticket={pedir_ticket(cliente)}")[0] == 403
+
+def test_token_na_query_nao_autentica_mais(cliente):
+    assert abrir_stream(cliente, '/api/stream?token=token-admin')[0] == 401
+    assert cliente.verificacoes == []
+
+def test_ticket_exige_login(cliente):
+    assert cliente.post('/api/stream/ticket', headers={'Authorization': ''}).status_code == 401
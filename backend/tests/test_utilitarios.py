@@ -0,0 +1,18 @@
+from datetime import datetime
+from utilitarios import codificar_cursor, decodificar_cursor, data_para_epoch_ms, data_de_epoch_ms
+
+def test_cursor_ida_e_volta():
+    posicao = {'ts': 1767225600000, 'id': 'abc/ção'}
+    cursor = codificar_cursor(posicao)
+    assert '/' not in cursor and '+' not in cursor
+    assert decodificar_cursor(cursor) == posicao
+
+def test_cursor_invalido_vira_none():
+    assert decodificar_cursor('nao e base64!') is None
+    assert decodificar_cursor(codificar_cursor('x')[:-3] + '@@@') is None
+    assert decodificar_cursor('') is None
+
+def test_epoch_ms_ida_e_volta():
+    momento = datetime(2026, 1, 31, 23, 30, 15, 250000)
+    assert data_de_epoch_ms(data_para_epoch_ms(momento)) == momento
+    assert data_de_epoch_ms(str(data_para_epoch_ms(momento))) == momento
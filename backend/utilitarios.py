@@ -1,6 +1,9 @@
 #recebimento de textos, numeros e datas e tratamento deles
 
 import re
+import json
+import base64
+import calendar
 from datetime import datetime, timedelta, timezone
 
 def apenas_numeros(texto):
@@ -10,6 +13,36 @@ def apenas_numeros(texto):
 def obter_agora():
     return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=3)
 
+def data_para_epoch_ms(dt):
+    #as datas do sistema sao horario local sem fuso, entao trata como utc so pra ter um numero ordenavel
+    #e a convencao dos ids de log: nao usar datetime.timestamp(), que depende do fuso do servidor
+    return calendar.timegm(dt.timetuple()) * 1000 + dt.microsecond // 1000
+
+def data_de_epoch_ms(epoch_ms):
+    #inverso de data_para_epoch_ms: volta pelo utc, entao o horario local sai igual em qualquer servidor
+    return datetime.fromtimestamp(int(epoch_ms) / 1000, timezone.utc).replace(tzinfo=None)
+
+def data_br_para_epoch_ms(texto):
+    #converte 'dd/mm/YYYY HH:MM' (ou so a data) em epoch ms; None se nao der pra ler
+    if not texto:
+        return None
+    for formato in ("%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y"):
+        try:
+            return data_para_epoch_ms(datetime.strptime(str(texto).strip(), formato))
+        except ValueError:
+            continue
+    return None
+
+def codificar_cursor(dados):
+    #cursor opaco das listagens paginadas (base64 de um json com a posicao do ultimo item)
+    return base64.urlsafe_b64encode(json.dumps(dados, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+def decodificar_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except Exception:
+        return None
+
 def calcular_previsao_fim(start_str, nome_protocolo, db_protocols):
     #calcula quando teste termina somnado a duracao com o inicio
     protocolos_ordenados = sorted(db_protocols, key=lambda p: len(p['name']), reverse=True)
@@ -43,37 +76,55 @@ def identificar_nome_padrao(linha, db_protocols=[]):
             return p['name']
     return "Desconhecido"
 
-def atualizar_progresso_realtime(bd):
-   
-    #atualiza o progresso nos circuitos 
+def atualizar_progresso_realtime(bd, consumir=True):
+    #consumir=False e pra quem so le e nao grava o bd (stream, proximos a terminar): ve quem venceu sem tirar do
+    #agendador, senao a conclusao sumiria do heap sem nunca ser salva
+    #import aqui dentro porque o agendador usa as funcoes de data deste modulo
+    from agendador_conclusao import agendador
+    from modelos import Circuito
+
     agora = obter_agora() 
+    agora_ms = data_para_epoch_ms(agora)
     mudou = False
-    
+
+    if agendador.precisa_sincronizar():
+        agendador.sincronizar(bd)
+
+    #so quem passou da previsao sai do heap; o resto nem e olhado
+    vencidos = agendador.retirar_vencidos(agora_ms) if consumir else agendador.vencidos(agora_ms)
+    if vencidos:
+        circuitos = {(str(banho.get('id')), c.get('id')): c for banho in bd.get('baths', []) for c in banho.get('circuits', [])}
+        for chave in vencidos:
+            c = circuitos.get(chave)
+            if c and c.get('status') == 'running':
+                c.update({'status': 'finished', 'progress': 100})
+                mudou = True
+
+    #progresso em % e derivado de startTime/previsao, entao so atualiza a resposta sem forcar gravacao no banco.
+    #essa passada ainda visita todo circuito (a tela le o progress de cada um), mas e so um lookup no agendador
     for banho in bd.get('baths', []):
         for c in banho.get('circuits', []):
             if c.get('status') == 'running':
-                try:
-                    ini = datetime.strptime(c.get('startTime'), "%d/%m/%Y %H:%M")
-                    fim = datetime.strptime(c.get('previsao'), "%d/%m/%Y %H:%M")
-                    total = (fim - ini).total_seconds()
-                    passado = (agora - ini).total_seconds()
-                    
-                    
-                    if agora >= fim:
-                        c.update({'status': 'finished', 'progress': 100})
-                        mudou = True
-                    else:
-                        percent = round(max(0, min(99.9, (passado / total) * 100)), 1)
-                        
-                        if c.get('progress') != percent:
-                            c['progress'] = percent
-                            mudou = True
-                except: 
-                    pass
-                    
+                tempos = agendador.tempos(banho.get('id'), c.get('id'))
+                if tempos:
+                    ini, fim = tempos
+                    total = fim - ini
+                    if total > 0:
+                        c['progress'] = round(max(0, min(99.9, ((agora_ms - ini) / total) * 100)), 1)
+                    continue
+                #o agendador ainda nao conhece o circuito (mudanca de outro worker antes da ressincronizacao): le a previsao
+                circuito = Circuito.de_dict(c)
+                if circuito.fim_ms is None:
+                    continue
+                if circuito.fim_ms <= agora_ms:
+                    c.update({'status': 'finished', 'progress': 100})
+                    mudou = True
+                else:
+                    progresso = circuito.progresso_em(agora_ms)
+                    if progresso is not None:
+                        c['progress'] = progresso
             elif c.get('status') == 'finished' and c.get('progress') != 100:
                 c['progress'] = 100
                 mudou = True
                 
-   
-    return mudou
\ No newline at end of file
+    return mudou
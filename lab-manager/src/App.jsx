@@ -19,6 +19,7 @@ import ClientBatteryTracking from './features/client/AcompanharBaterias';
 import GerenciadorLims from './features/lims/GerenciadorLims';
 
 import { bathService } from './services/bathService';
+import { abrirStreamLab } from './services/streamLab';
 import { apiRequest } from './services/api'; 
 
 import ImportModal from './components/modals/ImportarDig';
@@ -190,10 +191,26 @@ const MainApp = () => {
 
   useEffect(() => {
     if (!user || !hasPermission('dashboard')) return;
-    let timeoutId; let isMounted = true;
-    const pollData = async () => { if (!isMounted) return; await fetchData(); if (isMounted) timeoutId = setTimeout(pollData, 10000); };
+    let timeoutId; let isMounted = true; let streamAtivo = false;
+    // com o stream SSE aberto as mudancas chegam por ele e o polling de /data fica parado; se cair, o polling volta
+    const pollData = async () => { if (!isMounted) return; if (!streamAtivo) await fetchData(); if (isMounted) timeoutId = setTimeout(pollData, 10000); };
+    const fecharStream = abrirStreamLab({
+      snapshot: (data) => { setBaths(data.baths || []); setLogs(data.logs || []); setProtocols(data.protocols || []); setExperienceOwners(data.experienceOwners || {}); setIsError(false); },
+      banhos: ({ baths }) => setBaths(baths || []),
+      banho: ({ bathId, oldId, bath }) => setBaths(prev => {
+        const semAntigo = prev.filter(b => String(b.id) !== String(oldId ?? bathId));
+        if (!bath) return semAntigo;
+        const posicao = prev.findIndex(b => String(b.id) === String(oldId ?? bathId));
+        if (posicao < 0) return [...semAntigo, bath];
+        return [...semAntigo.slice(0, posicao), bath, ...semAntigo.slice(posicao)];
+      }),
+      log: (log) => setLogs(prev => [log, ...prev.filter(l => l.id !== log.id)].slice(0, 100)),
+      log_removido: ({ id }) => setLogs(prev => prev.filter(l => l.id !== id)),
+      protocolos: ({ protocols }) => setProtocols(protocols || []),
+      donos: ({ experienceOwners }) => setExperienceOwners(experienceOwners || {})
+    }, (ativo) => { streamAtivo = ativo; });
     fetchData(true).then(() => { timeoutId = setTimeout(pollData, 10000); });
-    return () => { isMounted = false; clearTimeout(timeoutId); };
+    return () => { isMounted = false; clearTimeout(timeoutId); fecharStream(); };
   }, [fetchData, user, hasPermission]);
 
   const askConfirm = useCallback((title, message, onConfirm, type = 'danger') => {
@@ -11,6 +11,8 @@ const CircuitHistoryModal = ({ isOpen, onClose, circuit, onRefreshData }) => {
   const [logDetails, setLogDetails] = useState('');
   const [isSubmitting, setIsSubmitting] = useState(false);
   const [activeFilter, setActiveFilter] = useState('Todos');
+  const [nextCursor, setNextCursor] = useState(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
 
   useEffect(() => {
     if (isOpen && circuit) {
@@ -18,9 +20,11 @@ const CircuitHistoryModal = ({ isOpen, onClose, circuit, onRefreshData }) => {
       setShowLogForm(false);
       setLogDetails('');
       setActiveFilter('Todos');
+      setNextCursor(null);
       bathService.getCircuitHistory(circuit.id).then(res => {
         if (res.success && res.data) {
           setHistoryLogs(res.data.logs || []);
+          setNextCursor(res.data.proximoCursor || null);
         }
         setIsLoading(false);
       }).catch(() => {
@@ -28,9 +32,22 @@ const CircuitHistoryModal = ({ isOpen, onClose, circuit, onRefreshData }) => {
       });
     } else {
       setHistoryLogs([]);
+      setNextCursor(null);
     }
   }, [isOpen, circuit]);
 
+  const handleLoadMore = async () => {
+    if (!nextCursor) return;
+    setIsLoadingMore(true);
+    const res = await bathService.getCircuitHistory(circuit.id, { cursor: nextCursor });
+    if (res.success && res.data) {
+      const idsAtuais = new Set(historyLogs.map(log => log.id));
+      setHistoryLogs(prev => [...prev, ...(res.data.logs || []).filter(log => !idsAtuais.has(log.id))]);
+      setNextCursor(res.data.proximoCursor || null);
+    }
+    setIsLoadingMore(false);
+  };
+
   const filterOptions = useMemo(() => {
     const uniqueActions = new Set(historyLogs.map(log => log.action));
     return ['Todos', ...Array.from(uniqueActions)];
@@ -68,7 +85,10 @@ const CircuitHistoryModal = ({ isOpen, onClose, circuit, onRefreshData }) => {
     const res = await bathService.deleteCircuitLog(logId);
     if (!res.success) {
        bathService.getCircuitHistory(circuit.id).then(r => {
-         if (r.success && r.data) setHistoryLogs(r.data.logs || []);
+         if (r.success && r.data) {
+           setHistoryLogs(r.data.logs || []);
+           setNextCursor(r.data.proximoCursor || null);
+         }
        });
     }
   };
@@ -219,6 +239,14 @@ const CircuitHistoryModal = ({ isOpen, onClose, circuit, onRefreshData }) => {
                 ))}
               </div>
             )}
+
+            {!isLoading && nextCursor && (
+              <div className="flex justify-center mt-8">
+                <button onClick={handleLoadMore} disabled={isLoadingMore} className="px-6 py-2.5 rounded-lg font-bold text-slate-600 dark:text-slate-300 bg-white dark:bg-[#202327] border border-slate-200 dark:border-slate-700 hover:bg-slate-100 dark:hover:bg-slate-800 text-xs flex items-center gap-2 shadow-sm transition-colors">
+                  {isLoadingMore ? <Loader2 className="animate-spin" size={16}/> : <History size={16}/>} Carregar mais
+                </button>
+              </div>
+            )}
           </div>
         </div>
 
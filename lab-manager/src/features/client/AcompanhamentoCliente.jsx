@@ -90,6 +90,18 @@ const ClientTrackingView = ({ user, baths = [], setToast, onReuse }) => {
     solicitations.find(s => s.idSolicitacao === selectedId),
   [solicitations, selectedId]);
 
+  const [historicoEdicoes, setHistoricoEdicoes] = useState([]);
+
+  useEffect(() => {
+    if (activeTab !== 'historico' || !selectedItem) return;
+    const carregarHistorico = async () => {
+      const response = await apiRequest(`/solicitacoes/historico?id=${encodeURIComponent(selectedItem.idSolicitacao)}&limite=50`, 'GET');
+      if (response.success && response.data?.sucesso) setHistoricoEdicoes(response.data.data || []);
+      else setHistoricoEdicoes(selectedItem.historicoEdicoes || []);
+    };
+    carregarHistorico();
+  }, [activeTab, selectedItem?.idSolicitacao, selectedItem?.dataMovimentacao]);
+
   useEffect(() => {
     if (selectedItem) {
         setActiveTab('detalhes');
@@ -409,11 +421,11 @@ const ClientTrackingView = ({ user, baths = [], setToast, onReuse }) => {
                       <h3 className="text-base font-semibold text-slate-900 dark:text-slate-100">Histórico de Alterações</h3>
                     </div>
                     <div className="p-6">
-                        {(!selectedItem.historicoEdicoes || selectedItem.historicoEdicoes.length === 0) ? (
+                        {historicoEdicoes.length === 0 ? (
                             <div className="text-center py-8 text-slate-500 text-[13px]">Nenhum histórico de alteração registrado.</div>
                         ) : (
                             <div className="space-y-4">
-                                {selectedItem.historicoEdicoes.map(log => (
+                                {historicoEdicoes.map(log => (
                                     <div key={log.id} className="bg-slate-50 dark:bg-[#1a1d21] p-4 rounded-lg border border-slate-200 dark:border-slate-700">
                                         <div className="flex justify-between items-start mb-2">
                                             <span className="text-sm font-semibold text-slate-800 dark:text-slate-200">{log.autor}</span>
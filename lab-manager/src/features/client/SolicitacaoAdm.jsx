@@ -19,6 +19,8 @@ const DEFAULT_STATUS = [
   'Concluída'
 ];
 
+const TAMANHO_PAGINA = 50;
+
 const DataField = ({ label, value, colSpan = "col-span-1" }) => {
   if (value === undefined || value === null || value === '') return null;
   return (
@@ -57,42 +59,74 @@ const SolicitationsManagementView = ({ setToast }) => {
     status: '', dataEntrega: '', responsavel: '', dataInicio: '', experiencia: '', dataFim: ''
   });
 
-  const fetchSolicitations = async () => {
-    setIsLoading(true);
+  const [proximoCursor, setProximoCursor] = useState(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+
+  // listagem paginada pelo backend (mais novas primeiro); o filtro de status vai na consulta
+  const fetchSolicitations = async (cursor = null) => {
+    if (cursor) setIsLoadingMore(true);
+    else setIsLoading(true);
     try {
-        const response = await apiRequest('/solicitacoes/listar', 'GET');
+        const params = new URLSearchParams({ limite: TAMANHO_PAGINA, campos: 'completo' });
+        if (filterStatus !== 'Todos') params.set('status', filterStatus);
+        if (cursor) params.set('cursor', cursor);
+        const response = await apiRequest(`/solicitacoes/listar?${params.toString()}`, 'GET');
         if (response.success && response.data) {
             const rawData = response.data;
             const listaReal = Array.isArray(rawData) ? rawData : (rawData.data || rawData.solicitacoes || []);
-            
-            listaReal.sort((a, b) => {
-               if (!a.dataCriacao || !b.dataCriacao) return 0;
-               const parseDate = (dateStr) => {
-                   const [data, hora = '00:00'] = dateStr.split(' ');
-                   const [dia, mes, ano] = data.split('/');
-                   return new Date(`${ano}-${mes}-${dia}T${hora}`).getTime();
-               };
-               return parseDate(b.dataCriacao) - parseDate(a.dataCriacao);
-            });
-            
-            setSolicitations(listaReal);
-            if (listaReal.length > 0 && !selectedId) setSelectedId(listaReal[0].idSolicitacao);
-        } else {
+
+            setSolicitations(prev => cursor ? [...prev, ...listaReal] : listaReal);
+            setProximoCursor(rawData.proximoCursor || null);
+            if (!cursor && listaReal.length > 0 && !selectedId) setSelectedId(listaReal[0].idSolicitacao);
+        } else if (!cursor) {
             setSolicitations([]);
+            setProximoCursor(null);
         }
     } catch (e) {
-        setSolicitations([]);
+        if (!cursor) setSolicitations([]);
     } finally {
         setIsLoading(false);
+        setIsLoadingMore(false);
     }
   };
 
-  useEffect(() => { fetchSolicitations(); }, []);
+  useEffect(() => { fetchSolicitations(); }, [filterStatus]);
+
+  // as pesquisas de ID/modelo vao no indice do backend, senao so achariam o que ja veio nas paginas carregadas;
+  // o que for encontrado entra na lista e o filtro local abaixo continua valendo por cima
+  useEffect(() => {
+    const termo = [searchId, searchModel].map(t => t.trim()).filter(Boolean).join(' ');
+    if (!termo) return;
+    const timer = setTimeout(async () => {
+      const params = new URLSearchParams({ q: termo, tipo: 'solicitacao', limite: TAMANHO_PAGINA, completo: 1 });
+      const response = await apiRequest(`/solicitacoes/buscar?${params.toString()}`, 'GET');
+      if (!response.success || !response.data?.sucesso) return;
+      const encontradas = (response.data.data || []).map(r => r.dados).filter(Boolean);
+      setSolicitations(prev => {
+        const carregadas = new Set(prev.map(s => s.idSolicitacao));
+        const novas = encontradas.filter(s => !carregadas.has(s.idSolicitacao));
+        return novas.length ? [...prev, ...novas] : prev;
+      });
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [searchId, searchModel, filterStatus]);
 
   const selectedItem = useMemo(() => 
     solicitations.find(s => s.idSolicitacao === selectedId), 
   [solicitations, selectedId]);
 
+  const [historicoEdicoes, setHistoricoEdicoes] = useState([]);
+
+  useEffect(() => {
+    if (activeTab !== 'historico' || !selectedItem) return;
+    const carregarHistorico = async () => {
+      const response = await apiRequest(`/solicitacoes/historico?id=${encodeURIComponent(selectedItem.idSolicitacao)}&limite=50`, 'GET');
+      if (response.success && response.data?.sucesso) setHistoricoEdicoes(response.data.data || []);
+      else setHistoricoEdicoes(selectedItem.historicoEdicoes || []);
+    };
+    carregarHistorico();
+  }, [activeTab, selectedItem?.idSolicitacao, selectedItem?.dataMovimentacao]);
+
   useEffect(() => {
     if (selectedItem) {
       setActiveTab('detalhes');
@@ -396,6 +430,11 @@ const SolicitationsManagementView = ({ setToast }) => {
                 </div>
               );
             })}
+            {proximoCursor && (
+              <button onClick={() => fetchSolicitations(proximoCursor)} disabled={isLoadingMore} className="w-full py-2 text-[13px] font-medium text-blue-700 dark:text-blue-300 bg-white dark:bg-[#202327] border border-slate-200 dark:border-slate-700 rounded-lg hover:bg-slate-50 dark:hover:bg-[#26292e] shadow-sm transition-colors flex items-center justify-center gap-2 disabled:opacity-70">
+                {isLoadingMore ? <Loader2 size={14} className="animate-spin" /> : <ArrowDownToLine size={14} />} Carregar mais
+              </button>
+            )}
           </div>
         </div>
 
@@ -510,11 +549,11 @@ const SolicitationsManagementView = ({ setToast }) => {
                       <h3 className="text-base font-semibold text-slate-900 dark:text-slate-100">Histórico de Alterações</h3>
                     </div>
                     <div className="p-6">
-                        {(!selectedItem.historicoEdicoes || selectedItem.historicoEdicoes.length === 0) ? (
+                        {historicoEdicoes.length === 0 ? (
                             <div className="text-center py-8 text-slate-500 text-[13px]">Nenhum histórico de alteração registrado.</div>
                         ) : (
                             <div className="space-y-4">
-                                {selectedItem.historicoEdicoes.map(log => (
+                                {historicoEdicoes.map(log => (
                                     <div key={log.id} className="bg-slate-50 dark:bg-[#1a1d21] p-4 rounded-lg border border-slate-200 dark:border-slate-700">
                                         <div className="flex justify-between items-start mb-2">
                                             <span className="text-sm font-semibold text-slate-800 dark:text-slate-200">{log.autor}</span>
@@ -90,6 +90,23 @@ const OEEDashboardView = ({ setToast }) => {
     setIsLoading(false);
   };
 
+  const handleFromLogs = async () => {
+    setIsLoading(true);
+
+    const { success, data } = await oeeService.processFromLogs(config.mes, config.ano);
+
+    if (success && data.sucesso) {
+      setCircuitosList(data.circuitos || []);
+      setToast({ message: 'Mapa gerado pelo histórico dos circuitos!', type: 'success' });
+      await calculate(config);
+      setStep('dashboard');
+      setMostrarGrid(false); 
+    } else {
+      setToast({ message: data?.erro || "Erro ao montar o mapa pelo histórico.", type: 'error' });
+    }
+    setIsLoading(false);
+  };
+
   const updateCircuitOnDB = async (id, action) => {
     const { success } = await oeeService.updateCircuit(id, action);
     return success;
@@ -231,6 +248,9 @@ const OEEDashboardView = ({ setToast }) => {
             </div>
             <input type="file" className="hidden" accept=".xlsx, .xls" onChange={handleFileUpload} disabled={isLoading} />
           </label>
+          <button onClick={handleFromLogs} disabled={isLoading} className="mt-4 w-full py-3 rounded-xl border border-slate-200 dark:border-slate-700 text-sm font-bold text-slate-600 dark:text-slate-300 hover:bg-slate-50 dark:hover:bg-slate-800 transition-colors flex items-center justify-center gap-2 focus:outline-none focus:ring-2 focus:ring-blue-500/50">
+            <Clock size={16} /> Usar histórico dos circuitos (sem planilha)
+          </button>
         </div>
       </div>
     );
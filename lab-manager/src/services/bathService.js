@@ -56,8 +56,8 @@ export const bathService = {
     return await apiRequest('/import', 'POST', { text });
   },
 
-  getCircuitHistory: async (circuitId) => {
-    return await apiRequest('/circuits/history', 'POST', { circuitId });
+  getCircuitHistory: async (circuitId, opcoes = {}) => {
+    return await apiRequest('/circuits/history', 'POST', { circuitId, ...opcoes });
   },
 
   addCircuitLog: async (circuitId, action, details, batteryId) => {
@@ -9,6 +9,10 @@ export const oeeService = {
     return await apiRequest('/oee/upload', 'POST', formData, true); 
   },
 
+  processFromLogs: async (mes, ano) => {
+    return await apiRequest('/oee/from_logs', 'POST', { mes, ano });
+  },
+
   calculate: async (payload) => {
     return await apiRequest('/oee/calcular', 'POST', payload);
   },
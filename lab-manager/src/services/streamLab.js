@@ -0,0 +1,62 @@
+import { apiRequest } from './api';
+
+const API_BASE_URL = import.meta.env.VITE_API_URL || '/api';
+const ESPERA_RECONEXAO_MS = 3000;
+const TIPOS_EVENTO = ['snapshot', 'banhos', 'banho', 'log', 'log_removido', 'protocolos', 'donos'];
+
+// EventSource nao manda Authorization: cada conexao pede antes um ticket de uso unico em /stream/ticket.
+// Quando o stream cai (rede, token vencido, deploy) o navegador tentaria de novo com o mesmo ticket, que ja foi
+// usado; por isso a reconexao e feita aqui, com ticket novo e o ultimo id recebido pra retomar sem perder evento.
+// onStatus(true/false) avisa quem usa pra desligar/religar o polling de /data.
+export const abrirStreamLab = (handlers, onStatus = () => {}) => {
+  if (typeof EventSource === 'undefined') return () => {};
+
+  let fonte = null;
+  let ultimoId = null;
+  let timer = null;
+  let encerrado = false;
+
+  const reconectar = () => {
+    if (encerrado) return;
+    onStatus(false);
+    timer = setTimeout(conectar, ESPERA_RECONEXAO_MS);
+  };
+
+  const conectar = async () => {
+    if (encerrado) return;
+    const response = await apiRequest('/stream/ticket', 'POST');
+    if (encerrado) return;
+    if (!response.success || !response.data?.ticket) { reconectar(); return; }
+
+    const params = new URLSearchParams({ ticket: response.data.ticket });
+    if (ultimoId) params.set('lastEventId', ultimoId);
+    fonte = new EventSource(`${API_BASE_URL}/stream?${params.toString()}`);
+
+    fonte.onopen = () => onStatus(true);
+    fonte.onerror = () => {
+      fonte.close();
+      fonte = null;
+      reconectar();
+    };
+    TIPOS_EVENTO.forEach(tipo => {
+      fonte.addEventListener(tipo, (evento) => {
+        if (evento.lastEventId) ultimoId = evento.lastEventId;
+        const tratar = handlers[tipo];
+        if (!tratar) return;
+        try {
+          tratar(JSON.parse(evento.data));
+        } catch (erro) {
+          console.error(`Evento ${tipo} do stream inválido:`, erro);
+        }
+      });
+    });
+  };
+
+  conectar();
+
+  return () => {
+    encerrado = true;
+    clearTimeout(timer);
+    if (fonte) fonte.close();
+  };
+};
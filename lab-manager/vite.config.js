@@ -3,6 +3,11 @@ import react from '@vitejs/plugin-react'
 
 export default defineConfig({
   plugins: [react()],
+  // o backend serve backend/dist (app.py); o postbuild do package.json pre-comprime essa pasta
+  build: {
+    outDir: '../backend/dist',
+    emptyOutDir: true,
+  },
   server: {
     
     headers: {